@@ -13,17 +13,38 @@ Test cases, which are based on given requirements specification, are read from '
 the results of the test are written into 'test-log.txt'. 
 """
 
-import string
+import bisect
+import io
 import json
-from helium.api import *
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from harness import album_server, artifacts, extract, http_client, dates, history, paginate, records, runner, session, timeouts, timing, waits
 
 USERNAME = 'user'
 PASSWORD = 'password'
 APP_URL = 'http://localhost:8080/ps/v2/index.html'
+TITLE = 'DATE SEARCH TEST'
+KEEP_SESSION = True
 TEST_JSON = 'test-cases.json'
 TEST_LOG = 'test-log.txt'
+TEST_TIMING = 'test-timing.txt'
+TEST_TRACE = 'test-trace.json'
+TEST_CACHE = 'test-cache.json'
+TEST_DURATIONS = 'test-durations.json'
+TEST_SHARD = 'test-shard.json'
+TEST_NETWORK = 'test-network.txt'
+TEST_ARTIFACTS = 'test-artifacts'
+TEST_RESULTS = records.RESULTS
+TEST_HISTORY = history.HISTORY
+TEST_LATENCIES = timeouts.LATENCIES
+TEST_ALBUM = None
 TEST_IMAGES = []
 TEST_CASES = []
+SEARCH_FIELDS = ['Type start date in RFC3339 format', 'Type end date in RFC3339 format']
+SESSION = session.Session(USERNAME, PASSWORD, SEARCH_FIELDS)
+PAGINATOR = paginate.Paginator()
 
 class TestInput:
     """
@@ -43,6 +64,13 @@ class TestInput:
         the number of found images from the image search (default is 0)
     errors : int
         the number of web application's errors found with this test case (default is 0)
+    expected_ids : set[str]
+        IDs of the images that the search should find, computed when the first page of results
+        is checked (default is None)
+    found_ids : set[str]
+        IDs of the images found from the image search
+    completed : bool
+        true when the search has been validated to the end by finish_search (default is false)
     """
     def __init__(self, msg, start_date='', end_date='', results_expected=0):
         self.msg = msg
@@ -51,6 +79,9 @@ class TestInput:
         self.results_expected = results_expected
         self.results_found = 0
         self.errors = 0
+        self.expected_ids = None
+        self.found_ids = set()
+        self.completed = False
 
 class Image:
     """
@@ -62,10 +93,71 @@ class Image:
         the id of the image
     date : str
         the date when the image was 'uploaded' in the album
+    timestamp : int
+        the date parsed into microseconds since the epoch, see harness/dates.py
     """
     def __init__(self, id, date):
         self.id = id
         self.date = date
+        self.timestamp = dates.parse_timestamp(date)
+
+class ImageIndex:
+    """
+    A class that is used to look up images of TEST_IMAGES by their ID and by date ranges.
+    The timestamps of the images are kept sorted, so the images of a date range are found with
+    binary search over integers instead of comparing every image in the album.
+
+    Attributes
+    ----------
+    images : dict
+        Image objects by their ID
+    timestamps : list[int]
+        timestamps of the images in ascending order
+    ids : list[str]
+        IDs of the images in the same order as timestamps
+    """
+    def __init__(self, images=()):
+        ordered = sorted(images, key=lambda image: image.timestamp)
+        self.images = {image.id: image for image in ordered}
+        self.timestamps = [image.timestamp for image in ordered]
+        self.ids = [image.id for image in ordered]
+
+    def bounds(self, start_date, end_date):
+        """Returns the range of the search fields as (first, last) timestamps. An empty field is an
+        open bound, which is the timestamp of the first or the last image of the album.
+        Raises ValueError if a field is not an RFC3339 date
+
+        Parameters
+        ----------
+        start_date : str
+            value of the 'start date' field
+        end_date : str
+            value of the 'end date' field
+        """
+        first = dates.parse_timestamp(start_date) if start_date else self.timestamps[0]
+        last = dates.parse_timestamp(end_date, True) if end_date else self.timestamps[-1]
+        return first, last
+
+    def expected_ids(self, start_date, end_date):
+        """Returns a set of IDs of the images that are dated between the given dates, or an empty
+        set if a date is invalid or the range is reversed
+
+        Parameters
+        ----------
+        start_date : str
+            value of the 'start date' field, an empty string for no start date
+        end_date : str
+            value of the 'end date' field, an empty string for no end date
+        """
+        if not self.timestamps:
+            return set()
+        try:
+            first, last = self.bounds(start_date, end_date)
+        except ValueError:
+            return set()
+        return set(self.ids[bisect.bisect_left(self.timestamps, first):bisect.bisect_right(self.timestamps, last)])
+
+IMAGE_INDEX = ImageIndex()
 
 def initialize_test_cases(log):
     """Reads the test-case-data from a JSON-file and saves it as TestInput objects in TEST_CASES
@@ -76,28 +168,17 @@ def initialize_test_cases(log):
     log : file
         the file to write into, which needs to be opened before calling this function
     """
-    try:
-        file = open(TEST_JSON, 'r')
-        test_data = json.load(file)
-        file.close()
-        for test_case in test_data:
-            new_test = TestInput(
-                test_case['msg'],
-                test_case['start_date'],
-                test_case['end_date'],
-                test_case['results_expected']
-            )
-            TEST_CASES.append(new_test)
-        log.write('Added {} test cases \n'.format(len(TEST_CASES)))
-        return True
-    except:
-        log.write('Failed to initialize test cases \n')
-        print('Failed to initialize test cases')
-        return False
+    return runner.load_test_cases(TEST_JSON, lambda test_case: TestInput(
+        test_case['msg'],
+        test_case['start_date'],
+        test_case['end_date'],
+        test_case['results_expected']
+    ), TEST_CASES, log)
 
 def initialize_images(log):
     """Populates the TEST_IMAGES list with Image items that are dated starting from 
-    01.06.2018 12:00:00 to 19.07.2018 12:00:00 in 24 hour intervals, 49 images in total
+    01.06.2018 12:00:00 to 19.07.2018 12:00:00 in 24 hour intervals, 49 images in total,
+    or with the images of TEST_ALBUM, an album file written by harness.generate, if it is set
     Returns true if initialization succeeded or false if there was an error
 
     Parameters
@@ -106,20 +187,16 @@ def initialize_images(log):
         the file to write into, which needs to be opened before calling this function
     """
     try:
-        for i in range(30):
-            if i < 9:
-                date = '2018-06-0{:n}T12:00:00Z'.format(i+1)
-                TEST_IMAGES.append(Image(str(i+1),date))
-            else:
-                date = '2018-06-{:n}T12:00:00Z'.format(i+1)
-                TEST_IMAGES.append(Image(str(i+1),date))
-        for i in range(19):
-            if i < 9:
-                date = '2018-07-0{:n}T12:00:00Z'.format(i+1)
-                TEST_IMAGES.append(Image(str(i+1+30), date))
-            else:
-                date = '2018-07-{:n}T12:00:00Z'.format(i+1)
-                TEST_IMAGES.append(Image(str(i+1+30), date))
+        if TEST_ALBUM is not None:
+            file = open(TEST_ALBUM, 'r')
+            album = json.load(file)
+            file.close()
+            for image in album:
+                TEST_IMAGES.append(Image(image['file'].split('.')[0], image['date']))
+        else:
+            initialize_default_images()
+        global IMAGE_INDEX
+        IMAGE_INDEX = ImageIndex(TEST_IMAGES)
         log.write('Added {} images \n'.format(len(TEST_IMAGES)))
         return True
     except:
@@ -127,6 +204,23 @@ def initialize_images(log):
         print('Failed to initialize images')
         return False
 
+def initialize_default_images():
+    """Adds the 49 images of the web application's default album into TEST_IMAGES"""
+    for i in range(30):
+        if i < 9:
+            date = '2018-06-0{:n}T12:00:00Z'.format(i+1)
+            TEST_IMAGES.append(Image(str(i+1),date))
+        else:
+            date = '2018-06-{:n}T12:00:00Z'.format(i+1)
+            TEST_IMAGES.append(Image(str(i+1),date))
+    for i in range(19):
+        if i < 9:
+            date = '2018-07-0{:n}T12:00:00Z'.format(i+1)
+            TEST_IMAGES.append(Image(str(i+1+30), date))
+        else:
+            date = '2018-07-{:n}T12:00:00Z'.format(i+1)
+            TEST_IMAGES.append(Image(str(i+1+30), date))
+
 def get_image_date(id):
     """Returns the date of an image with the given ID or 'No image with given ID'
 
@@ -135,14 +229,14 @@ def get_image_date(id):
     id : int
         id of the image
     """
-    for image in TEST_IMAGES:
-        if image.id == id:
-            return image.date
-    return 'No image with given ID'
+    image = IMAGE_INDEX.images.get(id)
+    if image is None:
+        return 'No image with given ID'
+    return image.date
 
 def compare_start_date(id, date):
     """Returns true if the date of an image with the given ID is AFTER the given date, or false if its not
-    Date comparisons are made with strings that are expected to be in RFC3339 date format
+    Dates are compared as timestamps parsed from RFC3339, an empty date is the date of the first image
 
     Parameters
     ----------
@@ -151,13 +245,15 @@ def compare_start_date(id, date):
     date : str
         date to be compared to
     """
-    if date == '':
-        date += '2018-05-31T12:00:00Z'
-    return get_image_date(id) >= date
+    image = IMAGE_INDEX.images.get(id)
+    try:
+        return image is not None and image.timestamp >= IMAGE_INDEX.bounds(date, '')[0]
+    except ValueError:
+        return False
 
 def compare_end_date(id, date):
     """Returns true if the date of an image with the given ID is BEFORE the given date, or false if its not
-    Date comparisons are made with strings that are expected to be in RFC3339 date format
+    Dates are compared as timestamps parsed from RFC3339, an empty date is the date of the last image
 
     Parameters
     ----------
@@ -166,11 +262,104 @@ def compare_end_date(id, date):
     date : str
         date to be compared to
     """
-    if date == '':
-        date += '2018-07-20T12:00:00Z'
-    return get_image_date(id) <= date
+    image = IMAGE_INDEX.images.get(id)
+    try:
+        return image is not None and image.timestamp <= IMAGE_INDEX.bounds('', date)[1]
+    except ValueError:
+        return False
+
+def get_image_id(src):
+    """Returns the ID of an image separated from the image's url, which ends with '<ID>.<file extension>'
 
-def test_search_with_date(testObject, log, next_page=False):
+    Parameters
+    ----------
+    src : str
+        the value of the image's src-attribute
+    """
+    return src.split('/')[6].split('.')[0]
+
+def check_loaded_images(testObject, log, loaded_images):
+    """Compares the images loaded on one page of the search results to TEST_IMAGES and adds
+    the verdict of each image into the result record. The IDs of the images that the search should find
+    are computed once per test case from IMAGE_INDEX, and each loaded image is checked against them
+
+    Parameters
+    ----------
+    testObject : TestInput object
+        the test case of the search, whose results_found and errors are updated
+    log : records.CaseRecord
+        the result record of the test case
+    loaded_images : list[dict]
+        the loaded images as returned by extract.extract_images
+    """
+    if testObject.expected_ids is None:
+        if testObject.results_expected != 0:
+            testObject.expected_ids = IMAGE_INDEX.expected_ids(testObject.start_date, testObject.end_date)
+        else:
+            testObject.expected_ids = set()
+    for image in loaded_images:
+        testObject.results_found += 1
+        id = get_image_id(image['src'])
+        testObject.found_ids.add(id)
+        ok = id in testObject.expected_ids
+        log.image(id, ok, get_image_date(id))
+        if not ok:
+            testObject.errors += 1
+
+def sort_key(id):
+    """Returns a key that sorts image IDs, which are strings of digits, in numeric order"""
+    return (len(id), id)
+
+def finish_search(testObject, log):
+    """Compares the number of found images to the expected number and writes the summary of the
+    search into the test log, listing the images that the search should have found but did not
+    (missing) and the found images that it should not have (unexpected) separately.
+    Returns true if there were errors found in the application, or false if there was no errors
+
+    Parameters
+    ----------
+    testObject : TestInput object
+        the test case of the search
+    log : records.CaseRecord
+        the result record of the test case
+    """
+    testObject.completed = True
+    expected_ids = testObject.expected_ids or set()
+    missing = expected_ids - testObject.found_ids
+    unexpected = testObject.found_ids - expected_ids
+    if testObject.results_found != testObject.results_expected:
+        testObject.errors += 1
+        log.write('Expected {} results, got {} \n'.format(testObject.results_expected, testObject.results_found))
+    if missing:
+        log.write('Missing IMAGE_IDs: {} \n'.format(', '.join(sorted(missing, key=sort_key))))
+    if unexpected:
+        log.write('Unexpected IMAGE_IDs: {} \n'.format(', '.join(sorted(unexpected, key=sort_key))))
+    if testObject.errors == 1:
+        log.write('Search completed with 1 error \n')
+    else:
+        log.write('Search completed with {} errors \n'.format(testObject.errors))
+    if testObject.errors > 0:
+        return True
+    return False
+
+def capture_failure(testObject, reason):
+    """Keeps the screenshot, the album view and the loaded image IDs of a failed search test case
+    if failure artifacts are enabled, see harness/artifacts.py
+
+    Parameters
+    ----------
+    testObject : TestInput object
+        the failed test case
+    reason : str
+        what failed, as written into the test log
+    """
+    artifacts.WRITER.capture(testObject.msg, reason, testObject.found_ids, {
+        'results_expected': testObject.results_expected,
+        'results_found': testObject.results_found,
+        'expected_ids': sorted(testObject.expected_ids or ())
+    })
+
+def test_search_with_date(testObject, log):
     """The main testing function of this module. A search action to web application is performed
     in this function and the response of the application is validated and written into the test log.
     Returns true if there were errors found in the application, or false if there was no errors or
@@ -180,119 +369,190 @@ def test_search_with_date(testObject, log, next_page=False):
     ----------
     testObject : TestInput object
         test case specifications used in the search are read from the given TestInput object
-    log : file
-        the file to write into, which needs to be opened before calling this function
-    next_page : bool
-        if true, the function is being called recursively for the next page of the search results
-        and the search is not performed again (default is false)
+    log : records.CaseRecord
+        the result record of the test case
     """
-    if not next_page:
-        try:         
-            write(testObject.start_date, into='Type start date in RFC3339 format')
-            write(testObject.end_date, into='Type end date in RFC3339 format')
-            click(S('#view-search'))
-        except:
-            log.write('Search failed \n')
-            return False
+    from helium.api import S, click, write
+
+    try:         
+        write(testObject.start_date, into='Type start date in RFC3339 format')
+        write(testObject.end_date, into='Type end date in RFC3339 format')
+        waits.arm()
+        click(S('#view-search'))
+        waits.wait_for_render()
+    except:
+        log.write('Search failed \n')
+        capture_failure(testObject, 'Search failed')
+        return False
     
     try:
         """When a search is performed on the web application's album view, page is reloaded and
         populated with images that match the given specifications. In this test script these images
         are recognized by taking the 'src-attribute' of a loaded image and separating an ID from the url.
         Then they are compared to an image in TEST_IMAGES with that ID and checking if the said 
-        image was supposed to be loaded in this search.
+        image was supposed to be loaded in this search. The attributes of all loaded images are
+        read with a single WebDriver call. The pages of the results are walked with PAGINATOR,
+        which loads the next page while the current one is being checked.
         """
-        loaded_images = find_all(S('div > p > img'))
-        first_result = loaded_images[0].web_element.get_attribute('src')
+        for loaded_images in PAGINATOR.pages(extract.extract_images, extract.next_album_page):
+            check_loaded_images(testObject, log, loaded_images)
     except:
         log.write('Failed to load page elements \n')
+        capture_failure(testObject, 'Failed to load page elements')
         return False
+    errors = finish_search(testObject, log)
+    if errors:
+        capture_failure(testObject, 'Search completed with errors')
+    return errors
 
-    for image in loaded_images:
-        testObject.results_found += 1
-        id = image.web_element.get_attribute('src').split('/')
-        id = id[6].split('.')[0]
-        if  (compare_start_date(id, testObject.start_date) 
-            and compare_end_date(id, testObject.end_date)
-            and testObject.results_expected != 0 ):
-            log.write('IMAGE_ID: {} DATE: {} OK \n'.format(id, get_image_date(id)))
-        else:
-            log.write('IMAGE_ID: {} DATE: {} ERROR \n'.format(id, get_image_date(id)))
-            testObject.errors += 1
+def search_pages_http(testObject, client):
+    """Yields the pages of the search results of a test case from the web application's HTTP
+    API. A search that the application rejects with HTTP 400, i.e. one with an invalid date, has
+    no pages, like the empty album view that the browser shows for it
 
-    try:       
-        click(S('#view-next'))
-        loaded_images = find_all(S('div > p > img'))
-        if first_result != loaded_images[0].web_element.get_attribute('src'):
-            return test_search_with_date(testObject, log, True)
-        else:
-            if testObject.results_found != testObject.results_expected:
-                testObject.errors += 1
-                log.write('Expected {} results, got {} \n'.format(testObject.results_expected, testObject.results_found))
-            if testObject.errors == 1:
-                log.write('Search completed with 1 error \n')
-            else:
-                log.write('Search completed with {} errors \n'.format(testObject.errors))
-            if testObject.errors > 0:
-                return True
-            return False
-    except:
-        print('Failed to load the next page \n')
+    Parameters
+    ----------
+    testObject : TestInput object
+        the test case of the search
+    client : http_client.AlbumClient
+        a client that is logged into the API
+    """
+    try:
+        yield from client.search_pages(testObject.start_date, testObject.end_date)
+    except http_client.ApiError as error:
+        if error.status != 400:
+            raise
+
+def test_search_with_date_http(testObject, log, client):
+    """Performs the same test as test_search_with_date, but sends the search straight to the web
+    application's HTTP API instead of using the browser. Every page of the search results is
+    requested and validated.
+    Returns true if there were errors found in the application, or false if there was no errors or
+    the test didnt complete
+
+    Parameters
+    ----------
+    testObject : TestInput object
+        test case specifications used in the search are read from the given TestInput object
+    log : records.CaseRecord
+        the result record of the test case
+    client : http_client.AlbumClient
+        a client that is logged into the API
+    """
+    try:
+        for loaded_images in search_pages_http(testObject, client):
+            check_loaded_images(testObject, log, loaded_images)
+    except Exception:
+        log.write('Search failed \n')
         return False
+    return finish_search(testObject, log)
+
+def dry_run_test_cases(log):
+    """Checks the test cases against the oracle without performing them: the number of images
+    that IMAGE_INDEX finds for the search of each test case is compared to its results_expected.
+    Returns the number of test cases whose results_expected disagrees with the oracle
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    failed_tests = 0
+    for test_case in TEST_CASES:
+        with records.STREAM.case(test_case, log) as record:
+            record.heading()
+            expected = len(IMAGE_INDEX.expected_ids(test_case.start_date, test_case.end_date))
+            if expected == test_case.results_expected:
+                record.write('Oracle expects {} results OK \n'.format(expected))
+            else:
+                record.write('Oracle expects {} results, test case {} ERROR \n'.format(expected, test_case.results_expected))
+                test_case.errors += 1
+                failed_tests += 1
+            test_case.completed = True
+            record.finish(test_case.errors > 0)
+    return failed_tests
 
-def main():
-    """Main function of the module, in which the test-log file is opened (and closed) and all 
-    the TEST_CASES are iterated through and performed a search test to. 
+def run_http_test_cases(log, client):
+    """Logs into the HTTP API once and performs all TEST_CASES with test_search_with_date_http.
+    Returns the number of failed test cases
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    client : http_client.AlbumClient
+        the client used for the requests
     """
     try:
-        test_log = open(TEST_LOG, 'w')
-        test_log.writelines([
-            '---------------------------------- \n',
-            '-------- DATE SEARCH TEST -------- \n',
-            '---------------------------------- \n',
-            '# Initializing test \n',
-            '\n'
-        ])
-        print('# Initializing test')
-        if initialize_images(test_log) and initialize_test_cases(test_log):
-            test_log.write('\n')
-            test_log.write('# Starting Chrome \n')
-            print('# Starting Chrome')
-            start_chrome(APP_URL)
-            test_log.write('# Going through test cases \n')
-            print('# Going through test cases')
-            failed_tests = 0
-            for test_case in TEST_CASES:
-                test_log.write('\n')
-                test_log.write(test_case.msg + '\n')
-                try:
-                    write(USERNAME, into='username')
-                    write(PASSWORD, into='password')
-                    click('Login')
-                except:
-                    test_log.write('Failed to login \n')
-                    break
-                errors = test_search_with_date(test_case, test_log)
-                if errors:
-                    failed_tests += 1
-                refresh()
-            test_log.write('\n')
-            test_log.write('# Closing Chrome \n')
-            print('# Closing Chrome')
-            kill_browser()
-            test_log.writelines([
-                '---------------------------------- \n',
-                '---------- TEST RESULTS ---------- \n',
-                '---------------------------------- \n',
-                '# Test completed with {} failed test cases (out of {})'.format(failed_tests, len(TEST_CASES))
-            ])
-        else:
-            test_log.write('\n')
-            test_log.write('# Test aborted')
-            print('# Test aborted')
-        test_log.close()
-        print('# Test completed')
-    except OSError:
-        print('Error in writing text log')
-
-main()
\ No newline at end of file
+        if not client.login(USERNAME, PASSWORD):
+            raise http_client.ApiError(401, '/login')
+    except Exception:
+        log.write('Failed to login \n')
+        return 0
+    failed_tests = 0
+    for test_case in TEST_CASES:
+        with records.STREAM.case(test_case, log) as record, timing.TIMER.test_case(test_case.msg):
+            record.heading()
+            errors = record.finish(test_search_with_date_http(test_case, record, client))
+        if errors:
+            failed_tests += 1
+    return failed_tests
+
+def run_test_case(test_case, log):
+    """Performs one test case: brings the browser to the album view with empty search fields and
+    performs the search test. The browser logs into the web application only for the first test
+    case, or if the session has been lost, otherwise SESSION resets the search form in place.
+    Returns true if there were errors found in the application, false if there was no errors,
+    or None if logging in failed and the test case could not be performed
+
+    Parameters
+    ----------
+    test_case : TestInput object
+        the test case to be performed
+    log : records.CaseRecord
+        the result record of the test case
+    """
+    log.heading()
+    try:
+        SESSION.reset()
+    except:
+        log.write('Failed to login \n')
+        return None
+    return test_search_with_date(test_case, log)
+
+def case_passed(testObject):
+    """Returns true if the search of a performed test case was validated to the end without errors"""
+    return testObject.completed and testObject.errors == 0
+
+def setup_worker():
+    """Initializes TEST_IMAGES in a worker process of the worker pool, unless the process
+    already inherited them from the main process
+    """
+    if not TEST_IMAGES:
+        initialize_images(io.StringIO())
+
+def initialize(log):
+    """Initializes TEST_IMAGES and TEST_CASES.
+    Returns true if initialization succeeded or false if there was an error
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    return initialize_images(log) and initialize_test_cases(log)
+
+if __name__ == '__main__':
+    parser = runner.option_parser('Date search test for the photo album web application', APP_URL, sys.modules[__name__])
+    parser.add_argument('--album',
+        help='album file written by harness.generate, used instead of the 49 default images (also with --stub)')
+    parser.add_argument('--test-cases', default=TEST_JSON,
+        help='test case file, e.g. one written by harness.generate (default is {})'.format(TEST_JSON))
+    options = runner.parse_options(parser)
+    TEST_ALBUM = options.album
+    TEST_JSON = options.test_cases
+    album = None
+    if options.stub and TEST_ALBUM is not None:
+        album = album_server.Album(dates=album_server.read_album(TEST_ALBUM))
+    runner.start_stub(options, album)
+    runner.run(sys.modules[__name__], options)
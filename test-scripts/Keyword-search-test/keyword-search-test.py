@@ -13,16 +13,34 @@ Test cases, which are based on given requirements specification, are read from '
 the results of the test are written into 'test-log.txt'. 
 """
 
-import string
-import json
-from helium.api import *
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from harness import artifacts, extract, http_client, history, paginate, records, runner, seeding, session, timeouts, timing, waits
 
 USERNAME = 'user'
 PASSWORD = 'password'
 APP_URL = 'http://localhost:8080/ps/v2/index.html'
+TITLE = 'KEYWORD SEARCH TEST'
 TEST_JSON = 'test-cases.json'
 TEST_LOG = 'test-log.txt'
+TEST_TIMING = 'test-timing.txt'
+TEST_TRACE = 'test-trace.json'
+TEST_CACHE = 'test-cache.json'
+TEST_DURATIONS = 'test-durations.json'
+TEST_SHARD = 'test-shard.json'
+TEST_NETWORK = 'test-network.txt'
+TEST_ARTIFACTS = 'test-artifacts'
+TEST_RESULTS = records.RESULTS
+TEST_HISTORY = history.HISTORY
+TEST_LATENCIES = timeouts.LATENCIES
 TEST_KEYWORDS = {}
+SEED_THREADS = 8
+HTTP_CONNECTIONS = SEED_THREADS
+KEEP_SESSION = True
+SESSION = session.Session(USERNAME, PASSWORD, ['Type keywords for search, separated by comma (,)'])
+PAGINATOR = paginate.Paginator()
 TEST_CASES = []
 
 class TestInput:
@@ -35,22 +53,37 @@ class TestInput:
         a short description of the test case that is printed into test log
     keywords : list[str]
         a list of keywords used in the search (default is an empty list)
-    expected_results : int, optional
-        the number of expected results from the image search (default is 0)
+    expected_ids : set[int]
+        IDs of the images that the search should find (default is an empty set)
+    results_expected : int, optional
+        the number of expected results from the image search, written by hand into the JSON-file
+        as an independent check of expected_ids (default is the size of expected_ids)
     results_found : int
         the number of found images from the image search (default is 0)
+    found_ids : set[int]
+        IDs of the images found from the image search
     errors : int
         the number of web application's errors found with this test case (default is 0)
+    completed : bool
+        true when the search has been validated to the end by finish_search (default is false)
     """
-    def __init__(self, msg, keywords=[], results_expected=0):
+    def __init__(self, msg, keywords=None, expected_ids=None, results_expected=None):
         self.msg = msg
-        self.keywords = keywords
+        self.keywords = [] if keywords is None else keywords
+        self.expected_ids = set() if expected_ids is None else expected_ids
+        if results_expected is None:
+            results_expected = len(self.expected_ids)
         self.results_expected = results_expected
         self.results_found = 0
+        self.found_ids = set()
         self.errors = 0
+        self.completed = False
 
 def initialize_test_cases(log):
-    """Reads the test-case-data from a JSON-file and saves it as TestInput objects in TEST_CASES
+    """Reads the test-case-data from a JSON-file and saves it as TestInput objects in TEST_CASES.
+    The expected results of each test case are computed from TEST_KEYWORDS, which needs to be
+    initialized first. The 'results_expected' counts of the JSON-file are written by hand, so a
+    search is checked against them as well as against the oracle.
     Returns true if initialization succeeded or false if there was an error
 
     Parameters
@@ -58,26 +91,28 @@ def initialize_test_cases(log):
     log : file
         the file to write into, which needs to be opened before calling this function
     """
-    try:
-        file = open(TEST_JSON, 'r')
-        test_data = json.load(file)
-        file.close()
-        for test_case in test_data:
-            new_test = TestInput(
-                test_case['msg'],
-                test_case['keywords'],
-                test_case['results_expected'],
-            )
-            TEST_CASES.append(new_test)
-        log.write('Added {} test cases \n'.format(len(TEST_CASES)))
-        return True
-    except:
-        log.write('Failed to initialize test cases \n')
-        print('Failed to initialize test cases')
-        return False
+    return runner.load_test_cases(TEST_JSON, lambda test_case: TestInput(
+        test_case['msg'],
+        test_case['keywords'],
+        expected_ids(test_case['keywords']),
+        test_case.get('results_expected')
+    ), TEST_CASES, log)
+
+def expected_ids(keywords):
+    """Returns the set of image IDs that a search with the given keywords should find, which is
+    the union of the images of every searched keyword. Keywords that are not in TEST_KEYWORDS
+    do not match any image
+
+    Parameters
+    ----------
+    keywords : list[str]
+        the keywords of the search
+    """
+    return set().union(*(TEST_KEYWORDS.get(keyword, ()) for keyword in keywords))
 
 def initialize_keywords(log):
-    """Populates the TEST_KEYWORDS dict, keyword as a name and list of IDs as a value
+    """Populates the TEST_KEYWORDS dict, keyword as a name and set of IDs as a value, which is
+    used as an inverted index from keywords to the images that have them
     Returns true if initialization succeeded or false if there was an error
 
     Parameters
@@ -88,9 +123,9 @@ def initialize_keywords(log):
     try:
         """In this test all the images with keywords are located in the first page of the album view
         """
-        TEST_KEYWORDS['aaa'] = [0,1,2]
-        TEST_KEYWORDS['bbb'] = [3,4,5]
-        TEST_KEYWORDS['ccc'] = [6,7]
+        TEST_KEYWORDS['aaa'] = {0,1,2}
+        TEST_KEYWORDS['bbb'] = {3,4,5}
+        TEST_KEYWORDS['ccc'] = {6,7}
         return True
     except:
         log.write('Failed to initialize keywords \n')
@@ -98,10 +133,16 @@ def initialize_keywords(log):
         return False
 
 def add_keywords():
+    """Adds the keywords in TEST_KEYWORDS to the images one image at a time in the browser, which
+    needs to be logged into the web application. Used when the keywords can't be added through
+    the HTTP API. Returns true if all keywords were added, or false if there was an error
+    """
+    from helium.api import S, click, find_all, write
+
     try:
         loaded_images = find_all(S('div > p > img'))
         for keyword in TEST_KEYWORDS:
-            for id in TEST_KEYWORDS[keyword]:
+            for id in sorted(TEST_KEYWORDS[keyword]):
                 click(loaded_images[id].web_element)
                 write(keyword, into='Syötä avainsanat pilkulla (,) erotettuna.')
                 click(S('#view-full-save-keywords'))
@@ -110,6 +151,133 @@ def add_keywords():
         return False
     return True
 
+def add_keywords_http(client, log):
+    """Adds the keywords in TEST_KEYWORDS to the images in bulk through the HTTP API's
+    save-keywords endpoint with concurrent requests, and verifies the keywords of the images once
+    afterwards. Returns true if all keywords were saved, or false if there was an error
+
+    Parameters
+    ----------
+    client : http_client.AlbumClient
+        a client that is logged into the API
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    try:
+        seeded = seeding.seed_keywords(client, TEST_KEYWORDS, SEED_THREADS)
+        differences = seeding.verify_keywords(client, TEST_KEYWORDS)
+    except Exception:
+        log.write('Failed to add keywords through the API \n')
+        return False
+    if differences:
+        log.write('Keywords of {} images differ from TEST_KEYWORDS after adding them \n'.format(len(differences)))
+        return False
+    log.write('Added keywords to {} images through the API \n'.format(seeded))
+    return True
+
+def add_keywords_bulk(api_url, log):
+    """Logs into the HTTP API with a new client and adds the keywords with add_keywords_http.
+    Returns true if all keywords were saved, or false if there was an error
+
+    Parameters
+    ----------
+    api_url : str
+        the url of the HTTP API
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    client = http_client.AlbumClient(api_url, SEED_THREADS)
+    try:
+        if not client.login(USERNAME, PASSWORD):
+            raise http_client.ApiError(401, '/login')
+    except Exception:
+        log.write('Failed to login to the API \n')
+        return False
+    try:
+        return add_keywords_http(client, log)
+    finally:
+        client.close()
+
+def check_loaded_images(testObject, log, loaded_images):
+    """Checks that each image loaded by the search is one of the images the search should find,
+    in other words has at least one of the searched keywords, and adds the verdict of each image
+    into the result record
+
+    Parameters
+    ----------
+    testObject : TestInput object
+        the test case of the search, whose results_found and errors are updated
+    log : records.CaseRecord
+        the result record of the test case
+    loaded_images : list[dict]
+        the loaded images as returned by extract.extract_images
+    """
+    for image in loaded_images:
+        testObject.results_found += 1
+        id = int(image['id'])
+        testObject.found_ids.add(id)
+        ok = id in testObject.expected_ids
+        log.image(id, ok)
+        if not ok:
+            testObject.errors += 1
+
+def finish_search(testObject, log):
+    """Compares the number of found images to the expected number and writes the summary of the
+    search into the test log. If the found images differ from the expected ones, the missing and
+    unexpected images are listed along with the precision (share of found images that were
+    expected) and recall (share of expected images that were found) of the search.
+    Returns true if there were errors found in the application, or false if there was no errors
+
+    Parameters
+    ----------
+    testObject : TestInput object
+        the test case of the search
+    log : records.CaseRecord
+        the result record of the test case
+    """
+    testObject.completed = True
+    if testObject.results_found != testObject.results_expected:
+        testObject.errors += 1
+        log.write('Expected {} results, got {} \n'.format(testObject.results_expected, testObject.results_found))
+    missing = testObject.expected_ids - testObject.found_ids
+    unexpected = testObject.found_ids - testObject.expected_ids
+    if missing:
+        log.write('Missing IMAGE_IDs: {} \n'.format(', '.join(str(id) for id in sorted(missing))))
+    if unexpected:
+        log.write('Unexpected IMAGE_IDs: {} \n'.format(', '.join(str(id) for id in sorted(unexpected))))
+    if missing or unexpected:
+        matched = len(testObject.found_ids & testObject.expected_ids)
+        log.write('Precision {:.2f} ({}/{}), recall {:.2f} ({}/{}) \n'.format(
+            matched / len(testObject.found_ids) if testObject.found_ids else 1.0,
+            matched, len(testObject.found_ids),
+            matched / len(testObject.expected_ids) if testObject.expected_ids else 1.0,
+            matched, len(testObject.expected_ids)
+        ))
+    if testObject.errors == 1:
+        log.write('Search completed with 1 error \n')
+    else:
+        log.write('Search completed with {} errors \n'.format(testObject.errors))
+    if testObject.errors > 0:
+        return True
+    return False
+
+def capture_failure(testObject, reason):
+    """Keeps the screenshot, the album view and the loaded image IDs of a failed search test case
+    if failure artifacts are enabled, see harness/artifacts.py
+
+    Parameters
+    ----------
+    testObject : TestInput object
+        the failed test case
+    reason : str
+        what failed, as written into the test log
+    """
+    artifacts.WRITER.capture(testObject.msg, reason, testObject.found_ids, {
+        'results_expected': testObject.results_expected,
+        'results_found': testObject.results_found,
+        'expected_ids': sorted(testObject.expected_ids or ())
+    })
+
 def test_search_with_keywords(testObject, log):
     """The main testing function of this module. A search action to web application is performed
     in this function and the response of the application is validated and written into the test log.
@@ -120,9 +288,11 @@ def test_search_with_keywords(testObject, log):
     ----------
     testObject : TestInput object
         test case specifications used in the search are read from the given TestInput object
-    log : file
-        the file to write into, which needs to be opened before calling this function
+    log : records.CaseRecord
+        the result record of the test case
     """
+    from helium.api import S, click, write
+
     try:
         search_input = ''
         for keyword in testObject.keywords:
@@ -131,110 +301,180 @@ def test_search_with_keywords(testObject, log):
             else:
                 search_input += ',' + keyword
         write(search_input, into='Type keywords for search, separated by comma (,)')
+        waits.arm()
         click(S('#view-search'))
+        waits.wait_for_render()
     except:
         log.write('Search failed \n')
+        capture_failure(testObject, 'Search failed')
         return False
     
     try:
         """When a search is performed on the web application's album view, page is reloaded and
         populated with images that match the given specifications. In this test script these images
         are recognized by taking the 'id-attribute' of a loaded image and checking if the said 
-        image was supposed to be loaded in this search.
+        image was supposed to be loaded in this search. The attributes of all loaded images are
+        read with a single WebDriver call. Every page of the results is checked, the pages are
+        walked with PAGINATOR.
         """
-        loaded_images = find_all(S('div > p > img'))
+        for loaded_images in PAGINATOR.pages(extract.extract_images, extract.next_album_page):
+            check_loaded_images(testObject, log, loaded_images)
     except:
         log.write('Failed to load page elements \n')
+        capture_failure(testObject, 'Failed to load page elements')
         return False
 
-    for image in loaded_images:
-        testObject.results_found += 1
-        id = image.web_element.get_attribute('id')
-        match_not_found = True
-        for keyword in testObject.keywords:
-            if keyword in TEST_KEYWORDS:
-                if(int(id) in TEST_KEYWORDS[keyword] and testObject.results_expected != 0 ):
-                    log.write('IMAGE_ID: {} OK \n'.format(id))
-                    match_not_found = False
-        if match_not_found:
-            log.write('IMAGE_ID: {} ERROR \n'.format(id))
-            testObject.errors += 1
+    errors = finish_search(testObject, log)
+    if errors:
+        capture_failure(testObject, 'Search completed with errors')
+    return errors
 
-    if testObject.results_found != testObject.results_expected:
-        testObject.errors += 1
-        log.write('Expected {} results, got {} \n'.format(testObject.results_expected, testObject.results_found))
-    if testObject.errors == 1:
-        log.write('Search completed with 1 error \n')
-    else:
-        log.write('Search completed with {} errors \n'.format(testObject.errors))
-    if testObject.errors > 0:
-        return True
-    return False
+def test_search_with_keywords_http(testObject, log, client):
+    """Performs the same test as test_search_with_keywords, but sends the search straight to the
+    web application's HTTP API instead of using the browser. Every page of the search results
+    is requested and validated.
+    Returns true if there were errors found in the application, or false if there was no errors or
+    the test didnt complete
 
-def main():
-    """Main function of the module, in which the test-log file is opened (and closed) and all 
-    the TEST_CASES are iterated through and performed a search test to. 
+    Parameters
+    ----------
+    testObject : TestInput object
+        test case specifications used in the search are read from the given TestInput object
+    log : records.CaseRecord
+        the result record of the test case
+    client : http_client.AlbumClient
+        a client that is logged into the API
     """
     try:
-        test_log = open(TEST_LOG, 'w')
-        test_log.writelines([
-            '---------------------------------- \n',
-            '------  KEYWORD SEARCH TEST ------ \n',
-            '---------------------------------- \n',
-            '# Initializing test \n',
-            '\n'
-        ])
-        print('# Initializing test')
-        if initialize_keywords(test_log) and initialize_test_cases(test_log):
-            test_log.write('\n')
-            test_log.write('# Starting Chrome \n')
-            print('# Starting Chrome')
-            start_chrome(APP_URL)
-            try:
-                write(USERNAME, into='username')
-                write(PASSWORD, into='password')
-                click('Login')
-            except:
-                test_log.write('Failed to login \n')
-            if add_keywords():
-                test_log.write('# Going through test cases \n')
-                print('# Going through test cases')
-                failed_tests = 0
-                for test_case in TEST_CASES:
-                    refresh()
-                    test_log.write('\n')
-                    test_log.write(test_case.msg + '\n')
-                    try:
-                        write(USERNAME, into='username')
-                        write(PASSWORD, into='password')
-                        click('Login')
-                    except:
-                        test_log.write('Failed to login \n')
-                        break
-                    errors = test_search_with_keywords(test_case, test_log)
-                    if errors:
-                        failed_tests += 1
+        for loaded_images in client.search_pages(keywords=testObject.keywords):
+            check_loaded_images(testObject, log, loaded_images)
+    except Exception:
+        log.write('Search failed \n')
+        return False
+    return finish_search(testObject, log)
+
+def dry_run_test_cases(log):
+    """Checks the test cases against the oracle without performing them: the number of images
+    that TEST_KEYWORDS gives for the keywords of each test case is compared to its
+    results_expected. Returns the number of test cases whose results_expected disagrees with
+    the oracle
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    failed_tests = 0
+    for test_case in TEST_CASES:
+        with records.STREAM.case(test_case, log) as record:
+            record.heading()
+            expected = len(test_case.expected_ids)
+            if expected == test_case.results_expected:
+                record.write('Oracle expects {} results OK \n'.format(expected))
             else:
-                test_log.write('Failed to add keywords for images \n')
-                print('Failed to add keywords for images')
-                failed_tests = len(TEST_CASES)
-            test_log.write('\n')
-            test_log.write('# Closing Chrome \n')
-            print('# Closing Chrome')
-            kill_browser()
-            test_log.writelines([
-                '---------------------------------- \n',
-                '---------- TEST RESULTS ---------- \n',
-                '---------------------------------- \n',
-                '# Test completed with {} failed test cases (out of {})'.format(failed_tests, len(TEST_CASES))
-            ])
-        else:
-            test_log.write('\n')
-            test_log.write('# Test aborted')
-            print('# Test aborted')
-        test_log.close()
-        print('# Test completed')
-    except OSError:
-        print('Error in writing text log')
-
-main()
\ No newline at end of file
+                record.write('Oracle expects {} results, test case {} ERROR \n'.format(expected, test_case.results_expected))
+                test_case.errors += 1
+                failed_tests += 1
+            test_case.completed = True
+            record.finish(test_case.errors > 0)
+    return failed_tests
+
+def run_http_test_cases(log, client):
+    """Logs into the HTTP API once, adds the keywords to the images and performs all TEST_CASES
+    with test_search_with_keywords_http. Returns the number of failed test cases
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    client : http_client.AlbumClient
+        the client used for the requests
+    """
+    try:
+        if not client.login(USERNAME, PASSWORD):
+            raise http_client.ApiError(401, '/login')
+    except Exception:
+        log.write('Failed to login \n')
+        return 0
+    if not add_keywords_http(client, log):
+        log.write('Failed to add keywords for images \n')
+        print('Failed to add keywords for images')
+        return len(TEST_CASES)
+    failed_tests = 0
+    for test_case in TEST_CASES:
+        with records.STREAM.case(test_case, log) as record, timing.TIMER.test_case(test_case.msg):
+            record.heading()
+            errors = record.finish(test_search_with_keywords_http(test_case, record, client))
+        if errors:
+            failed_tests += 1
+    return failed_tests
+
+def case_passed(testObject):
+    """Returns true if the search of a performed test case was validated to the end without errors"""
+    return testObject.completed and testObject.errors == 0
+
+def run_test_case(test_case, log):
+    """Performs one test case: brings the browser to the album view with an empty search field and
+    performs the search test. The browser logs into the web application only if the session has
+    been lost, otherwise SESSION resets the search form in place.
+    Returns true if there were errors found in the application, false if there was no errors,
+    or None if logging in failed and the test case could not be performed
+
+    Parameters
+    ----------
+    test_case : TestInput object
+        the test case to be performed
+    log : records.CaseRecord
+        the result record of the test case
+    """
+    log.heading()
+    try:
+        SESSION.reset()
+    except:
+        log.write('Failed to login \n')
+        return None
+    return test_search_with_keywords(test_case, log)
+
+def initialize(log):
+    """Initializes TEST_KEYWORDS and TEST_CASES.
+    Returns true if initialization succeeded or false if there was an error
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    return initialize_keywords(log) and initialize_test_cases(log)
+
+def prepare_browser(log, options):
+    """Logs the browser into the web application and adds the keywords to the images, through
+    the HTTP API if possible and otherwise in the browser. With several workers the keywords are
+    still added in this single Chrome before the workers are started.
+    Returns true if the keywords were added, or false if the test cases can't be performed
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    options : argparse.Namespace
+        the options of the run, see runner.parse_options
+    """
+    try:
+        SESSION.reset()
+    except:
+        log.write('Failed to login \n')
+    if add_keywords_bulk(options.api_url, log):
+        return True
+    log.write('Adding keywords in the browser \n')
+    print('Adding keywords in the browser')
+    if add_keywords():
+        return True
+    log.write('Failed to add keywords for images \n')
+    print('Failed to add keywords for images')
+    return False
+
+if __name__ == '__main__':
+    parser = runner.option_parser('Keyword search test for the photo album web application', APP_URL, sys.modules[__name__])
+    options = runner.parse_options(parser)
+    runner.start_stub(options)
+    runner.run(sys.modules[__name__], options)
@@ -10,16 +10,34 @@ having the actual web application running in the background.
 This module performs tests to web application's login functionality on Google Chrome.
 Helium's python library (heliumhq.com) is used to perform functions of the application in browser.
 Test cases, which are based on given requirements specification, are read from 'test-cases.json' and
-the results of the test are written into 'test-log.txt'. 
+the results of the test are written into 'test-log.txt'. Generated credential matrices, e.g. of
+harness/credentials.py, are run with '--test-cases'. The login form is filled in and its outcome
+read in one call per test case, and the page is reloaded only after a login that was accepted.
 """
 
-import json
-from helium.api import *
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from harness import artifacts, history, records, runner, session, timeouts, timing
 
 TEST_JSON = 'test-cases.json'
 TEST_LOG = 'test-log.txt'
+TEST_TIMING = 'test-timing.txt'
+TEST_TRACE = 'test-trace.json'
+TEST_CACHE = 'test-cache.json'
+TEST_DURATIONS = 'test-durations.json'
+TEST_SHARD = 'test-shard.json'
+TEST_NETWORK = 'test-network.txt'
+TEST_ARTIFACTS = 'test-artifacts'
+TEST_RESULTS = records.RESULTS
+TEST_HISTORY = history.HISTORY
+TEST_LATENCIES = timeouts.LATENCIES
 TEST_CASES = []
 APP_URL = 'http://localhost:8080/ps/v2/index.html'
+TITLE = 'LOGIN TEST'
+# the test cases have no heading in the test log, see runner.run
+CASE_HEADINGS = False
 
 class TestInput:
     """
@@ -50,98 +68,159 @@ def initialize_test_cases(log):
     log : file
         the file to write into, which needs to be opened before calling this function
     """
-    try:
-        file = open(TEST_JSON, 'r')
-        test_data = json.load(file)
-        file.close()
-        for test_case in test_data:
-            new_test = TestInput(
-                test_case['msg'],
-                test_case['username'],
-                test_case['password']
-            )
-            TEST_CASES.append(new_test)
-        log.write('Added {} test cases \n'.format(len(TEST_CASES)))
-        return True
-    except:
-        log.write('Failed to initialize test cases \n')
-        print('Failed to initialize test cases')
-        return False
+    return runner.load_test_cases(TEST_JSON, lambda test_case: TestInput(
+        test_case['msg'],
+        test_case['username'],
+        test_case['password']
+    ), TEST_CASES, log)
+
+def valid_credentials(testObject):
+    """Returns true if the test case has the valid credentials, the only ones expected to log in"""
+    return testObject.username=='user' and testObject.password=='password'
 
 def test_login(testObject, log):
     """The main testing function of this module. A login action to web application is performed
     in this function and the response of the application is validated and written into the test log.
-    Returns true if there were errors found in the application, or false if there was no errors or
-    the test didnt complete
+    The outcome is read from the page as soon as it is definitive (see session.try_login): the
+    album view appeared, or the login request finished without it. A rejected login leaves the
+    form to be filled in again by the next test case, and only an accepted login is followed by
+    logging out, which reloads the page.
+    Returns true if there were errors found in the application, or false if there was no errors
 
     Parameters
     ----------
     testObject : TestInput object
         test case specifications used in the login are read from the given TestInput object
-    log : file
-        the file to write into, which needs to be opened before calling this function
+    log : records.CaseRecord
+        the result record of the test case
     """
-    write(testObject.username, into='username')
-    write(testObject.password, into='password')
-    click('Login')
-    if ( testObject.username=='user' and testObject.password=='password' ):
-        if ( len(find_all(Image())) == 0 ):
-            log.write('Test case failed: {} \n'.format(testObject.msg))
-            testObject.errors += 1
-        else:
-            log.write('Test case passed: {} \n'.format(testObject.msg))
+    try:
+        outcome = session.try_login(testObject.username, testObject.password)
+    except:
+        outcome = None
+    reason = None
+    if outcome is None:
+        reason = 'Login did not finish'
+        log.write('Login did not finish: {} \n'.format(testObject.msg))
+    elif outcome == 'no form':
+        reason = 'Login form not found'
+        log.write('Login form not found: {} \n'.format(testObject.msg))
+    elif ( outcome == 'logged in' ) == valid_credentials(testObject):
+        log.write('Test case passed: {} \n'.format(testObject.msg))
     else:
-        if ( len(find_all(Image())) == 0):
-            log.write('Test case passed: {} \n'.format(testObject.msg))
-        else:
-            log.write('Test case failed: {} \n'.format(testObject.msg))
-            testObject.errors += 1
-    refresh()
+        reason = 'Test case failed, {}'.format('logged in' if outcome == 'logged in' else 'login rejected')
+        log.write('Test case failed: {} \n'.format(testObject.msg))
+    if reason is not None:
+        testObject.errors += 1
+        artifacts.WRITER.capture(testObject.msg, reason, details={'username': testObject.username[:100]})
+    if outcome != 'rejected':
+        try:
+            session.log_out()
+        except:
+            log.write('Failed to log out after: {} \n'.format(testObject.msg))
     if testObject.errors > 0:
         return True
     return False
 
-def main():
-    """Main function of the module, in which the test-log file is opened (and closed) and all 
-    the TEST_CASES are iterated through and performed a search test to. 
+def test_login_http(testObject, log, client):
+    """Performs the same test as test_login, but sends the credentials straight to the web
+    application's HTTP API instead of using the browser.
+    Returns true if there were errors found in the application, or false if there was no errors
+
+    Parameters
+    ----------
+    testObject : TestInput object
+        test case specifications used in the login are read from the given TestInput object
+    log : records.CaseRecord
+        the result record of the test case
+    client : http_client.AlbumClient
+        the client used for the request
     """
     try:
-        test_log = open(TEST_LOG, 'w')
-        test_log.writelines([
-            '---------------------------------- \n',
-            '----------- LOGIN TEST ----------- \n',
-            '---------------------------------- \n',
-            '# Initializing test \n',
-            '\n'
-        ])
-        print('# Initializing test')
-        if initialize_test_cases(test_log):
-            test_log.write('\n# Starting Chrome \n')
-            print('# Starting Chrome')
-            start_chrome(APP_URL)
-            test_log.write('# Going through test cases \n \n')
-            print('# Going through test cases')
-            failed_tests = 0
-            for test_case in TEST_CASES:
-                if test_login(test_case, test_log):
-                    failed_tests += 1
-            test_log.write('\n')
-            test_log.write('# Closing Chrome \n')
-            print('# Closing Chrome')
-            kill_browser()
-            test_log.writelines([
-                '---------------------------------- \n',
-                '---------- TEST RESULTS ---------- \n',
-                '---------------------------------- \n',
-                '# Test completed with {} failed test cases (out of {})'.format(failed_tests, len(TEST_CASES))
-            ])
-        else:
-            test_log.write('\n')
-            test_log.write('# Test aborted')
-            print('# Test aborted')
-        test_log.close()
-        print('# Test completed')
-    except OSError:
-        print('Error in writing text log')
-
-main()
\ No newline at end of file
+        logged_in = client.login(testObject.username, testObject.password)
+    except Exception:
+        log.write('Login request failed: {} \n'.format(testObject.msg))
+        testObject.errors += 1
+        return True
+    if valid_credentials(testObject) != logged_in:
+        log.write('Test case failed: {} \n'.format(testObject.msg))
+        testObject.errors += 1
+    else:
+        log.write('Test case passed: {} \n'.format(testObject.msg))
+    if testObject.errors > 0:
+        return True
+    return False
+
+def dry_run_test_cases(log):
+    """Writes the expected outcome of every test case into the test log without performing them.
+    The login test has no oracle besides the valid credentials, so no test case can disagree with
+    it and 0 is returned as the number of failed test cases
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    for test_case in TEST_CASES:
+        with records.STREAM.case(test_case, log) as record:
+            if valid_credentials(test_case):
+                record.write('Expected to log in: {} \n'.format(test_case.msg))
+            else:
+                record.write('Expected to be rejected: {} \n'.format(test_case.msg))
+            record.finish(False)
+    return 0
+
+def case_passed(testObject):
+    """Returns true if a performed test case found no errors"""
+    return testObject.errors == 0
+
+def initialize(log):
+    """Initializes TEST_CASES.
+    Returns true if initialization succeeded or false if there was an error
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    return initialize_test_cases(log)
+
+def run_http_test_cases(log, client):
+    """Performs all TEST_CASES with test_login_http. Returns the number of failed test cases
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    client : http_client.AlbumClient
+        the client used for the requests
+    """
+    failed_tests = 0
+    for test_case in TEST_CASES:
+        with records.STREAM.case(test_case, log) as record, timing.TIMER.test_case(test_case.msg):
+            errors = record.finish(test_login_http(test_case, record, client))
+        if errors:
+            failed_tests += 1
+    return failed_tests
+
+def run_test_case(test_case, log):
+    """Performs one test case with test_login.
+    Returns true if there were errors found in the application, or false if there was no errors
+
+    Parameters
+    ----------
+    test_case : TestInput object
+        the test case to be performed
+    log : records.CaseRecord
+        the result record of the test case
+    """
+    return test_login(test_case, log)
+
+if __name__ == '__main__':
+    parser = runner.option_parser('Login test for the photo album web application', APP_URL, sys.modules[__name__])
+    parser.add_argument('--test-cases', default=TEST_JSON,
+        help='test case file, e.g. one written by harness.credentials (default is {})'.format(TEST_JSON))
+    options = runner.parse_options(parser)
+    TEST_JSON = options.test_cases
+    runner.start_stub(options)
+    runner.run(sys.modules[__name__], options)
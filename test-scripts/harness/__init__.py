@@ -0,0 +1,6 @@
+"""Test harness
+
+Helpers shared by the photo album test scripts in the neighbouring directories. The scripts
+add the 'test-scripts' directory to the module search path and import the modules of this
+package directly, so the scripts can still be run from their own directories like before.
+"""
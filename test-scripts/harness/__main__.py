@@ -0,0 +1,57 @@
+"""Test runner command line
+
+Runs any of the test scripts (suites) in one process: 'python -m harness' in the 'test-scripts'
+directory runs all of them, 'python -m harness date-search login' only the given ones. The
+suites are found with runner.discover_suites, and each one is run in its own directory with the
+same options as when the script is run on its own, so the test logs end up in the same places.
+
+In the 'ui' mode with a single worker the suites share one Chrome, and with '--stub' they share
+one stand-in of the application. The 'http' and 'dry-run' modes never import Helium.
+"""
+
+import contextlib
+
+from harness import network, runner, timing
+
+APP_URL = 'http://localhost:8080/ps/v2/index.html'
+
+def main(names, options):
+    """Runs every given suite one after another with runner.run
+
+    Parameters
+    ----------
+    names : list[str]
+        names of the suites from runner.discover_suites, or 'all'
+    options : argparse.Namespace
+        the options of the suites, see runner.parse_options
+    """
+    suites = runner.discover_suites()
+    if 'all' in names:
+        names = list(suites)
+    browser = contextlib.ExitStack()
+    if options.mode == 'ui' and options.workers == 1 and len(names) > 1:
+        if options.network:
+            # the shared Chrome needs its performance log before the suites enable the capture
+            network.CAPTURE.enable(runner.network_budget(options))
+        print('# Starting a shared Chrome')
+        browser.enter_context(runner.shared_browser(options.app_url))
+    with browser:
+        for name in names:
+            print('# Running {}'.format(name))
+            suite = runner.load_suite(suites[name])
+            with runner.suite_directory(suite):
+                runner.run(suite, options)
+            timing.TIMER.drain()
+            network.CAPTURE.drain()
+
+if __name__ == '__main__':
+    suites = runner.discover_suites()
+    parser = runner.option_parser('Runs the test scripts of the photo album web application', APP_URL, prog='python -m harness')
+    parser.add_argument('suites', nargs='*', default=['all'], metavar='suite',
+        help='suites to run: {} or all (default is all)'.format(', '.join(suites)))
+    options = runner.parse_options(parser)
+    for name in options.suites:
+        if name != 'all' and name not in suites:
+            parser.error('unknown suite: {} (choose from {}, all)'.format(name, ', '.join(suites)))
+    runner.start_stub(options)
+    main(options.suites, options)
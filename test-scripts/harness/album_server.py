@@ -0,0 +1,411 @@
+"""Album server
+
+A local stand-in for the photo album web application. It serves the parts of the application
+that the test scripts use: the login form, the album view with its searchbar, '#view-search' and
+'#view-next' pagination and the keyword editor of a single image, all at
+'http://localhost:<port>/ps/v2/index.html', plus the JSON API described in harness.http_client.
+The album is seeded with the same 49 images that the date search test assumes: one image a day
+at 12:00 UTC from 1.6.2018 to 19.7.2018, with ids 0-48 and image files 1.jpg-49.jpg. Larger
+albums continue the same series, or the dates can be read from an album file written by
+harness.generate. The page size and the latency of every API response can be set, so the server
+can be used to benchmark and profile the test scripts themselves. A search with a date that is
+not valid RFC3339 is answered with HTTP 400, and the album view shows no images for it.
+
+Run it with 'python -m harness.album_server' in the 'test-scripts' directory.
+"""
+
+import argparse
+import bisect
+import datetime
+import json
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from harness import dates
+
+BASE_PATH = '/ps/v2'
+USERNAME = 'user'
+PASSWORD = 'password'
+PAGE_SIZE = 9
+FIRST_DATE = datetime.datetime(2018, 6, 1, 12, tzinfo=datetime.timezone.utc)
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# A 1x1 pixel GIF that is served for every image file
+IMAGE_DATA = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Photo album</title>
+<style>
+#view-album > div { display: inline-block; margin: 4px; }
+#view-album img { width: 96px; height: 96px; background: #ccc; cursor: pointer; }
+#view-full { position: fixed; top: 0; right: 0; bottom: 0; left: 0; background: #fff; }
+</style>
+</head>
+<body>
+<div id="view-login">
+    <input id="username" type="text" placeholder="username">
+    <input id="password" type="password" placeholder="password">
+    <button id="login">Login</button>
+    <span id="login-error" hidden>Invalid username or password</span>
+</div>
+<div id="view-main" hidden>
+    <div id="view-searchbar">
+        <input id="search-start" type="text" placeholder="Type start date in RFC3339 format">
+        <input id="search-end" type="text" placeholder="Type end date in RFC3339 format">
+        <input id="search-keywords" type="text" placeholder="Type keywords for search, separated by comma (,)">
+        <button id="view-search">Search</button>
+        <button id="view-next">Next</button>
+    </div>
+    <div id="view-album"></div>
+</div>
+<div id="view-full" hidden>
+    <img id="view-full-image">
+    <textarea id="view-full-keywords" placeholder="Syötä avainsanat pilkulla (,) erotettuna."></textarea>
+    <button id="view-full-save-keywords">Save</button>
+    <button id="view-full-close">Close</button>
+</div>
+<script>
+var state = {query: {start_date: '', end_date: '', keywords: ''}, page: 0, pages: 0, image: null};
+
+function $(id) {
+    return document.getElementById(id);
+}
+
+function api(method, path, data) {
+    var options = {method: method, credentials: 'same-origin', headers: {}};
+    if (data !== undefined) {
+        options.headers['Content-Type'] = 'application/json';
+        options.body = JSON.stringify(data);
+    }
+    return fetch('api' + path, options).then(function (response) {
+        return response.json().then(function (body) {
+            return {status: response.status, body: body};
+        });
+    });
+}
+
+function render(images) {
+    var album = $('view-album');
+    album.innerHTML = '';
+    images.forEach(function (image) {
+        var div = document.createElement('div');
+        var p = document.createElement('p');
+        var img = document.createElement('img');
+        img.id = image.id;
+        img.src = image.src;
+        img.alt = image.date;
+        img.title = image.keywords.join(',');
+        img.onclick = function () { openImage(image); };
+        p.appendChild(img);
+        div.appendChild(p);
+        album.appendChild(div);
+    });
+}
+
+function load(page) {
+    var query = new URLSearchParams(state.query);
+    query.set('page', page);
+    return api('GET', '/images?' + query).then(function (response) {
+        if (response.status === 200) {
+            state.page = response.body.page;
+            state.pages = response.body.pages;
+            render(response.body.images);
+        } else {
+            state.page = 0;
+            state.pages = 0;
+            render([]);
+        }
+    });
+}
+
+function openImage(image) {
+    state.image = image;
+    $('view-full-image').src = image.src;
+    $('view-full-keywords').value = image.keywords.join(',');
+    $('view-full').hidden = false;
+}
+
+$('login').onclick = function () {
+    api('POST', '/login', {username: $('username').value, password: $('password').value}).then(function (response) {
+        if (response.status === 200) {
+            $('view-login').hidden = true;
+            $('view-main').hidden = false;
+            load(0);
+        } else {
+            $('login-error').hidden = false;
+        }
+    });
+};
+
+$('view-search').onclick = function () {
+    state.query = {
+        start_date: $('search-start').value,
+        end_date: $('search-end').value,
+        keywords: $('search-keywords').value
+    };
+    load(0);
+};
+
+$('view-next').onclick = function () {
+    if (state.page + 1 < state.pages) {
+        load(state.page + 1);
+    }
+};
+
+$('view-full-save-keywords').onclick = function () {
+    var keywords = $('view-full-keywords').value.split(',');
+    var image = state.image;
+    api('POST', '/images/' + image.id + '/keywords', {keywords: keywords}).then(function () {
+        image.keywords = keywords.map(function (keyword) { return keyword.trim(); }).filter(Boolean);
+    });
+};
+
+$('view-full-close').onclick = function () {
+    $('view-full').hidden = true;
+};
+</script>
+</body>
+</html>
+"""
+
+def parse_bound(value, end):
+    """Parses a date search field the way the application is specified to, with the RFC3339
+    parser of the date search test's oracle (harness.dates): an empty field is an open bound, a
+    date without time covers the whole day and times without a zone are UTC.
+    Returns microseconds since the epoch, None for an open bound, or raises ValueError for
+    invalid input
+
+    Parameters
+    ----------
+    value : str
+        value of the search field
+    end : bool
+        true if the value is the end of the range
+    """
+    if value == '':
+        return None
+    return dates.parse_timestamp(value, end)
+
+def timestamp(date):
+    """Returns a datetime with a zone as microseconds since the epoch"""
+    return (date - EPOCH) // datetime.timedelta(microseconds=1)
+
+class Album:
+    """
+    The images and keywords served by the album server
+
+    Attributes
+    ----------
+    images : list[dict]
+        images in date order, each with 'id', 'file', 'date' (datetime) and 'keywords' (set)
+    page_size : int
+        the number of images on one page of search results (default is 9)
+    latency : float
+        seconds every API response is delayed by (default is 0)
+    sessions : set
+        session tokens of logged in clients
+    """
+    def __init__(self, count=49, page_size=PAGE_SIZE, latency=0, interval=datetime.timedelta(days=1), dates=None):
+        if dates is None:
+            dates = [FIRST_DATE + i * interval for i in range(count)]
+        self.images = [
+            {
+                'id': i,
+                'file': '{}.jpg'.format(i + 1),
+                'date': date,
+                'keywords': set()
+            }
+            for i, date in enumerate(sorted(dates))
+        ]
+        self.timestamps = [timestamp(image['date']) for image in self.images]
+        self.page_size = page_size
+        self.latency = latency
+        self.sessions = set()
+        self.lock = threading.Lock()
+
+    def search(self, start_date, end_date, keywords):
+        """Returns the images that match the search fields. Raises ValueError if a date is invalid
+
+        Parameters
+        ----------
+        start_date : str
+            value of the 'start date' search field
+        end_date : str
+            value of the 'end date' search field
+        keywords : str
+            value of the keyword search field, keywords separated by comma
+        """
+        start = parse_bound(start_date, False)
+        end = parse_bound(end_date, True)
+        first = 0 if start is None else bisect.bisect_left(self.timestamps, start)
+        last = len(self.timestamps) if end is None else bisect.bisect_right(self.timestamps, end)
+        wanted = set(keyword.strip() for keyword in keywords.split(',') if keyword.strip())
+        if not wanted:
+            return self.images[first:last]
+        with self.lock:
+            return [image for image in self.images[first:last] if image['keywords'] & wanted]
+
+class AlbumHandler(BaseHTTPRequestHandler):
+    """Request handler of the album server, the album is read from the server's 'album' attribute"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data, headers=None):
+        if self.server.album.latency:
+            time.sleep(self.server.album.latency)
+        self.send_body(status, 'application/json', json.dumps(data).encode('utf-8'), headers)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+
+    def logged_in(self):
+        for cookie in self.headers.get('Cookie', '').split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name == 'session' and value in self.server.album.sessions:
+                return True
+        return False
+
+    def image_json(self, image):
+        return {
+            'id': image['id'],
+            'src': 'http://{}{}/images/{}'.format(self.headers.get('Host'), BASE_PATH, image['file']),
+            'date': image['date'].strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'keywords': sorted(image['keywords'])
+        }
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path in (BASE_PATH + '/', BASE_PATH + '/index.html'):
+            return self.send_body(200, 'text/html; charset=utf-8', INDEX_HTML.encode('utf-8'))
+        if url.path.startswith(BASE_PATH + '/images/') and url.path.endswith('.jpg'):
+            return self.send_body(200, 'image/gif', IMAGE_DATA)
+        if url.path != BASE_PATH + '/api/images':
+            return self.send_json(404, {'error': 'not found'})
+        if not self.logged_in():
+            return self.send_json(401, {'error': 'not logged in'})
+        query = urllib.parse.parse_qs(url.query)
+        field = lambda name: query.get(name, [''])[0]
+        album = self.server.album
+        try:
+            found = album.search(field('start_date'), field('end_date'), field('keywords'))
+            page = int(field('page') or 0)
+        except ValueError:
+            return self.send_json(400, {'error': 'invalid search'})
+        start = page * album.page_size
+        self.send_json(200, {
+            'images': [self.image_json(image) for image in found[start:start + album.page_size]],
+            'page': page,
+            'pages': (len(found) + album.page_size - 1) // album.page_size
+        })
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path
+        album = self.server.album
+        try:
+            data = self.read_json()
+        except ValueError:
+            return self.send_json(400, {'error': 'invalid JSON'})
+        if path == BASE_PATH + '/api/login':
+            if data.get('username') == USERNAME and data.get('password') == PASSWORD:
+                token = uuid.uuid4().hex
+                album.sessions.add(token)
+                return self.send_json(200, {'ok': True}, {'Set-Cookie': 'session={}; Path=/'.format(token)})
+            return self.send_json(401, {'error': 'invalid username or password'})
+        parts = path[len(BASE_PATH + '/api/images/'):].split('/')
+        if path.startswith(BASE_PATH + '/api/images/') and len(parts) == 2 and parts[1] == 'keywords':
+            if not self.logged_in():
+                return self.send_json(401, {'error': 'not logged in'})
+            try:
+                id = int(parts[0])
+                if id < 0:
+                    raise IndexError(id)
+                image = album.images[id]
+            except (ValueError, IndexError):
+                return self.send_json(404, {'error': 'no image with given id'})
+            with album.lock:
+                image['keywords'] = set(keyword.strip() for keyword in data.get('keywords', []) if keyword.strip())
+            return self.send_json(200, {'ok': True})
+        self.send_json(404, {'error': 'not found'})
+
+def read_album(path):
+    """Returns the dates of the images in an album file written by harness.generate as a list of
+    datetimes
+
+    Parameters
+    ----------
+    path : str
+        the album file
+    """
+    with open(path, 'r') as file:
+        images = json.load(file)
+    return [EPOCH + datetime.timedelta(microseconds=dates.parse_timestamp(image['date'])) for image in images]
+
+def create_server(port=0, album=None):
+    """Creates an album server listening to the given port on localhost
+
+    Parameters
+    ----------
+    port : int, optional
+        the port to listen to, 0 picks a free port (default is 0)
+    album : Album, optional
+        the album to serve (default is the 49 image album)
+    """
+    server = ThreadingHTTPServer(('localhost', port), AlbumHandler)
+    server.daemon_threads = True
+    server.album = album or Album()
+    return server
+
+def start_server(port=0, album=None):
+    """Starts an album server in a background thread and returns it, see create_server"""
+    server = create_server(port, album)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def app_url(server):
+    """Returns the url of the application's index page on the given server"""
+    return 'http://localhost:{}{}/index.html'.format(server.server_port, BASE_PATH)
+
+def api_url(server):
+    """Returns the url of the API on the given server"""
+    return 'http://localhost:{}{}/api'.format(server.server_port, BASE_PATH)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the photo album web application')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen to (default is 8080)')
+    parser.add_argument('--images', type=int, default=49, help='number of images in the album (default is 49)')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE,
+        help='number of images on one page of search results (default is {})'.format(PAGE_SIZE))
+    parser.add_argument('--latency', type=float, default=0,
+        help='milliseconds every API response is delayed by (default is 0)')
+    parser.add_argument('--album', help='album file written by harness.generate, replaces --images')
+    args = parser.parse_args()
+    album_dates = read_album(args.album) if args.album else None
+    album = Album(args.images, args.page_size, args.latency / 1000, dates=album_dates)
+    server = create_server(args.port, album)
+    print('# Serving {} images at {}'.format(len(album.images), app_url(server)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,184 @@
+"""Failure artifacts
+
+Keeps what the browser showed when a test case failed: a screenshot, the HTML of the album view
+and the IDs of the images that had been loaded. The artifacts are taken from the browser at the
+point of the failure, which only takes the two WebDriver calls, and handed to a background
+thread that compresses them into one zip file per failure and writes it into the artifact
+directory. The test case that comes next does not wait for the disk.
+
+The directory is kept under a maximum size by deleting the oldest zip files first, so the
+artifacts of the latest runs are kept. If the background thread falls behind, artifacts that do
+not fit into its queue are dropped instead of blocking the test.
+"""
+
+import datetime
+import json
+import os
+import queue
+import re
+import threading
+import time
+import zipfile
+
+ARTIFACT_DIR = 'test-artifacts'
+MAX_MB = 100
+QUEUE_SIZE = 32
+ALBUM_SELECTOR = '#view-album'
+
+_HTML_SCRIPT = """
+var element = document.querySelector(arguments[0]) || document.documentElement;
+return element.outerHTML;
+"""
+
+class ArtifactWriter:
+    """
+    Writes failure artifacts into zip files on a background thread
+
+    Attributes
+    ----------
+    enabled : bool
+        if false, nothing is captured (default is false)
+    directory : str
+        the directory the zip files are written into (default is ARTIFACT_DIR)
+    max_bytes : int
+        the maximum total size of the zip files in the directory (default is MAX_MB megabytes)
+    written : int
+        the number of zip files written since start
+    dropped : int
+        the number of failures whose artifacts were dropped because the queue was full
+    """
+    def __init__(self):
+        self.enabled = False
+        self.directory = ARTIFACT_DIR
+        self.max_bytes = MAX_MB * 1024 * 1024
+        self.written = 0
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+
+    def start(self, directory=ARTIFACT_DIR, max_mb=MAX_MB):
+        """Enables capturing and starts the background thread. A started writer needs to be
+        closed before it is started again
+
+        Parameters
+        ----------
+        directory : str, optional
+            the directory the zip files are written into (default is ARTIFACT_DIR)
+        max_mb : float, optional
+            the maximum total size of the directory in megabytes (default is MAX_MB)
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name='artifact-writer', daemon=True)
+        self._thread.start()
+        self.enabled = True
+
+    def settings(self):
+        """Returns (directory, max_mb) if capturing is enabled, or None, used to start the writers
+        of the pool's workers with the same settings
+        """
+        if not self.enabled:
+            return None
+        return (self.directory, self.max_bytes / (1024 * 1024))
+
+    def capture(self, case, reason, image_ids=(), details=None):
+        """Takes a screenshot and the HTML of the album view from Helium's browser and queues
+        them for writing with the loaded image IDs. Does nothing if capturing is not enabled
+
+        Parameters
+        ----------
+        case : str
+            description of the failed test case
+        reason : str
+            what failed, e.g. 'Search failed'
+        image_ids : iterable, optional
+            IDs of the images that had been loaded (default is none)
+        details : dict, optional
+            JSON serializable details that are saved with the artifacts (default is None)
+        """
+        if not self.enabled:
+            return
+        from helium.api import get_driver
+
+        info = {
+            'case': case,
+            'reason': reason,
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'image_ids': sorted(image_ids, key=lambda id: (len(str(id)), str(id))),
+            'details': details or {}
+        }
+        screenshot, html = None, None
+        try:
+            driver = get_driver()
+            info['url'] = driver.current_url
+            screenshot = driver.get_screenshot_as_png()
+            html = driver.execute_script(_HTML_SCRIPT, ALBUM_SELECTOR)
+        except Exception:
+            info['error'] = 'the browser could not be read'
+        try:
+            self._queue.put_nowait((info, screenshot, html))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        for item in iter(self._queue.get, None):
+            try:
+                self._write(*item)
+                self._evict()
+            except OSError:
+                self.dropped += 1
+
+    def _write(self, info, screenshot, html):
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', info['case']).strip('-')[:60] or 'case'
+        # the process id keeps the names of the pool's workers apart
+        name = '{}-{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid(), slug)
+        path = os.path.join(self.directory, name + '.zip')
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(self.directory, '{}-{}.zip'.format(name, suffix))
+        temporary = path + '.tmp'
+        with zipfile.ZipFile(temporary, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('failure.json', json.dumps(info, indent=1))
+            if html is not None:
+                archive.writestr('album.html', html)
+            if screenshot is not None:
+                # PNG is already compressed
+                archive.writestr('screenshot.png', screenshot, zipfile.ZIP_STORED)
+        os.replace(temporary, path)
+        self.written += 1
+
+    def _evict(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.zip'):
+                    files.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                # removed by another process in between
+                pass
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        # the newest file is kept even if it alone is over the limit
+        while total > self.max_bytes and len(files) > 1:
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def close(self):
+        """Waits until the queued artifacts have been written and stops the background thread"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._queue.put(None)
+        self._thread.join()
+
+WRITER = ArtifactWriter()
@@ -0,0 +1,298 @@
+"""Browser pool
+
+A long-lived process that keeps headless Chrome instances open on the application, so that the
+test scripts do not pay for starting Chrome and loading the application. Every instance has a
+profile directory of its own under PROFILE_DIR, which keeps its cookies and HTTP cache between
+runs of the pool, and a DevTools port that a test script attaches its own ChromeDriver session
+to. A test script leases an instance when it starts its browser and releases it when it is done
+(see runner.start_browser and runner.stop_browser). A released instance is reset in the
+background: its other windows are closed and the application is opened again, after which it
+can be leased again. The cookies are kept, so the login survives from one test script to the
+next; the login test logs the browser out when it starts. An instance that has been leased for
+longer than MAX_LEASE seconds is taken back, in case its test script died without releasing it.
+
+The pool is controlled over HTTP on localhost:
+    POST /lease    -> 200 {"id": 0, "debugger_address": "127.0.0.1:40123"}, or 503 if all
+                      instances are leased
+    POST /release  with {"id": 0} -> 200 {}
+    GET /status    -> 200 [{"id": 0, "debugger_address": "...", "state": "free"}, ...]
+
+Start it with 'python -m harness.browsers' in the 'test-scripts' directory and run the test
+scripts with '--browser-pool http://localhost:9520'. If the pool can't be reached or has no
+free instance, the test script starts a Chrome of its own as usual.
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from harness import runner
+
+POOL_PORT = 9520
+POOL_SIZE = 2
+PROFILE_DIR = os.path.join(runner.SCRIPTS_DIR, 'browser-profiles')
+MAX_LEASE = 60 * 60
+REQUEST_TIMEOUT = 5
+APP_URL = 'http://localhost:8080/ps/v2/index.html'
+
+class Instance:
+    """
+    One Chrome of the pool
+
+    Attributes
+    ----------
+    id : int
+        index of the instance in the pool
+    driver : WebDriver
+        the pool's own session of the instance, used to reset it
+    debugger_address : str
+        'host:port' of the DevTools endpoint that test scripts attach to
+    state : str
+        'free', 'leased' or 'resetting'
+    leased_at : float
+        time.monotonic() of the latest lease
+    """
+    def __init__(self, id, driver, debugger_address):
+        self.id = id
+        self.driver = driver
+        self.debugger_address = debugger_address
+        self.state = 'free'
+        self.leased_at = 0.0
+
+    def describe(self):
+        """Returns the instance as a JSON serializable dict"""
+        return {'id': self.id, 'debugger_address': self.debugger_address, 'state': self.state}
+
+class BrowserPool:
+    """
+    The Chrome instances of the pool
+
+    Attributes
+    ----------
+    app_url : str
+        the url of the web application that the instances are kept on
+    instances : list[Instance]
+        the started instances
+    """
+    def __init__(self, app_url):
+        self.app_url = app_url
+        self.instances = []
+        self.lock = threading.Lock()
+
+    def start(self, size, profile_dir=PROFILE_DIR):
+        """Starts the given number of headless Chrome instances and opens the application in each
+
+        Parameters
+        ----------
+        size : int
+            the number of instances
+        profile_dir : str, optional
+            the directory under which every instance has its profile (default is PROFILE_DIR)
+        """
+        from selenium import webdriver
+
+        for id in range(size):
+            port = free_port()
+            options = webdriver.ChromeOptions()
+            options.add_argument('--headless')
+            options.add_argument('--remote-debugging-port={}'.format(port))
+            options.add_argument('--user-data-dir={}'.format(os.path.abspath(os.path.join(profile_dir, str(id)))))
+            driver = webdriver.Chrome(options=options)
+            driver.get(self.app_url)
+            self.instances.append(Instance(id, driver, '127.0.0.1:{}'.format(port)))
+
+    def lease(self):
+        """Returns a free instance and marks it leased, or None if there is none. Instances leased
+        for longer than MAX_LEASE are taken back and leased again as they are
+        """
+        expired = time.monotonic() - MAX_LEASE
+        with self.lock:
+            for instance in self.instances:
+                if instance.state == 'free' or (instance.state == 'leased' and instance.leased_at < expired):
+                    instance.state = 'leased'
+                    instance.leased_at = time.monotonic()
+                    return instance
+        return None
+
+    def release(self, id):
+        """Resets a leased instance in a background thread, after which it can be leased again.
+        Raises IndexError if there is no instance with the id
+
+        Parameters
+        ----------
+        id : int
+            the id of the instance
+        """
+        if id < 0:
+            raise IndexError(id)
+        with self.lock:
+            instance = self.instances[id]
+            if instance.state != 'leased':
+                return
+            instance.state = 'resetting'
+        threading.Thread(target=self._reset, args=(instance,), daemon=True).start()
+
+    def _reset(self, instance):
+        driver = instance.driver
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.get(self.app_url)
+        except Exception:
+            # the instance is leased again as it is, the test script resets it anyway
+            pass
+        with self.lock:
+            instance.state = 'free'
+
+    def close(self):
+        """Closes every instance"""
+        for instance in self.instances:
+            try:
+                instance.driver.quit()
+            except Exception:
+                pass
+        self.instances = []
+
+class PoolHandler(BaseHTTPRequestHandler):
+    """Request handler of the pool, the pool is read from the server's 'pool' attribute"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/status':
+            return self.send_json(404, {'error': 'not found'})
+        self.send_json(200, [instance.describe() for instance in self.server.pool.instances])
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+        if self.path == '/lease':
+            instance = self.server.pool.lease()
+            if instance is None:
+                return self.send_json(503, {'error': 'all instances are leased'})
+            return self.send_json(200, instance.describe())
+        if self.path == '/release':
+            try:
+                self.server.pool.release(int(data['id']))
+            except (KeyError, ValueError, IndexError):
+                return self.send_json(400, {'error': 'no such instance'})
+            return self.send_json(200, {})
+        self.send_json(404, {'error': 'not found'})
+
+def free_port():
+    """Returns a TCP port on localhost that is free at the moment"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _post(pool_url, path, data=None):
+    request = urllib.request.Request(
+        pool_url.rstrip('/') + path, json.dumps(data or {}).encode('utf-8'), {'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def lease(pool_url):
+    """Leases an instance from the pool. Returns its description as a dict with 'id' and
+    'debugger_address', or None if the pool can't be reached or has no free instance
+
+    Parameters
+    ----------
+    pool_url : str
+        the url of the pool, e.g. 'http://localhost:9520'
+    """
+    try:
+        return _post(pool_url, '/lease')
+    except Exception:
+        return None
+
+def release(pool_url, instance):
+    """Returns a leased instance to the pool. Errors are ignored, the pool takes the instance
+    back after MAX_LEASE anyway
+
+    Parameters
+    ----------
+    pool_url : str
+        the url of the pool
+    instance : dict
+        the description returned by lease
+    """
+    try:
+        _post(pool_url, '/release', {'id': instance['id']})
+    except Exception:
+        pass
+
+def attach(instance):
+    """Attaches a new ChromeDriver session to a leased instance and makes it Helium's browser.
+    The network log is enabled in the session if the network is captured
+
+    Parameters
+    ----------
+    instance : dict
+        the description returned by lease
+    """
+    from helium.api import set_driver
+    from selenium import webdriver
+    from harness import network
+
+    options = webdriver.ChromeOptions()
+    options.add_experimental_option('debuggerAddress', instance['debugger_address'])
+    if network.CAPTURE.enabled:
+        network.log_network(options)
+    set_driver(webdriver.Chrome(options=options))
+
+def detach():
+    """Stops the ChromeDriver session of Helium's browser without closing the leased Chrome"""
+    from helium.api import get_driver, set_driver
+
+    driver = get_driver()
+    if driver is not None:
+        try:
+            driver.service.stop()
+        except Exception:
+            pass
+    set_driver(None)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keeps headless Chrome instances open for the test scripts')
+    parser.add_argument('--size', type=int, default=POOL_SIZE,
+        help='number of Chrome instances (default is {})'.format(POOL_SIZE))
+    parser.add_argument('--port', type=int, default=POOL_PORT,
+        help='port the pool listens to on localhost (default is {})'.format(POOL_PORT))
+    parser.add_argument('--app-url', default=APP_URL,
+        help='url of the web application (default is {})'.format(APP_URL))
+    parser.add_argument('--profile-dir', default=PROFILE_DIR,
+        help='directory of the profiles of the instances (default is {})'.format(PROFILE_DIR))
+    args = parser.parse_args()
+    pool = BrowserPool(args.app_url)
+    server = ThreadingHTTPServer(('localhost', args.port), PoolHandler)
+    server.daemon_threads = True
+    server.pool = pool
+    try:
+        print('# Starting {} Chrome instances'.format(args.size))
+        pool.start(args.size, args.profile_dir)
+        print('# Browser pool listening at http://localhost:{}'.format(args.port))
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
@@ -0,0 +1,249 @@
+"""Result cache
+
+Remembers the results of test cases between runs, so that an incremental run performs only the
+test cases whose result can have changed. A result is stored under a key that is a hash of the
+test case definition, the test script's source, the mode of the run and a fingerprint of the
+deployed application build: a hash of the index page and the scripts and stylesheets it links.
+A new build of the application, a change in the test script or a change in a test case gives
+new keys, so the cached results of the old ones are not used.
+
+Test cases that passed with the same key are skipped, test cases that failed are performed
+first and the rest after them. Entries older than the maximum age are dropped and the cache is
+kept under the maximum number of entries by dropping the oldest entries first.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import urllib.parse
+import urllib.request
+
+MAX_ENTRIES = 5000
+MAX_AGE = 7 * 24 * 60 * 60
+FETCH_TIMEOUT = 5
+
+_ASSET_PATTERN = re.compile(r'<(?:script|link)\b[^>]*?(?:src|href)\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+def _encode(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+def digest(*parts):
+    """Returns a hex SHA-256 of the given JSON serializable parts, sets are hashed as sorted lists"""
+    data = json.dumps(parts, sort_keys=True, default=_encode)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def app_fingerprint(app_url, timeout=FETCH_TIMEOUT):
+    """Returns a hash of the application's index page and the scripts and stylesheets it links
+    to, or None if the application can't be reached
+
+    Parameters
+    ----------
+    app_url : str
+        the url of the application's index page
+    timeout : float, optional
+        socket timeout of one request in seconds (default is FETCH_TIMEOUT)
+    """
+    sha = hashlib.sha256()
+    try:
+        with urllib.request.urlopen(app_url, timeout=timeout) as response:
+            index = response.read()
+        sha.update(index)
+        for asset in _ASSET_PATTERN.findall(index.decode('utf-8', 'replace')):
+            with urllib.request.urlopen(urllib.parse.urljoin(app_url, asset), timeout=timeout) as response:
+                sha.update(asset.encode('utf-8'))
+                sha.update(response.read())
+    except Exception:
+        return None
+    return sha.hexdigest()
+
+def file_fingerprint(path):
+    """Returns a hash of the contents of a file, used to fingerprint a test script"""
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+class ResultCache:
+    """
+    Results of test cases stored in a JSON-file
+
+    Attributes
+    ----------
+    path : str
+        the JSON-file the cache is read from and saved into
+    fingerprint : str
+        hash of the application build, the test script and the mode, part of every key
+    max_entries : int
+        the maximum number of entries kept in the file (default is MAX_ENTRIES)
+    max_age : float
+        seconds after which an entry is dropped (default is MAX_AGE, 7 days)
+    entries : dict
+        key -> {'passed': bool, 'time': seconds since the epoch, 'msg': description of the case}
+    """
+    def __init__(self, path, fingerprint, max_entries=MAX_ENTRIES, max_age=MAX_AGE):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = {}
+        try:
+            with open(path, 'r') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            pass
+        self.evict()
+
+    def key(self, test_case):
+        """Returns the key of a test case, computed from its attributes before it is performed
+
+        Parameters
+        ----------
+        test_case : TestInput object
+            the test case, its attributes are the definition of the case
+        """
+        return digest(self.fingerprint, vars(test_case))
+
+    def passed(self, key):
+        """Returns true if the test case passed, false if it failed or None if it is not cached"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return entry['passed']
+
+    def select(self, test_cases, force=False):
+        """Orders the test cases for an incremental run: the cases that failed in an earlier run
+        first, then the cases without a cached result. Returns (cases to perform, their keys in
+        the same order, skipped cases)
+
+        Parameters
+        ----------
+        test_cases : list
+            the TestInput objects of the test script, not yet performed
+        force : bool, optional
+            if true, no test case is skipped (default is false)
+        """
+        failed, unknown, skipped = [], [], []
+        for test_case in test_cases:
+            key = self.key(test_case)
+            passed = self.passed(key)
+            if passed is None:
+                unknown.append((test_case, key))
+            elif not passed:
+                failed.append((test_case, key))
+            elif force:
+                unknown.append((test_case, key))
+            else:
+                skipped.append(test_case)
+        selected = failed + unknown
+        return [case for case, _ in selected], [key for _, key in selected], skipped
+
+    def record(self, key, msg, passed):
+        """Stores the result of a performed test case
+
+        Parameters
+        ----------
+        key : str
+            the key of the test case from key or select
+        msg : str
+            description of the test case, stored for reading the file
+        passed : bool
+            true if the test case passed
+        """
+        self.entries[key] = {'passed': bool(passed), 'time': time.time(), 'msg': msg}
+
+    def evict(self):
+        """Drops the entries older than max_age and then the oldest entries over max_entries"""
+        oldest = time.time() - self.max_age
+        entries = sorted(
+            ((key, entry) for key, entry in self.entries.items() if entry.get('time', 0) >= oldest),
+            key=lambda item: item[1]['time'], reverse=True
+        )
+        self.entries = dict(entries[:self.max_entries])
+
+    def save(self):
+        """Evicts old entries and writes the cache into its file"""
+        self.evict()
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.entries, file, indent=1)
+        os.replace(temporary, self.path)
+
+def open_cache(path, app_url, script_path, mode):
+    """Returns a ResultCache for a run of a test script, or None if the application build can't
+    be fingerprinted, in which case every test case has to be performed
+
+    Parameters
+    ----------
+    path : str
+        the JSON-file of the cache
+    app_url : str
+        the url of the application's index page
+    script_path : str
+        the file of the test script
+    mode : str
+        the mode of the run, results of different modes are kept apart
+    """
+    fingerprint = app_fingerprint(app_url)
+    if fingerprint is None:
+        return None
+    return ResultCache(path, digest(fingerprint, file_fingerprint(script_path), mode))
+
+def start_incremental(test_cases, log, path, app_url, script_path, mode, force=False):
+    """Opens the cache of a test script and removes the test cases that can be skipped from the
+    list in place, ordering the rest with ResultCache.select. Returns the cache and the keys of
+    the remaining test cases, or (None, []) if the application build can't be fingerprinted
+
+    Parameters
+    ----------
+    test_cases : list
+        the TestInput objects of the test script, not yet performed
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    path : str
+        the JSON-file of the cache
+    app_url : str
+        the url of the application's index page
+    script_path : str
+        the file of the test script
+    mode : str
+        the mode of the run
+    force : bool, optional
+        if true, every test case is performed and the cache is only updated (default is false)
+    """
+    result_cache = open_cache(path, app_url, script_path, mode)
+    if result_cache is None:
+        log.write('# Application build could not be fingerprinted, performing all test cases \n')
+        print('# Application build could not be fingerprinted, performing all test cases')
+        return None, []
+    selected, keys, skipped = result_cache.select(test_cases, force)
+    test_cases[:] = selected
+    log.write('# Skipping {} test cases that passed with the same application build \n'.format(len(skipped)))
+    print('# Skipping {} test cases that passed with the same application build'.format(len(skipped)))
+    for test_case in skipped:
+        log.write('Skipped: {} \n'.format(test_case.msg))
+    return result_cache, keys
+
+def finish_incremental(result_cache, keys, test_cases, passed):
+    """Records the results of the performed test cases and saves the cache
+
+    Parameters
+    ----------
+    result_cache : ResultCache or None
+        the cache returned by start_incremental, nothing is done if it is None
+    keys : list[str]
+        the keys returned by start_incremental
+    test_cases : list
+        the performed TestInput objects in the same order as keys
+    passed : function
+        a function that takes a performed test case and returns true if it passed
+    """
+    if result_cache is None:
+        return
+    for key, test_case in zip(keys, test_cases):
+        result_cache.record(key, test_case.msg, passed(test_case))
+    try:
+        result_cache.save()
+    except OSError:
+        print('Failed to save the result cache')
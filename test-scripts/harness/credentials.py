@@ -0,0 +1,151 @@
+"""Credential matrix
+
+Generates login test cases from the valid credentials USERNAME and PASSWORD, which are the ones
+the login test and the stand-in of the application accept: every variant of the username paired
+with every variant of the password, where the variants are the valid value itself, an empty
+value, case variants, one letter in the wrong case, surrounding and inner whitespace, missing
+and extra letters, look-alike unicode (fullwidth letters, Cyrillic homoglyphs, combining accents,
+invisible characters) and strings that try to break out of a query. Long inputs of LONG_LENGTHS
+characters are paired with the valid value of the other field only, to keep the file small, and
+'--random' adds pairs of random strings of mixed scripts. Pairs that end up with the same
+credentials are left out. Only the valid credentials are expected to log in.
+
+The test cases are written into a file in the format of 'test-cases.json', which the login test
+runs with its '--test-cases' option. Line breaks are not generated, since a text field drops them.
+
+Run it with 'python -m harness.credentials' in the 'test-scripts' directory.
+"""
+
+import argparse
+import itertools
+import json
+import random
+
+# the same as in valid_credentials of the login test
+USERNAME = 'user'
+PASSWORD = 'password'
+LONG_LENGTHS = [256, 1024, 8192]
+CREDENTIALS_JSON = 'credential-cases.json'
+
+# Cyrillic letters that look like the Latin ones
+_HOMOGLYPHS = {'a': 'а', 'c': 'с', 'e': 'е', 'o': 'о', 'p': 'р', 's': 'ѕ'}
+_ALPHABETS = [
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    ' !"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~',
+    'äöåÄÖÅßéñø',
+    'абвгдежз',
+    '日本語中文한국어',
+    '\U0001F600\U0001F44D\U0001F4F7\u2764\ufe0f',
+    '\u200b\u200f\u00a0\u0301\t'
+]
+
+def variants(value):
+    """Returns the variants of a valid credential as a list of (description, value) tuples,
+    starting with the valid value. Long inputs are not included, see long_variants
+
+    Parameters
+    ----------
+    value : str
+        the valid username or password
+    """
+    found = [
+        ('valid', value),
+        ('empty', ''),
+        ('upper case', value.upper()),
+        ('title case', value.title()),
+        ('swapped case', value.swapcase())
+    ]
+    for i in range(len(value)):
+        found.append(('letter {} in other case'.format(i + 1), value[:i] + value[i].swapcase() + value[i + 1:]))
+    found += [
+        ('leading space', ' ' + value),
+        ('trailing space', value + ' '),
+        ('trailing tab', value + '\t'),
+        ('inner space', value[:1] + ' ' + value[1:]),
+        ('last letter missing', value[:-1]),
+        ('extra letter', value + value[-1]),
+        ('repeated', value * 2),
+        ('fullwidth', ''.join(chr(ord(c) + 0xFEE0) if '!' <= c <= '~' else c for c in value)),
+        ('Cyrillic homoglyph', ''.join(_HOMOGLYPHS.get(c, c) for c in value)),
+        ('combining accent', value[:1] + '\u0301' + value[1:]),
+        ('zero width space', value[:1] + '\u200b' + value[1:]),
+        ('right-to-left mark', '\u200f' + value),
+        ('non-breaking space', value + '\u00a0'),
+        ('emoji', value + '\U0001F600'),
+        ('quote injection', "{}' OR '1'='1".format(value)),
+        ('object notation', '{"$ne": null}')
+    ]
+    return found
+
+def long_variants(value, lengths=LONG_LENGTHS):
+    """Returns the value repeated to each of the given lengths as (description, value) tuples"""
+    return [('{} characters'.format(length), (value * (length // len(value) + 1))[:length]) for length in lengths]
+
+def random_value(rng, longest=64):
+    """Returns a random string of 1 to longest characters of mixed scripts"""
+    length = rng.randint(1, longest)
+    return ''.join(rng.choice(rng.choice(_ALPHABETS)) for _ in range(length))
+
+def credential_pairs(lengths=LONG_LENGTHS, random_pairs=0, seed=0):
+    """Returns the credential matrix as a list of (username description, username, password
+    description, password) tuples without duplicate credentials
+
+    Parameters
+    ----------
+    lengths : list[int], optional
+        lengths of the long inputs (default is LONG_LENGTHS)
+    random_pairs : int, optional
+        the number of pairs of random strings added (default is 0)
+    seed : int, optional
+        seed of the random strings (default is 0)
+    """
+    pairs = [u + p for u, p in itertools.product(variants(USERNAME), variants(PASSWORD))]
+    for described in long_variants(USERNAME, lengths):
+        pairs.append(described + ('valid', PASSWORD))
+    for described in long_variants(PASSWORD, lengths):
+        pairs.append(('valid', USERNAME) + described)
+    rng = random.Random(seed)
+    for i in range(random_pairs):
+        # every third pair keeps the valid username, so the password check is reached
+        random_username = USERNAME if i % 3 == 0 else random_value(rng)
+        pairs.append(('random' if i % 3 else 'valid', random_username, 'random', random_value(rng)))
+    seen = set()
+    unique = []
+    for pair in pairs:
+        if (pair[1], pair[3]) not in seen:
+            seen.add((pair[1], pair[3]))
+            unique.append(pair)
+    return unique
+
+def test_cases_json(pairs):
+    """Returns credential pairs as a list of test cases in the format of 'test-cases.json'"""
+    return [{
+        'msg': 'Generated login {}: {} username and {} password'.format(i + 1, username_description, password_description),
+        'username': username,
+        'password': password
+    } for i, (username_description, username, password_description, password) in enumerate(pairs)]
+
+def main(lengths, random_pairs, seed, cases_path):
+    """Generates the credential matrix and writes it into a JSON-file, see credential_pairs for
+    the parameters
+
+    Parameters
+    ----------
+    cases_path : str
+        the file the test cases are written into
+    """
+    cases = test_cases_json(credential_pairs(lengths, random_pairs, seed))
+    with open(cases_path, 'w') as file:
+        json.dump(cases, file, indent=4)
+    print('# Wrote {} test cases into {}'.format(len(cases), cases_path))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates login test cases from variants of the valid credentials')
+    parser.add_argument('--lengths', type=lambda text: [int(length) for length in text.split(',')], default=LONG_LENGTHS,
+        help='lengths of the long inputs separated by comma (default is {})'.format(','.join(map(str, LONG_LENGTHS))))
+    parser.add_argument('--random', type=int, default=1000, help='number of pairs of random strings (default is 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random strings (default is 0)')
+    parser.add_argument('--cases', default=CREDENTIALS_JSON,
+        help='test case file to write (default is {})'.format(CREDENTIALS_JSON))
+    args = parser.parse_args()
+    main(args.lengths, args.random, args.seed, args.cases)
@@ -0,0 +1,53 @@
+"""RFC3339 dates
+
+Parses the RFC3339 dates of the search fields and the images into integer timestamps:
+microseconds since the epoch in UTC. Comparing the timestamps orders the dates correctly in
+every form RFC3339 allows, unlike comparing the strings: with or without fractional seconds,
+with 'Z', a '+hh:mm'/'-hh:mm' offset or no zone at all (taken as UTC), and with 'T', 't' or a
+space between the date and the time. A date without time is a bound that covers the whole day,
+so it starts the day as a start bound and ends it as an end bound, like in the application.
+Parsed strings are cached, because the same bounds are parsed again for every page of results.
+"""
+
+import calendar
+import datetime
+import functools
+import re
+
+DAY = 86400 * 1000000
+
+_PATTERN = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[Tt ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?([Zz]|[+-]\d{2}:\d{2})?)?$'
+)
+
+@functools.lru_cache(maxsize=4096)
+def parse_timestamp(value, end=False):
+    """Returns an RFC3339 date as microseconds since the epoch in UTC.
+    Raises ValueError if the value is not a valid RFC3339 date
+
+    Parameters
+    ----------
+    value : str
+        the date, e.g. '2018-06-01', '2018-06-01T12:00:00Z' or '2018-06-01T15:00:00.5+03:00'
+    end : bool, optional
+        true if the value is the end of a range, in which case a date without time is the last
+        microsecond of the day (default is false)
+    """
+    match = _PATTERN.match(value)
+    if match is None:
+        raise ValueError('not an RFC3339 date: {!r}'.format(value))
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    # datetime validates the ranges of the fields, e.g. rejects 2018-02-30
+    moment = datetime.datetime(
+        int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0)
+    )
+    timestamp = calendar.timegm(moment.timetuple()) * 1000000
+    if hour is None:
+        return timestamp + DAY - 1 if end else timestamp
+    if fraction:
+        timestamp += int(fraction[:6].ljust(6, '0'))
+    if zone and zone not in 'Zz':
+        offset = (int(zone[1:3]) * 60 + int(zone[4:6])) * 60 * 1000000
+        timestamp -= offset if zone[0] == '+' else -offset
+    return timestamp
@@ -0,0 +1,75 @@
+"""Result extraction
+
+Reads the images of the web application's album view in a single WebDriver call. Helium's
+find_all returns element handles, and reading an attribute from each handle is one WebDriver
+HTTP round trip per image. Here the attributes of every matched image are collected in the
+browser by one script and returned as a list of plain dicts. next_album_page moves the album
+view to the next page of results for harness.paginate, waiting for the album view to re-render
+with harness.waits instead of polling it.
+"""
+
+from harness import waits
+
+IMAGE_SELECTOR = 'div > p > img'
+NEXT_BUTTON = '#view-next'
+PAGE_TIMEOUT = 2
+
+_NEXT_SCRIPT = """
+var button = document.querySelector(arguments[0]);
+if (button === null || button.disabled || button.offsetParent === null) {
+    return false;
+}
+button.click();
+return true;
+"""
+
+_EXTRACT_SCRIPT = """
+return Array.prototype.map.call(document.querySelectorAll(arguments[0]), function (img) {
+    return {id: img.id, src: img.src, alt: img.alt, title: img.title};
+});
+"""
+
+def extract_images(selector=IMAGE_SELECTOR):
+    """Returns the images currently loaded in the album view as a list of dicts with keys
+    'id', 'src', 'alt' and 'title', in document order
+
+    Parameters
+    ----------
+    selector : str, optional
+        CSS selector of the image elements (default is 'div > p > img')
+    """
+    from helium.api import get_driver
+
+    return get_driver().execute_script(_EXTRACT_SCRIPT, selector)
+
+def next_album_page(index, page, timeout=PAGE_TIMEOUT):
+    """Clicks the album view's '#view-next' button and returns the images of the next page, or an
+    empty list if there is no next page. The application keeps showing the last page when
+    '#view-next' is clicked on it, so if the click does not re-render the album view, the album
+    view does not settle within the timeout, or the first image stays the same, the current page
+    is taken to be the last one. A disabled or hidden button ends the results at once
+
+    Parameters
+    ----------
+    index : int
+        index of the current page (not used, see paginate.Paginator.pages)
+    page : list[dict]
+        the images of the current page
+    timeout : float, optional
+        seconds to wait for the next page to appear, shortened by timeouts.POLICY if it has learned
+        the latencies of 'next_page' (default is PAGE_TIMEOUT)
+    """
+    from helium.api import get_driver
+
+    waits.arm()
+    if not get_driver().execute_script(_NEXT_SCRIPT, NEXT_BUTTON):
+        return []
+    try:
+        if waits.wait_for_render(timeout, action='next_page') in ('idle', 'settled'):
+            return []
+    except Exception:
+        return []
+    images = extract_images()
+    if images and images[0]['src'] != page[0]['src']:
+        return images
+    return []
@@ -0,0 +1,194 @@
+"""Test case generation
+
+Generates synthetic albums of any size and random date search test cases for them. The dates
+of an album and the bounds of thousands of queries are kept in NumPy datetime64 arrays, and the
+expected number of results of every query is computed at once with two binary searches over the
+sorted dates (numpy.searchsorted), instead of comparing each image to each query.
+
+The queries cover the forms of the search fields: dates without time (a start date covers the
+day from its beginning, an end date to its end), timestamps (some of them exactly at the time of
+an image, to test that the bounds are inclusive), empty fields (open bounds) and reversed ranges,
+which find nothing. The semantics are the ones of harness.album_server.parse_bound.
+
+The album is written into a JSON-file that the date search test and the album server read with
+their '--album' option, and the test cases into a file in the format of 'test-cases.json'.
+NumPy is needed only for this module.
+
+Run it with 'python -m harness.generate' in the 'test-scripts' directory.
+"""
+
+import argparse
+import json
+
+DISTRIBUTIONS = ['daily', 'uniform', 'events']
+FIRST_DAY = '2018-06-01'
+ALBUM_JSON = 'album.json'
+CASES_JSON = 'generated-cases.json'
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('NumPy is required for generating test cases (pip install numpy)')
+    return numpy
+
+def synthetic_dates(count, days=49, distribution='events', first_day=FIRST_DAY, seed=0):
+    """Returns the sorted dates of a synthetic album as a datetime64[s] array
+
+    Parameters
+    ----------
+    count : int
+        the number of images
+    days : int, optional
+        the number of days the album spans (default is 49)
+    distribution : str, optional
+        'daily' spreads the images evenly starting at 12:00 of the first day, like the 49 images
+        of the date search test, 'uniform' picks random times, and 'events' groups the images
+        into photo sessions of different sizes at daytime, like in a real album (default)
+    first_day : str, optional
+        the first day of the album (default is '2018-06-01')
+    seed : int, optional
+        seed of the random numbers (default is 0)
+    """
+    np = _numpy()
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(first_day, 's')
+    span = days * 86400
+    if distribution == 'daily':
+        offsets = 43200 + np.arange(count, dtype=np.int64) * span // max(count, 1)
+    elif distribution == 'uniform':
+        offsets = rng.integers(0, span, count)
+    elif distribution == 'events':
+        events = max(1, count // 20)
+        event_days = rng.integers(0, days, events)
+        event_hours = np.clip(rng.normal(15, 3, events), 7, 22)
+        event_starts = event_days * 86400 + (event_hours * 3600).astype(np.int64)
+        weights = rng.pareto(1.5, events) + 1
+        chosen = rng.choice(events, count, p=weights / weights.sum())
+        offsets = event_starts[chosen] + np.abs(rng.normal(0, 2700, count)).astype(np.int64)
+        offsets = np.clip(offsets, 0, span - 1)
+    else:
+        raise ValueError('unknown distribution: {}'.format(distribution))
+    return np.sort(start + offsets.astype('timedelta64[s]'))
+
+def format_dates(dates):
+    """Returns datetime64 values as RFC3339 strings in UTC, e.g. '2018-06-01T12:00:00Z'"""
+    np = _numpy()
+    return np.datetime_as_string(dates, unit='s', timezone='UTC')
+
+def random_queries(dates, count, seed=0, empty=0.1, reverse=0.1, on_image=0.2, date_only=0.3):
+    """Returns random date searches over an album as (start fields, end fields, expected counts),
+    the fields as arrays of strings and the counts as an array of ints
+
+    Parameters
+    ----------
+    dates : numpy.ndarray
+        the sorted datetime64[s] dates of the album
+    count : int
+        the number of queries
+    seed : int, optional
+        seed of the random numbers (default is 0)
+    empty : float, optional
+        probability of an empty field, separately for both fields (default is 0.1)
+    reverse : float, optional
+        probability of a query whose start is after its end (default is 0.1)
+    on_image : float, optional
+        probability of a timestamp bound that is exactly the time of an image (default is 0.2)
+    date_only : float, optional
+        probability of a bound given as a date without time (default is 0.3)
+    """
+    np = _numpy()
+    rng = np.random.default_rng(seed)
+    day = np.timedelta64(1, 'D')
+    low = dates[0].astype('datetime64[D]') - day
+    span = int((dates[-1].astype('datetime64[D]') + 2 * day - low) / np.timedelta64(1, 's'))
+
+    def bounds():
+        values = low + rng.integers(0, span, count).astype('timedelta64[s]')
+        on = rng.random(count) < on_image
+        values[on] = dates[rng.integers(0, len(dates), on.sum())]
+        return values
+
+    first, second = bounds(), bounds()
+    starts, ends = np.minimum(first, second), np.maximum(first, second)
+    swap = rng.random(count) < reverse
+    starts[swap], ends[swap] = ends[swap].copy(), starts[swap].copy()
+
+    # a date without time covers the whole day: from its start for the start field and up to
+    # its last second for the end field
+    start_days = rng.random(count) < date_only
+    end_days = rng.random(count) < date_only
+    starts[start_days] = starts[start_days].astype('datetime64[D]')
+    ends[end_days] = ends[end_days].astype('datetime64[D]') + day - np.timedelta64(1, 's')
+    start_fields = np.where(start_days, np.datetime_as_string(starts, unit='D'), format_dates(starts))
+    end_fields = np.where(end_days, np.datetime_as_string(ends, unit='D'), format_dates(ends))
+
+    # empty fields are open bounds
+    start_empty = rng.random(count) < empty
+    end_empty = rng.random(count) < empty
+    start_fields[start_empty] = ''
+    end_fields[end_empty] = ''
+    starts[start_empty] = dates[0]
+    ends[end_empty] = dates[-1]
+
+    counts = np.searchsorted(dates, ends, 'right') - np.searchsorted(dates, starts, 'left')
+    return start_fields, end_fields, np.maximum(counts, 0)
+
+def album_json(dates):
+    """Returns an album as a list of dicts with the image file and date of each image, in the
+    order of the dates. Image files are named '1.jpg', '2.jpg' and so on like in the application
+    """
+    return [{'file': '{}.jpg'.format(i + 1), 'date': date} for i, date in enumerate(format_dates(dates).tolist())]
+
+def test_cases_json(start_fields, end_fields, counts):
+    """Returns generated queries as a list of test cases in the format of 'test-cases.json'"""
+    cases = []
+    for i, (start, end, results) in enumerate(zip(start_fields.tolist(), end_fields.tolist(), counts.tolist())):
+        cases.append({
+            'msg': 'Generated search {}: {} to {}'.format(i + 1, start or 'no start date', end or 'no end date'),
+            'start_date': start,
+            'end_date': end,
+            'results_expected': results
+        })
+    return cases
+
+def main(images, days, distribution, queries, seed, album_path, cases_path):
+    """Generates an album and queries for it and writes them into JSON-files
+
+    Parameters
+    ----------
+    images : int
+        the number of images in the album
+    days : int
+        the number of days the album spans
+    distribution : str
+        the distribution of the dates, see synthetic_dates
+    queries : int
+        the number of test cases
+    seed : int
+        seed of the random numbers
+    album_path : str
+        the file the album is written into
+    cases_path : str
+        the file the test cases are written into
+    """
+    dates = synthetic_dates(images, days, distribution, seed=seed)
+    start_fields, end_fields, counts = random_queries(dates, queries, seed + 1)
+    with open(album_path, 'w') as file:
+        json.dump(album_json(dates), file, indent=1)
+    with open(cases_path, 'w') as file:
+        json.dump(test_cases_json(start_fields, end_fields, counts), file, indent=4)
+    print('# Wrote {} images into {} and {} test cases into {}'.format(images, album_path, queries, cases_path))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic album and date search test cases for it')
+    parser.add_argument('--images', type=int, default=10000, help='number of images in the album (default is 10000)')
+    parser.add_argument('--days', type=int, default=365, help='number of days the album spans (default is 365)')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='events',
+        help="distribution of the image dates (default is 'events')")
+    parser.add_argument('--queries', type=int, default=1000, help='number of test cases (default is 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random numbers (default is 0)')
+    parser.add_argument('--album', default=ALBUM_JSON, help='album file to write (default is {})'.format(ALBUM_JSON))
+    parser.add_argument('--cases', default=CASES_JSON, help='test case file to write (default is {})'.format(CASES_JSON))
+    args = parser.parse_args()
+    main(args.images, args.days, args.distribution, args.queries, args.seed, args.album, args.cases)
@@ -0,0 +1,288 @@
+"""Result history
+
+Keeps the results of every run of the test scripts in a SQLite database, 'test-history.sqlite'
+in the 'test-scripts' directory, since the test log of a test script only has the latest run.
+After a run, the case records of its 'test-results.jsonl' (see harness.records) are appended
+into the database with the suite, the mode, the fingerprint of the application build (see
+harness.cache) and the time of the run. Dry runs are not recorded.
+
+'python -m harness.history [suites]' in the 'test-scripts' directory compares the latest result
+of every test case to its results in the runs before it, up to RUNS of them in the same mode. A
+test case is flagged if its duration or its number of found images moved more than Z robust
+standard deviations (1.4826 times the median absolute deviation) from the median of the earlier
+runs. Small timing noise of fast test cases is not flagged: a duration also has to be at least
+RATIO times the median and MIN_SECONDS longer than it. The exit status is 1 if a test case was
+flagged, so a search that got twice as slow fails the pipeline even if it still finds the right
+images. Test cases that have not been performed within STALE_HOURS of the latest run of their
+suite are left out, so removed test cases are not compared forever. Test cases are told apart by their
+description and the hash of their definition (see harness.records), so a test case whose
+definition changes starts a history of its own.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+from harness import cache, runner
+
+HISTORY = os.path.join(runner.SCRIPTS_DIR, 'test-history.sqlite')
+RUNS = 10
+MIN_RUNS = 3
+Z = 3.0
+RATIO = 1.5
+MIN_SECONDS = 0.05
+STALE_HOURS = 24
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    suite TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    fingerprint TEXT,
+    shard TEXT,
+    time REAL NOT NULL,
+    failed INTEGER,
+    test_cases INTEGER
+);
+CREATE TABLE IF NOT EXISTS cases (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    suite TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    msg TEXT NOT NULL,
+    key TEXT,
+    fingerprint TEXT,
+    time REAL NOT NULL,
+    status TEXT NOT NULL,
+    errors INTEGER,
+    seconds REAL,
+    results_found INTEGER
+);
+CREATE INDEX IF NOT EXISTS cases_by_case ON cases (suite, mode, msg, key, time);
+CREATE INDEX IF NOT EXISTS cases_by_fingerprint ON cases (fingerprint, time);
+CREATE INDEX IF NOT EXISTS runs_by_suite ON runs (suite, mode, time);
+"""
+
+def connect(path=HISTORY):
+    """Opens the database, creating its tables if they do not exist yet
+
+    Parameters
+    ----------
+    path : str, optional
+        the SQLite file (default is HISTORY)
+    """
+    connection = sqlite3.connect(path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+def read_results(path):
+    """Returns the case records and the summary record of a JSON Lines file of results as a
+    (list of dicts, dict) tuple, the summary being None if the file has none
+
+    Parameters
+    ----------
+    path : str
+        the file written by records.STREAM
+    """
+    cases, summary = [], None
+    with open(path, 'r') as file:
+        for line in file:
+            record = json.loads(line)
+            if record.get('type') == 'case':
+                cases.append(record)
+            elif record.get('type') == 'summary':
+                summary = record
+    return cases, summary
+
+def append_run(connection, cases, summary, mode, fingerprint, shard=None, now=None):
+    """Inserts one run and its test cases into the database. Returns the ID of the run
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        the database
+    cases : list[dict]
+        the case records of the run
+    summary : dict
+        the summary record of the run
+    mode : str
+        the mode of the run
+    fingerprint : str
+        the fingerprint of the application build, None if it is not known
+    shard : str, optional
+        the shard of the run, e.g. '2/4' (default is None)
+    now : float, optional
+        the time of the run in seconds since the epoch (default is the current time)
+    """
+    now = time.time() if now is None else now
+    with connection:
+        run = connection.execute(
+            'INSERT INTO runs (suite, mode, fingerprint, shard, time, failed, test_cases) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (summary['suite'], mode, fingerprint, shard, now, summary['failed'], summary['test_cases'])
+        ).lastrowid
+        connection.executemany(
+            'INSERT INTO cases (run, suite, mode, msg, key, fingerprint, time, status, errors, seconds, results_found) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(run, case['suite'], mode, case['case'], case.get('key'), fingerprint, now, case['status'], case['errors'], case['seconds'],
+              case['counts'].get('results_found')) for case in cases]
+        )
+    return run
+
+def record_run(results_path, mode, app_url, shard=None, path=HISTORY):
+    """Appends the results of a finished run of a test script into the history. Runs that were
+    aborted before their test cases and dry runs are not recorded
+
+    Parameters
+    ----------
+    results_path : str
+        the JSON Lines file of the run, which needs to be closed before calling this function
+    mode : str
+        the mode of the run
+    app_url : str
+        the url of the application's index page, used to fingerprint the build
+    shard : str, optional
+        the shard of the run, e.g. '2/4' (default is None)
+    path : str, optional
+        the SQLite file (default is HISTORY)
+    """
+    if mode == 'dry-run':
+        return
+    try:
+        cases, summary = read_results(results_path)
+        if summary is None or not summary['completed']:
+            return
+        connection = connect(path)
+        try:
+            append_run(connection, cases, summary, mode, cache.app_fingerprint(app_url), shard)
+        finally:
+            connection.close()
+    except (OSError, ValueError, sqlite3.Error):
+        print('Failed to save the result history')
+
+def suite_title(name):
+    """Returns the name of a suite as in its banner, e.g. 'DATE SEARCH TEST' for 'date-search'"""
+    return '{} TEST'.format(name.replace('-', ' ').upper())
+
+def robust_deviation(values, median):
+    """Returns 1.4826 times the median absolute deviation of the values, which estimates the
+    standard deviation without being thrown off by a few outliers
+    """
+    return 1.4826 * statistics.median(abs(value - median) for value in values)
+
+def compare(latest, earlier, z=Z, ratio=RATIO, min_seconds=MIN_SECONDS):
+    """Returns descriptions of how the latest result of a test case moved from its earlier
+    results, empty if it did not
+
+    Parameters
+    ----------
+    latest : tuple
+        (seconds, results found) of the latest run
+    earlier : list[tuple]
+        (seconds, results found) of the earlier runs, newest first
+    z : float, optional
+        robust standard deviations the values may move (default is Z)
+    ratio : float, optional
+        how many times the median a duration needs to be to be flagged (default is RATIO)
+    min_seconds : float, optional
+        how many seconds over the median a duration needs to be to be flagged (default is MIN_SECONDS)
+    """
+    found = []
+    seconds = [row[0] for row in earlier if row[0] is not None]
+    if latest[0] is not None and len(seconds) >= MIN_RUNS:
+        median = statistics.median(seconds)
+        limit = max(median + z * robust_deviation(seconds, median), median * ratio, median + min_seconds)
+        if latest[0] > limit:
+            found.append('took {:.3f} s, median {:.3f} s of {} runs ({:.1f}x)'.format(
+                latest[0], median, len(seconds), latest[0] / median if median else float('inf')))
+    counts = [row[1] for row in earlier if row[1] is not None]
+    if latest[1] is not None and len(counts) >= MIN_RUNS:
+        median = statistics.median(counts)
+        if latest[1] != median and abs(latest[1] - median) > z * robust_deviation(counts, median):
+            found.append('found {} images, median {:g} of {} runs'.format(latest[1], median, len(counts)))
+    return found
+
+def check(connection, suites=None, runs=RUNS, z=Z, ratio=RATIO, min_seconds=MIN_SECONDS, stale_hours=STALE_HOURS):
+    """Compares the latest result of every test case to its earlier results. Returns the flagged
+    test cases as a list of (suite, mode, msg, fingerprint, descriptions) tuples
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        the database
+    suites : list[str], optional
+        names of the suites in capital letters as in their banners, e.g. 'DATE SEARCH TEST'
+        (default is None, all suites)
+    runs : int, optional
+        the number of earlier runs compared to (default is RUNS)
+    z, ratio, min_seconds : float, optional
+        the thresholds, see compare
+    stale_hours : float, optional
+        test cases not performed within this many hours of the latest run of their suite are
+        left out (default is STALE_HOURS)
+    """
+    flagged = []
+    groups = connection.execute('SELECT suite, mode, MAX(time) FROM runs GROUP BY suite, mode ORDER BY suite, mode').fetchall()
+    for suite, mode, latest_time in groups:
+        if suites and suite not in suites:
+            continue
+        cases = connection.execute(
+            'SELECT DISTINCT msg, key FROM cases WHERE suite = ? AND mode = ? AND time >= ?',
+            (suite, mode, latest_time - stale_hours * 60 * 60)
+        ).fetchall()
+        for msg, key in cases:
+            rows = connection.execute(
+                "SELECT seconds, results_found, fingerprint FROM cases WHERE suite = ? AND mode = ? AND msg = ? "
+                "AND key IS ? AND status != 'not performed' ORDER BY time DESC, run DESC LIMIT ?",
+                (suite, mode, msg, key, runs + 1)
+            ).fetchall()
+            if len(rows) < 2:
+                continue
+            found = compare(rows[0][:2], [row[:2] for row in rows[1:]], z, ratio, min_seconds)
+            if found:
+                flagged.append((suite, mode, msg, rows[0][2], found))
+    return flagged
+
+def main(suites, path, runs, z, ratio, min_seconds, stale_hours):
+    """Prints the flagged test cases and returns the exit status: 1 if a test case was flagged,
+    otherwise 0. See check for the parameters
+    """
+    if not os.path.exists(path):
+        print('# No result history in {}'.format(path))
+        return 0
+    connection = connect(path)
+    try:
+        flagged = check(connection, suites, runs, z, ratio, min_seconds, stale_hours)
+    finally:
+        connection.close()
+    for suite, mode, msg, fingerprint, found in flagged:
+        print('{} ({}, build {}): {}'.format(suite, mode, (fingerprint or 'unknown')[:12], msg))
+        for description in found:
+            print('  {}'.format(description))
+    print('# {} test cases moved beyond the threshold of the last {} runs'.format(len(flagged), runs))
+    return 1 if flagged else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Flags test cases whose duration or result count moved from earlier runs')
+    parser.add_argument('suites', nargs='*', metavar='suite',
+        help='suites to check: {} (default is all)'.format(', '.join(runner.discover_suites())))
+    parser.add_argument('--history', default=HISTORY,
+        help='the SQLite file of the history (default is {})'.format(HISTORY))
+    parser.add_argument('--runs', type=int, default=RUNS,
+        help='number of earlier runs compared to (default is {})'.format(RUNS))
+    parser.add_argument('--z', type=float, default=Z,
+        help='robust standard deviations a value may move (default is {:g})'.format(Z))
+    parser.add_argument('--ratio', type=float, default=RATIO,
+        help='times the median a duration needs to be to be flagged (default is {:g})'.format(RATIO))
+    parser.add_argument('--min-seconds', type=float, default=MIN_SECONDS,
+        help='seconds over the median a duration needs to be to be flagged (default is {:g})'.format(MIN_SECONDS))
+    parser.add_argument('--stale-hours', type=float, default=STALE_HOURS,
+        help='leave out test cases not performed within this many hours of the latest run (default is {:g})'.format(STALE_HOURS))
+    args = parser.parse_args()
+    for name in args.suites:
+        if name not in runner.discover_suites():
+            parser.error('unknown suite: {} (choose from {})'.format(name, ', '.join(runner.discover_suites())))
+    sys.exit(main([suite_title(suite) for suite in args.suites], args.history, args.runs, args.z, args.ratio,
+                  args.min_seconds, args.stale_hours))
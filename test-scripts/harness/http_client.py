@@ -0,0 +1,210 @@
+"""HTTP client
+
+Talks to the photo album backend directly over its JSON API, without a browser. Connections
+are kept alive and pooled, so consecutive requests (and requests from several threads) reuse
+open connections instead of opening a new one per request.
+
+The API used by the test scripts:
+
+    POST <api>/login                    {"username": ..., "password": ...}
+                                        200 and a session cookie, or 401
+    GET  <api>/images?start_date=&end_date=&keywords=&page=
+                                        {"images": [{"id", "src", "date", "keywords"}],
+                                         "page": n, "pages": total number of pages}
+    POST <api>/images/<id>/keywords     {"keywords": [...]}
+"""
+
+import http.client
+import json
+import queue
+import threading
+import urllib.parse
+
+from harness import paginate
+
+API_URL = 'http://localhost:8080/ps/v2/api'
+CONNECTIONS = 4
+
+class ApiError(Exception):
+    """Raised when the API responds with an unexpected status code"""
+    def __init__(self, status, path):
+        super().__init__('{} returned HTTP {}'.format(path, status))
+        self.status = status
+        self.path = path
+
+class AlbumClient:
+    """
+    A client for the photo album API with a pool of keep-alive connections
+
+    Attributes
+    ----------
+    api_url : str
+        the base url of the API
+    connections : int
+        the maximum number of connections kept open at the same time (default is CONNECTIONS)
+    timeout : float
+        socket timeout of a single request in seconds (default is 10)
+    cookie : str
+        the session cookie received from the last successful login, sent with every request
+    """
+    def __init__(self, api_url=API_URL, connections=CONNECTIONS, timeout=10):
+        parts = urllib.parse.urlsplit(api_url)
+        self.api_url = api_url
+        self.connections = connections
+        self.timeout = timeout
+        self.cookie = ''
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path.rstrip('/')
+        self._https = parts.scheme == 'https'
+        self._pool = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(connections)
+
+    def _connect(self):
+        if self._https:
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def request(self, method, path, data=None):
+        """Sends a request to the API and returns the status code and the decoded JSON body
+        (None if the response has no body). A connection that was closed by the server is
+        reopened once before giving up.
+
+        Parameters
+        ----------
+        method : str
+            HTTP method
+        path : str
+            path relative to api_url, including the query string
+        data : object, optional
+            a JSON serializable request body
+        """
+        body = None
+        headers = {'Accept': 'application/json'}
+        if data is not None:
+            body = json.dumps(data).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+
+        with self._slots:
+            try:
+                connection = self._pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                connection = self._connect()
+                reused = False
+            try:
+                try:
+                    connection.request(method, self._path + path, body, headers)
+                    response = connection.getresponse()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    if not reused:
+                        raise
+                    connection.close()
+                    connection = self._connect()
+                    connection.request(method, self._path + path, body, headers)
+                    response = connection.getresponse()
+                raw = response.read()
+            except Exception:
+                connection.close()
+                raise
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+            else:
+                self._pool.put(connection)
+
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, json.loads(raw.decode('utf-8')) if raw else None
+
+    def login(self, username, password):
+        """Logs into the API. Returns true if the credentials were accepted, or false if not
+
+        Parameters
+        ----------
+        username : str
+            username sent to the API
+        password : str
+            password sent to the API
+        """
+        status, _ = self.request('POST', '/login', {'username': username, 'password': password})
+        return status == 200
+
+    def search(self, start_date='', end_date='', keywords=None, page=0):
+        """Returns one page of search results as a dict, see the module docstring
+
+        Parameters
+        ----------
+        start_date : str, optional
+            value of the 'start date' search field
+        end_date : str, optional
+            value of the 'end date' search field
+        keywords : list[str], optional
+            keywords of the search, sent separated by comma like in the searchbar
+        page : int, optional
+            index of the page, starting from 0
+        """
+        query = urllib.parse.urlencode({
+            'start_date': start_date,
+            'end_date': end_date,
+            'keywords': ','.join(keywords or []),
+            'page': page
+        })
+        status, result = self.request('GET', '/images?' + query)
+        if status != 200:
+            raise ApiError(status, '/images')
+        return result
+
+    def search_pages(self, start_date='', end_date='', keywords=None, prefetch=True):
+        """Returns a generator that yields the images of every page of a search, one list per
+        page. The number of pages is known from the first response, so the last page is
+        recognized without an extra request
+
+        Parameters
+        ----------
+        start_date : str, optional
+            value of the 'start date' search field
+        end_date : str, optional
+            value of the 'end date' search field
+        keywords : list[str], optional
+            keywords of the search
+        prefetch : bool, optional
+            if true, the next page is requested while the current one is handled (default is true)
+        """
+        pages = []
+
+        def first_page():
+            result = self.search(start_date, end_date, keywords)
+            pages.append(result['pages'])
+            return result['images']
+
+        def next_page(index, page):
+            if index + 1 >= pages[0]:
+                return None
+            return self.search(start_date, end_date, keywords, index + 1)['images']
+
+        return paginate.Paginator(prefetch=prefetch).pages(first_page, next_page)
+
+    def save_keywords(self, id, keywords):
+        """Replaces the keywords of an image
+
+        Parameters
+        ----------
+        id : int
+            the id of the image
+        keywords : list[str]
+            the new keywords of the image
+        """
+        status, _ = self.request('POST', '/images/{}/keywords'.format(id), {'keywords': keywords})
+        if status != 200:
+            raise ApiError(status, '/images/{}/keywords'.format(id))
+
+    def close(self):
+        """Closes all pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,317 @@
+"""Load generation
+
+Replays the date and keyword search test cases as a workload mix from many concurrent virtual
+users over the HTTP API. Every virtual user logs in with a client of its own and performs the
+test cases of the mix one after another, starting from a different case than the other users,
+until the run time is over. Each search is still validated with the oracle of its test script
+(check_loaded_images and finish_search), so errors that only appear under load are counted
+separately from the latency and throughput of the searches.
+
+The virtual users are threads. harness.http_client.AlbumClient is a blocking client and a
+virtual user spends nearly all of its time waiting for the server, so threads reach the same
+concurrency as an event loop would without a second HTTP client implementation.
+
+Run it with 'python -m harness.load' in the 'test-scripts' directory.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from harness import album_server, http_client, records, runner, timing
+
+LOAD_REPORT = 'load-report.txt'
+USERNAME = 'user'
+PASSWORD = 'password'
+PERCENTILES = [0.5, 0.95, 0.99]
+
+class Query:
+    """
+    A class that is used to represent one test case of the workload mix
+
+    Attributes
+    ----------
+    kind : str
+        the query type the case belongs to, 'date' or 'keyword'
+    msg : str
+        the description of the test case
+    script : module
+        the test script whose oracle validates the results
+    data : dict
+        the test case as read from the test script's JSON-file
+    """
+    def __init__(self, kind, msg, script, data):
+        self.kind = kind
+        self.msg = msg
+        self.script = script
+        self.data = data
+
+    def new_case(self):
+        """Returns a new TestInput object of the test script for one run of the query"""
+        if self.kind == 'date':
+            return self.script.TestInput(
+                self.msg, self.data['start_date'], self.data['end_date'], self.data['results_expected']
+            )
+        return self.script.TestInput(
+            self.msg, self.data['keywords'], self.script.expected_ids(self.data['keywords']),
+            self.data.get('results_expected')
+        )
+
+    def run(self, client):
+        """Performs the search with the given client and validates every page with the oracle of
+        the test script. Returns true if the oracle found errors, false if not. Errors of the
+        requests are raised
+
+        Parameters
+        ----------
+        client : http_client.AlbumClient
+            a client that is logged into the API
+        """
+        test_case = self.new_case()
+        log = records.CaseRecord(test_case.msg)
+        if self.kind == 'date':
+            pages = self.script.search_pages_http(test_case, client)
+        else:
+            pages = client.search_pages(keywords=test_case.keywords)
+        for images in pages:
+            self.script.check_loaded_images(test_case, log, images)
+        return self.script.finish_search(test_case, log)
+
+def load_queries(script, kind, directory):
+    """Returns the test cases of a test script as Query objects
+
+    Parameters
+    ----------
+    script : module
+        the test script
+    kind : str
+        the query type of the test cases
+    directory : str
+        the directory of the test script in 'test-scripts', where its JSON-file is read from
+    """
+    with open(os.path.join(runner.SCRIPTS_DIR, directory, script.TEST_JSON), 'r') as file:
+        return [Query(kind, data['msg'], script, data) for data in json.load(file)]
+
+def date_workload():
+    """Returns the test cases of the date search test as a list of Query objects"""
+    script = runner.load_suite(os.path.join(runner.SCRIPTS_DIR, 'Date-search-test', 'date-search-test.py'))
+    script.initialize_images(io.StringIO())
+    return load_queries(script, 'date', 'Date-search-test')
+
+def keyword_workload(client):
+    """Returns the test cases of the keyword search test as a list of Query objects, after adding
+    the keywords of the test to the images of the album
+
+    Parameters
+    ----------
+    client : http_client.AlbumClient
+        a client that is logged into the API, used to add the keywords
+    """
+    script = runner.load_suite(os.path.join(runner.SCRIPTS_DIR, 'Keyword-search-test', 'keyword-search-test.py'))
+    script.initialize_keywords(io.StringIO())
+    log = io.StringIO()
+    if not script.add_keywords_http(client, log):
+        raise RuntimeError(log.getvalue().strip())
+    return load_queries(script, 'keyword', 'Keyword-search-test')
+
+class LoadRun:
+    """
+    Results of a load run
+
+    Attributes
+    ----------
+    users : int
+        the number of virtual users
+    elapsed : float
+        the duration of the run in seconds
+    samples : list[tuple]
+        one (kind, msg, latency in milliseconds, outcome) tuple per performed search, where
+        outcome is 'ok', 'failed' (the oracle found errors) or 'error' (a request failed)
+    logins : dict
+        the number of logins of the virtual users per outcome, 'ok' or 'error' (the login was
+        rejected or its request failed)
+    """
+    def __init__(self, users):
+        self.users = users
+        self.elapsed = 0
+        self.samples = []
+        self.logins = {'ok': 0, 'error': 0}
+        self.lock = threading.Lock()
+
+    def add(self, kind, msg, latency, outcome):
+        """Records one search, see samples"""
+        with self.lock:
+            self.samples.append((kind, msg, latency, outcome))
+
+    def add_login(self, outcome):
+        """Records one login of a virtual user, see logins"""
+        with self.lock:
+            self.logins[outcome] += 1
+
+    def report(self):
+        """Returns the throughput and the latency percentiles per query type as lines of text"""
+        lines = ['# {} virtual users, {:.1f} s, logins ok={} errors={} \n'.format(
+            self.users, self.elapsed, self.logins['ok'], self.logins['error']
+        )]
+        kinds = sorted(set(sample[0] for sample in self.samples))
+        for kind in kinds + [None]:
+            samples = [sample for sample in self.samples if kind is None or sample[0] == kind]
+            if not samples:
+                continue
+            latencies = [sample[2] for sample in samples]
+            lines.append('{}: n={} throughput={:.1f}/s {} max={:.1f}ms failed={} errors={} \n'.format(
+                kind or 'all', len(samples), len(samples) / self.elapsed if self.elapsed else 0,
+                ' '.join('p{:g}={:.1f}ms'.format(p * 100, timing.percentile(latencies, p)) for p in PERCENTILES),
+                max(latencies),
+                sum(1 for sample in samples if sample[3] == 'failed'),
+                sum(1 for sample in samples if sample[3] == 'error')
+            ))
+        failing = sorted(set(sample[1] for sample in self.samples if sample[3] != 'ok'))
+        if failing:
+            lines.append('# Failing test cases \n')
+            lines.extend('{} \n'.format(msg) for msg in failing)
+        return lines
+
+def virtual_user(number, queries, api_url, username, password, deadline, run):
+    """Logs in and performs the queries round robin, starting from the query of its own number,
+    until the deadline. The login and every search are added to the run. A virtual user whose
+    login fails performs no searches
+
+    Parameters
+    ----------
+    number : int
+        the number of the virtual user, starting from 0
+    queries : list[Query]
+        the workload mix
+    api_url : str
+        the url of the API
+    username : str
+        username of the login
+    password : str
+        password of the login
+    deadline : float
+        time.perf_counter() value after which no new search is started
+    run : LoadRun
+        where the searches are recorded
+    """
+    client = http_client.AlbumClient(api_url, 2)
+    try:
+        try:
+            logged_in = client.login(username, password)
+        except Exception:
+            logged_in = False
+        run.add_login('ok' if logged_in else 'error')
+        if not logged_in:
+            return
+        index = number
+        while time.perf_counter() < deadline:
+            query = queries[index % len(queries)]
+            index += 1
+            start = time.perf_counter()
+            try:
+                outcome = 'failed' if query.run(client) else 'ok'
+            except Exception:
+                outcome = 'error'
+            run.add(query.kind, query.msg, (time.perf_counter() - start) * 1000, outcome)
+    finally:
+        client.close()
+
+def run_load(queries, users, duration, api_url=http_client.API_URL, username=USERNAME, password=PASSWORD):
+    """Runs the workload mix with the given number of concurrent virtual users and returns the
+    results as a LoadRun object
+
+    Parameters
+    ----------
+    queries : list[Query]
+        the workload mix
+    users : int
+        the number of virtual users
+    duration : float
+        the duration of the run in seconds
+    api_url : str, optional
+        the url of the API (default is http_client.API_URL)
+    username : str, optional
+        username of the virtual users (default is USERNAME)
+    password : str, optional
+        password of the virtual users (default is PASSWORD)
+    """
+    run = LoadRun(users)
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(target=virtual_user, args=(number, queries, api_url, username, password, deadline, run))
+        for number in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    run.elapsed = time.perf_counter() - start
+    return run
+
+def main(users, duration, kinds, api_url, report, username=USERNAME, password=PASSWORD):
+    """Builds the workload mix of the given query types, runs it and writes the report into
+    a file and the console. Returns the exit status: 1 if no virtual user could log in, 0 if not
+
+    Parameters
+    ----------
+    users : int
+        the number of virtual users
+    duration : float
+        the duration of the run in seconds
+    kinds : list[str]
+        the query types of the mix, 'date' and/or 'keyword'
+    api_url : str
+        the url of the API
+    report : str
+        the file the report is written into
+    username : str, optional
+        username of the login (default is USERNAME)
+    password : str, optional
+        password of the login (default is PASSWORD)
+    """
+    queries = []
+    if 'date' in kinds:
+        queries.extend(date_workload())
+    if 'keyword' in kinds:
+        client = http_client.AlbumClient(api_url, 8)
+        try:
+            if not client.login(username, password):
+                raise http_client.ApiError(401, '/login')
+            queries.extend(keyword_workload(client))
+        finally:
+            client.close()
+    print('# Running {} test cases with {} virtual users for {} s'.format(len(queries), users, duration))
+    run = run_load(queries, users, duration, api_url, username, password)
+    lines = run.report()
+    with open(report, 'w') as file:
+        file.writelines(lines)
+    print(''.join(lines), end='')
+    return 0 if run.logins['ok'] else 1
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of the photo album search with the test cases of the search tests')
+    parser.add_argument('--users', type=int, default=10, help='number of concurrent virtual users (default is 10)')
+    parser.add_argument('--duration', type=float, default=30, help='duration of the run in seconds (default is 30)')
+    parser.add_argument('--queries', default='date,keyword',
+        help="comma separated query types of the mix (default is 'date,keyword')")
+    parser.add_argument('--api-url', default=http_client.API_URL,
+        help='url of the HTTP API (default is {})'.format(http_client.API_URL))
+    parser.add_argument('--report', default=LOAD_REPORT,
+        help='file the report is written into (default is {})'.format(LOAD_REPORT))
+    parser.add_argument('--username', default=USERNAME,
+        help="username of the virtual users (default is '{}')".format(USERNAME))
+    parser.add_argument('--password', default=PASSWORD,
+        help="password of the virtual users (default is '{}')".format(PASSWORD))
+    parser.add_argument('--stub', action='store_true',
+        help='run the load against a local stand-in of the application (harness/album_server.py)')
+    args = parser.parse_args()
+    if args.stub:
+        server = album_server.start_server()
+        args.api_url = album_server.api_url(server)
+    sys.exit(main(args.users, args.duration, args.queries.split(','), args.api_url, args.report,
+        args.username, args.password))
@@ -0,0 +1,199 @@
+"""Shard merge
+
+Combines the results of sharded runs (see harness.sharding) into one test log per test script
+and one pass/fail summary over all of them. The results of the shards of a test script are
+read from its 'test-shard-i-of-N.json' files. The logs of the shards are written one after
+another into 'test-log.txt' under a single banner and a single result, and the case records of
+their 'test-results-i-of-N.jsonl' files into 'test-results.jsonl' with a single summary record
+(see harness.records). The durations measured in the shards are saved into
+'test-durations.json', which balances the next split.
+
+Missing or duplicated shards and shards that split the test cases differently (because they
+read different durations files) are reported in the test log and in the summary, since then
+some test cases may have been performed twice or not at all.
+
+Run it with 'python -m harness.merge [files or directories]' in the 'test-scripts' directory,
+e.g. after copying the shard files of every CI executor into the directories of the test scripts.
+Without arguments the shard files in the directories of all test scripts are merged. The exit
+status is 1 if a test case failed or the shards did not add up.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+from harness import records, runner, sharding
+
+SHARD_PATTERN = 'test-shard-*-of-*.json'
+TEST_LOG = 'test-log.txt'
+
+def find_results(paths):
+    """Returns the shard files found in the given files and directories as a dict of directory
+    -> list of files. Without paths, the directories of all test scripts are searched
+
+    Parameters
+    ----------
+    paths : list[str]
+        shard files and directories that contain them
+    """
+    if not paths:
+        paths = sorted(os.path.dirname(path) for path in runner.discover_suites().values())
+    found = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, SHARD_PATTERN)))
+        else:
+            files = [path]
+        for file in files:
+            found.setdefault(os.path.dirname(os.path.abspath(file)), []).append(file)
+    return found
+
+def check_shards(shards):
+    """Returns the problems of the shards of one test script as a list of strings, empty if the
+    shards are complete and agree on the split
+
+    Parameters
+    ----------
+    shards : list[dict]
+        the results of the shards, sorted by their index
+    """
+    problems = []
+    counts = set(shard['shard'][1] for shard in shards)
+    if len(counts) > 1:
+        problems.append('shards of different splits: {}'.format(', '.join(
+            '{}/{}'.format(*shard['shard']) for shard in shards)))
+        return problems
+    count = counts.pop()
+    indexes = [shard['shard'][0] for shard in shards]
+    missing = sorted(set(range(1, count + 1)) - set(indexes))
+    if missing:
+        problems.append('missing shards: {}'.format(', '.join('{}/{}'.format(index, count) for index in missing)))
+    duplicated = sorted(set(index for index in indexes if indexes.count(index) > 1))
+    if duplicated:
+        problems.append('duplicated shards: {}'.format(', '.join('{}/{}'.format(index, count) for index in duplicated)))
+    if len(set(shard['plan'] for shard in shards)) > 1:
+        problems.append('shards split the test cases differently, check that they read the same {}'.format(
+            sharding.DURATIONS))
+    return problems
+
+def shard_body(shard):
+    """Returns the log of a shard without its banner and result"""
+    text = shard['log']
+    banner = ''.join(runner.banner_lines(shard['title']))
+    if text.startswith(banner):
+        text = text[len(banner):]
+    results = ''.join(runner.results_lines(shard['failed'], len(shard['cases'])))
+    if text.endswith(results):
+        text = text[:-len(results)]
+    return text
+
+def merge_records(directory, shards, failed_tests, performed):
+    """Writes the case records of the shards that have a JSON Lines file into the JSON Lines
+    file of the test script, followed by one summary record
+
+    Parameters
+    ----------
+    directory : str
+        the directory of the test script
+    shards : list[dict]
+        the results of the shards, sorted by their index
+    failed_tests : int
+        the number of failed test cases in all shards
+    performed : int
+        the number of test cases performed in all shards
+    """
+    statuses = {}
+    with open(os.path.join(directory, records.RESULTS), 'w', buffering=records.BUFFER_SIZE) as merged:
+        for shard in shards:
+            path = sharding.shard_path(os.path.join(directory, records.RESULTS), '{}/{}'.format(*shard['shard']))
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as file:
+                for line in file:
+                    record = json.loads(line)
+                    if record.get('type') != 'case':
+                        continue
+                    statuses[record['status']] = statuses.get(record['status'], 0) + 1
+                    merged.write(line)
+        summary = records.summary_json(shards[0]['title'], failed_tests, performed, statuses)
+        merged.write(json.dumps(summary, separators=(',', ':')) + '\n')
+
+def merge_suite(directory, files):
+    """Merges the shards of one test script into its test log, result records and durations file.
+    Returns (title, failed test cases, performed test cases, problems)
+
+    Parameters
+    ----------
+    directory : str
+        the directory of the test script, where the merged files are written
+    files : list[str]
+        the shard files of the test script
+    """
+    shards = []
+    for path in files:
+        with open(path, 'r') as file:
+            shards.append(json.load(file))
+    shards.sort(key=lambda shard: shard['shard'])
+    title = shards[0]['title']
+    problems = check_shards(shards)
+    failed_tests = sum(shard['failed'] for shard in shards)
+    performed = sum(len(shard['cases']) for shard in shards)
+
+    with open(os.path.join(directory, TEST_LOG), 'w') as log:
+        log.writelines(runner.banner_lines(title))
+        log.write('# Merged {} shards \n'.format(len(shards)))
+        for problem in problems:
+            log.write('Shards do not add up, {} ERROR \n'.format(problem))
+        for shard in shards:
+            log.write('\n')
+            log.write('# Shard {}/{} \n'.format(*shard['shard']))
+            log.write(shard_body(shard))
+        runner.write_results(log, failed_tests, performed)
+    merge_records(directory, shards, failed_tests, performed)
+
+    durations_path = os.path.join(directory, sharding.DURATIONS)
+    durations = sharding.load_durations(durations_path)
+    for shard in shards:
+        for case in shard['cases']:
+            if case.get('key') is not None and 'seconds' in case:
+                durations[case['key']] = round(case['seconds'], 3)
+    with open(durations_path, 'w') as file:
+        json.dump(durations, file, indent=1, sort_keys=True)
+    return title, failed_tests, performed, problems
+
+def main(paths):
+    """Merges the shards of every test script found in the given paths, prints the summary and
+    returns the exit status: 0 if every test case passed and the shards added up, otherwise 1
+
+    Parameters
+    ----------
+    paths : list[str]
+        shard files and directories that contain them, see find_results
+    """
+    found = find_results(paths)
+    if not found:
+        print('# No shard results found')
+        return 1
+    status = 0
+    total_failed, total_performed = 0, 0
+    for directory in sorted(found):
+        title, failed_tests, performed, problems = merge_suite(directory, found[directory])
+        print('{}: {} failed test cases (out of {}), merged into {}'.format(
+            title, failed_tests, performed, os.path.join(directory, TEST_LOG)))
+        for problem in problems:
+            print('  {}'.format(problem))
+        if failed_tests or problems:
+            status = 1
+        total_failed += failed_tests
+        total_performed += performed
+    print('# Merge completed with {} failed test cases (out of {})'.format(total_failed, total_performed))
+    return status
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merges the results of sharded test runs')
+    parser.add_argument('paths', nargs='*',
+        help='shard files or directories that contain them (default is the directories of all test scripts)')
+    args = parser.parse_args()
+    sys.exit(main(args.paths))
@@ -0,0 +1,279 @@
+"""Network capture
+
+Records the requests that the album application sends to its API during each test case, so that
+the time spent in the backend can be told apart from the time spent rendering. Chrome is started
+with its performance log enabled, which delivers the DevTools protocol's Network events to
+WebDriver. After each test case the log is read and every API request of the case is recorded
+with its url, status, the time the server took to respond (from sending the request to the
+response headers), the total time until the body was loaded, the transfer size and, for
+searches, the number of images in the response, read with the DevTools Network.getResponseBody
+command.
+
+Every request is checked against the budget, a maximum duration and a maximum transfer size.
+Requests over the budget are flagged in the test log. They do not fail the test case, because
+the functional result does not depend on them, but they are counted in the report that is
+written at the end of the run, so the suite also detects performance regressions of the
+application. Capturing needs a browser and is only done in the 'ui' mode.
+"""
+
+import collections
+import contextlib
+import json
+import urllib.parse
+
+from harness import timing
+
+API_PATH = '/api/'
+BUDGET_MS = 1000
+BUDGET_KB = 256
+
+class Request:
+    """
+    One request of the application to its API
+
+    Attributes
+    ----------
+    case : str
+        description of the test case the request was sent in
+    method : str
+        the HTTP method
+    url : str
+        the url of the request
+    status : int
+        the HTTP status of the response, 0 if the request failed
+    server_ms : float
+        milliseconds from sending the request to receiving the response headers
+    total_ms : float
+        milliseconds from the start of the request to the end of loading the body
+    size : int
+        bytes transferred, headers included
+    images : int
+        the number of images in the response, None if it has no list of images
+    """
+    def __init__(self, case, method, url):
+        self.case = case
+        self.method = method
+        self.url = url
+        self.status = 0
+        self.server_ms = 0.0
+        self.total_ms = 0.0
+        self.size = 0
+        self.images = None
+
+    def path(self):
+        """Returns the path of the url without the query, used to group the requests"""
+        return urllib.parse.urlsplit(self.url).path
+
+    def violations(self, max_ms, max_kb):
+        """Returns descriptions of the ways the request exceeds the budget, empty if it does not"""
+        found = []
+        if self.total_ms > max_ms:
+            found.append('took {:.0f} ms (budget {:g} ms)'.format(self.total_ms, max_ms))
+        if self.size > max_kb * 1024:
+            found.append('transferred {:.1f} KB (budget {:g} KB)'.format(self.size / 1024, max_kb))
+        return found
+
+    def describe(self):
+        """Returns the request as one line of text"""
+        images = '' if self.images is None else ' {} images'.format(self.images)
+        return '{} {} {} {:.0f} ms (server {:.0f} ms) {:.1f} KB{}'.format(
+            self.method, self.url, self.status, self.total_ms, self.server_ms, self.size / 1024, images)
+
+class Capture:
+    """
+    Network capture of one process
+
+    Attributes
+    ----------
+    enabled : bool
+        if false, nothing is captured (default is false)
+    max_ms : float
+        the maximum duration of a request in milliseconds (default is BUDGET_MS)
+    max_kb : float
+        the maximum transfer size of a request in kilobytes (default is BUDGET_KB)
+    requests : list[Request]
+        the captured requests
+    """
+    def __init__(self):
+        self.enabled = False
+        self.max_ms = BUDGET_MS
+        self.max_kb = BUDGET_KB
+        self.requests = []
+
+    def enable(self, budget):
+        """Enables capturing with the given budget
+
+        Parameters
+        ----------
+        budget : tuple
+            (maximum milliseconds, maximum kilobytes) of a request
+        """
+        self.enabled = True
+        self.max_ms, self.max_kb = budget
+
+    def budget(self):
+        """Returns the budget as a tuple if capturing is enabled, or None"""
+        if not self.enabled:
+            return None
+        return (self.max_ms, self.max_kb)
+
+    @contextlib.contextmanager
+    def case(self, msg, log):
+        """Context manager that captures the API requests of the test case run in its body and
+        writes them and the budget violations into the test log
+
+        Parameters
+        ----------
+        msg : str
+            description of the test case
+        log : file
+            the file to write into, which needs to be opened before calling this function
+        """
+        if not self.enabled:
+            yield
+            return
+        from helium.api import get_driver
+
+        # the log is emptied by reading it, so the requests of earlier cases are not counted
+        try:
+            get_driver().get_log('performance')
+        except Exception:
+            pass
+        try:
+            yield
+        finally:
+            try:
+                requests = read_requests(get_driver(), msg)
+            except Exception:
+                log.write('Failed to read the network log \n')
+                requests = []
+            self.requests.extend(requests)
+            for request in requests:
+                log.write('NETWORK: {} \n'.format(request.describe()))
+                for violation in request.violations(self.max_ms, self.max_kb):
+                    log.write('Over budget: {} {} {} \n'.format(request.method, request.path(), violation))
+
+    def drain(self):
+        """Returns the captured requests and forgets them"""
+        requests, self.requests = self.requests, []
+        return requests
+
+    def report(self):
+        """Returns the report of the captured requests as lines of text: per-path latencies and
+        sizes, and every request over the budget
+        """
+        lines = ['# NETWORK BUDGET {:g} ms, {:g} KB per request \n'.format(self.max_ms, self.max_kb)]
+        paths = collections.OrderedDict()
+        for request in self.requests:
+            paths.setdefault('{} {}'.format(request.method, request.path()), []).append(request)
+        for name, requests in paths.items():
+            total = [request.total_ms for request in requests]
+            server = [request.server_ms for request in requests]
+            sizes = [request.size / 1024 for request in requests]
+            lines.append('{}: n={} p50={:.1f}ms p95={:.1f}ms server p95={:.1f}ms size p50={:.1f}KB max={:.1f}KB \n'.format(
+                name, len(requests), timing.percentile(total, 0.5), timing.percentile(total, 0.95),
+                timing.percentile(server, 0.95), timing.percentile(sizes, 0.5), max(sizes)
+            ))
+        lines.append('\n')
+        over = [request for request in self.requests if request.violations(self.max_ms, self.max_kb)]
+        lines.append('# OVER BUDGET: {} of {} requests \n'.format(len(over), len(self.requests)))
+        for request in over:
+            lines.append('{}: {} ({}) \n'.format(
+                request.case, request.describe(), ', '.join(request.violations(self.max_ms, self.max_kb))))
+        return lines
+
+    def over_budget(self):
+        """Returns the number of captured requests over the budget"""
+        return sum(1 for request in self.requests if request.violations(self.max_ms, self.max_kb))
+
+def read_requests(driver, case, api_path=API_PATH):
+    """Reads the performance log of the browser and returns the finished API requests in it
+    as Request objects in the order they were sent
+
+    Parameters
+    ----------
+    driver : WebDriver
+        the browser, started with start_chrome
+    case : str
+        description of the test case, attached to the requests
+    api_path : str, optional
+        part of the url that the requests to the API have (default is '/api/')
+    """
+    requests = collections.OrderedDict()
+    started = {}
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        method, params = message.get('method'), message.get('params', {})
+        request_id = params.get('requestId')
+        if method == 'Network.requestWillBeSent':
+            if api_path in params['request']['url']:
+                requests[request_id] = Request(case, params['request']['method'], params['request']['url'])
+                started[request_id] = params['timestamp']
+        elif request_id not in requests:
+            continue
+        elif method == 'Network.responseReceived':
+            response = params['response']
+            requests[request_id].status = response.get('status', 0)
+            response_timing = response.get('timing')
+            if response_timing:
+                requests[request_id].server_ms = response_timing['receiveHeadersEnd'] - response_timing['sendEnd']
+        elif method == 'Network.loadingFinished':
+            request = requests[request_id]
+            request.total_ms = (params['timestamp'] - started[request_id]) * 1000
+            request.size = int(params.get('encodedDataLength', 0))
+            request.images = count_images(driver, request_id)
+        elif method == 'Network.loadingFailed':
+            request = requests[request_id]
+            request.status = 0
+            request.total_ms = (params['timestamp'] - started[request_id]) * 1000
+    return list(requests.values())
+
+def count_images(driver, request_id):
+    """Returns the number of images in the JSON body of a response, or None if the body is not
+    available or has no list of images
+    """
+    try:
+        body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        images = json.loads(body['body']).get('images')
+    except Exception:
+        return None
+    return len(images) if isinstance(images, list) else None
+
+def log_network(options):
+    """Enables the performance log with the Network events in Chrome options
+
+    Parameters
+    ----------
+    options : ChromeOptions
+        the options of the Chrome or ChromeDriver session
+    """
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+def start_chrome(app_url, headless=False):
+    """Starts Chrome with the performance log enabled, makes it Helium's browser and opens the
+    application in it
+
+    Parameters
+    ----------
+    app_url : str
+        the url of the web application
+    headless : bool, optional
+        if true, Chrome is started without a window (default is false)
+    """
+    from helium.api import go_to, set_driver
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    log_network(options)
+    if headless:
+        options.add_argument('--headless')
+    set_driver(webdriver.Chrome(options=options))
+    go_to(app_url)
+
+def write_report(path):
+    """Writes the report of CAPTURE into a text file"""
+    with open(path, 'w') as file:
+        file.writelines(CAPTURE.report())
+
+CAPTURE = Capture()
@@ -0,0 +1,69 @@
+"""Pagination
+
+Walks the pages of a search result lazily. A generator yields one page of images at a time,
+so the caller can validate a page and forget it before the next one is loaded, and there is no
+limit on the number of pages like there is with recursion. While the caller validates a page,
+the next page is already being loaded in a background thread. The transport specific parts,
+loading the first page and moving to the next one, are given as functions, so the same paginator
+is used for the browser (harness.extract) and for the HTTP API (harness.http_client).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+class Paginator:
+    """
+    Yields the pages of search results and remembers the largest page it has seen
+
+    A page that has fewer images than the largest page seen so far is the last one, so the end
+    of the results is usually detected without asking for the next page at all. Only when the
+    last page is full (or the page size is not known yet) is the next page requested to find
+    out that there is none.
+
+    Attributes
+    ----------
+    page_size : int
+        the largest number of images seen on one page, or the page size of the application if
+        it is known beforehand (default is None)
+    prefetch : bool
+        if true, the next page is loaded in a background thread while the current page is
+        being validated (default is true)
+    """
+    def __init__(self, page_size=None, prefetch=True):
+        self.page_size = page_size
+        self.prefetch = prefetch
+
+    def is_last(self, page):
+        """Returns true if the given page is known to be the last page of the results"""
+        return self.page_size is not None and len(page) < self.page_size
+
+    def pages(self, first_page, next_page):
+        """Generator that yields the pages of one search as lists of images. Stops at the first
+        empty page
+
+        Parameters
+        ----------
+        first_page : function
+            a function without arguments that returns the first page of the results
+        next_page : function
+            a function that takes the index of the current page (starting from 0) and the current
+            page and returns the next page, or an empty list or None if there are no more pages.
+            When prefetching, it is called in a background thread while the caller handles the
+            current page, so the caller must not use the browser between pages
+        """
+        executor = ThreadPoolExecutor(1) if self.prefetch else None
+        try:
+            page = first_page()
+            index = 0
+            while page:
+                self.page_size = max(self.page_size or 0, len(page))
+                if self.is_last(page):
+                    yield page
+                    return
+                if executor is not None:
+                    following = executor.submit(next_page, index, page)
+                yield page
+                page = following.result() if executor is not None else next_page(index, page)
+                index += 1
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
@@ -0,0 +1,145 @@
+"""Worker pool
+
+Runs the test cases of a test script in parallel on a pool of isolated headless Chrome sessions.
+Helium keeps its browser in a module level global, so every worker is a separate process with
+its own Chrome. Workers take test cases from a shared queue one at a time and write the result
+of each test case into a records.CaseRecord of its own. The records are sent back to the calling
+process, which writes them into the test log in the original case order. When timing is
+enabled, the timed events of the workers are merged into the caller's timing.TIMER, and when the
+network is captured, the captured requests into the caller's network.CAPTURE. The workers wait
+with the timeouts learned by the caller's timeouts.POLICY, and the latencies they observe are
+merged into it. Failure artifacts are written by the workers themselves into the same directory.
+"""
+
+import multiprocessing
+import queue
+
+from harness import artifacts, network, records, timeouts, timing
+
+def _worker(app_url, run_case, setup, tasks, results, timed, budget, artifact_settings, latencies):
+    """Starts a headless Chrome and runs test cases from the task queue until a None is received
+
+    Parameters
+    ----------
+    app_url : str
+        the url that Chrome is opened with
+    run_case : function
+        the function that performs one test case, see run_test_cases
+    setup : function or None
+        a function that is called before Chrome is started, used to initialize module state
+        that the test case function needs in the worker process
+    tasks : multiprocessing.Queue
+        queue of (index, test case) tuples
+    results : multiprocessing.Queue
+        queue into which (index, result record, test case, timed events, captured requests,
+        observed latencies) tuples are put
+    timed : bool
+        if true, timing is enabled in the worker
+    budget : tuple or None
+        the budget of network.CAPTURE, which is enabled in the worker if the budget is given
+    artifact_settings : tuple or None
+        the settings of artifacts.WRITER, which is started in the worker if they are given
+    latencies : str or None
+        the latencies file of timeouts.POLICY, which is started in the worker if it is given
+    """
+    from helium.api import start_chrome, kill_browser
+
+    if setup is not None:
+        setup()
+    timing.TIMER.drain()
+    if timed:
+        timing.enable()
+    if budget is not None:
+        network.CAPTURE.enable(budget)
+    if artifact_settings is not None:
+        artifacts.WRITER.start(*artifact_settings)
+    if latencies is not None:
+        timeouts.POLICY.start(latencies)
+    try:
+        if network.CAPTURE.enabled:
+            network.start_chrome(app_url, headless=True)
+        else:
+            start_chrome(app_url, headless=True)
+    except Exception:
+        for index, test_case in iter(tasks.get, None):
+            record = records.CaseRecord(test_case.msg, records.case_key(test_case))
+            record.write('Failed to start Chrome \n')
+            record.finish(True)
+            results.put((index, record, test_case, timing.TIMER.drain(), [], []))
+        artifacts.WRITER.close()
+        return
+
+    for index, test_case in iter(tasks.get, None):
+        record = records.CaseRecord(test_case.msg, records.case_key(test_case))
+        with timing.TIMER.test_case(test_case.msg), network.CAPTURE.case(test_case.msg, record):
+            try:
+                record.finish(run_case(test_case, record))
+            except Exception:
+                record.write('Test case aborted \n')
+                record.finish(True)
+        results.put((index, record, test_case, timing.TIMER.drain(), network.CAPTURE.drain(), timeouts.POLICY.drain()))
+    artifacts.WRITER.close()
+    kill_browser()
+
+def run_test_cases(test_cases, run_case, workers, app_url, setup=None):
+    """Runs the given test cases on a pool of headless Chrome sessions
+    Returns a list of (records.CaseRecord, test case) tuples in the same order as test_cases.
+    The outcome of each test case is in the outcome of its record, and the test case objects in
+    the list are the ones updated by the workers.
+
+    Parameters
+    ----------
+    test_cases : list
+        the test case objects of the test script
+    run_case : function
+        a module level function that takes a test case and a CaseRecord, performs the test case
+        in the worker's browser and returns true if there were errors found in the application,
+        false if there were none, or None if the test case could not be performed
+    workers : int
+        the number of worker processes (and Chrome sessions) to start
+    app_url : str
+        the url of the web application
+    setup : function, optional
+        a module level function that is called in every worker before its Chrome is started
+    """
+    context = multiprocessing.get_context()
+    tasks = context.Queue()
+    results = context.Queue()
+    for index, test_case in enumerate(test_cases):
+        tasks.put((index, test_case))
+    workers = max(1, min(workers, len(test_cases)))
+    for _ in range(workers):
+        tasks.put(None)
+
+    settings = (timing.TIMER.enabled, network.CAPTURE.budget(), artifacts.WRITER.settings(), timeouts.POLICY.settings())
+    processes = [
+        context.Process(target=_worker, args=(app_url, run_case, setup, tasks, results) + settings)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    merged = [None] * len(test_cases)
+    received = 0
+    while received < len(test_cases):
+        try:
+            index, record, test_case, events, requests, latencies = results.get(timeout=1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+        merged[index] = (record, test_case)
+        timing.TIMER.events.extend(events)
+        network.CAPTURE.requests.extend(requests)
+        timeouts.POLICY.absorb(latencies)
+        received += 1
+    for process in processes:
+        process.join()
+
+    for index, result in enumerate(merged):
+        if result is None:
+            record = records.CaseRecord(test_cases[index].msg, records.case_key(test_cases[index]))
+            record.write('Worker exited before finishing the test case \n')
+            record.finish(True)
+            merged[index] = (record, test_cases[index])
+    return merged
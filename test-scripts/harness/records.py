@@ -0,0 +1,276 @@
+"""Result records
+
+Keeps the result of every test case as a structured record: its outcome, the verdict of every
+checked image, the counts of the test case, the messages written about it and its duration. A
+CaseRecord is passed to the test functions in place of the test log, so they keep writing their
+messages with log.write, and the checked images are added to it with image(). Nothing is written
+into the files while the test case runs. When it is finished, the lines of the test log are
+rendered from the record and written with one call, and the record is written as one line of
+JSON into 'test-results.jsonl' next to the test log. The JSON Lines file is written through a
+large buffer and ends with a summary record, so the results can be read by other tools without
+parsing the text of the test log.
+
+The records of a case look like
+    {"type": "case", "suite": "DATE SEARCH TEST", "case": "...", "key": "...", "status": "passed",
+     "errors": 0, "seconds": 1.234, "counts": {"results_expected": 9, "results_found": 9,
+     "images_ok": 9, "images_error": 0}, "images": [{"id": "1", "date": "...", "ok": true}, ...],
+     "messages": ["Search completed with 0 errors"]}
+where the status is 'passed', 'failed', 'incomplete' (the test case could not be validated to
+the end) or 'not performed', and the key is a hash of the definition of the test case, which
+tells apart test cases with the same description.
+"""
+
+import contextlib
+import json
+import time
+
+from harness import cache
+
+RESULTS = 'test-results.jsonl'
+BUFFER_SIZE = 1 << 16
+COUNTS = ['results_expected', 'results_found']
+
+class CaseRecord:
+    """
+    The result of one test case, used as the test log of the test functions
+
+    Attributes
+    ----------
+    msg : str
+        description of the test case
+    key : str
+        hash of the definition of the test case, see case_key (default is None)
+    outcome : bool
+        what the test function returned: true if errors were found, false if not, None if the
+        test case could not be performed (default is None)
+    seconds : float
+        the duration of the test case, set by finish (default is 0)
+    images : list[list]
+        [id, date, ok] of every checked image in the order they were checked
+    """
+    def __init__(self, msg, key=None):
+        self.msg = msg
+        self.key = key
+        self.outcome = None
+        self.seconds = 0.0
+        self.images = []
+        self._entries = []
+        self._start = time.perf_counter()
+
+    def write(self, text):
+        """Adds a message, which is rendered into the test log as it is"""
+        self._entries.append(text)
+
+    def heading(self):
+        """Adds the heading of the test case, an empty line and its description"""
+        self._entries.append(None)
+
+    def image(self, id, ok, date=None):
+        """Adds the verdict of one checked image
+
+        Parameters
+        ----------
+        id : str or int
+            ID of the image
+        ok : bool
+            true if the image was expected in the results
+        date : str, optional
+            date of the image, rendered after the ID if given (default is None)
+        """
+        image = [id, date, ok]
+        self.images.append(image)
+        self._entries.append(image)
+
+    def finish(self, outcome):
+        """Sets the outcome and the duration of the test case. Returns the outcome
+
+        Parameters
+        ----------
+        outcome : bool
+            the return value of the test function
+        """
+        self.outcome = outcome
+        self.seconds = time.perf_counter() - self._start
+        return outcome
+
+    def render(self):
+        """Returns the lines of the test log of the test case as one string"""
+        parts = []
+        for entry in self._entries:
+            if entry is None:
+                parts.append('\n{}\n'.format(self.msg))
+            elif isinstance(entry, str):
+                parts.append(entry)
+            elif entry[1] is None:
+                parts.append('IMAGE_ID: {} {} \n'.format(entry[0], 'OK' if entry[2] else 'ERROR'))
+            else:
+                parts.append('IMAGE_ID: {} DATE: {} {} \n'.format(entry[0], entry[1], 'OK' if entry[2] else 'ERROR'))
+        return ''.join(parts)
+
+    def messages(self):
+        """Returns the messages of the test case as a list of lines without line endings"""
+        lines = []
+        for entry in self._entries:
+            if isinstance(entry, str):
+                lines.extend(line.strip() for line in entry.splitlines() if line.strip())
+        return lines
+
+class ResultStream:
+    """
+    The JSON Lines file of the results of one test script
+
+    Attributes
+    ----------
+    suite : str
+        name of the test in capital letters, as in its banner (default is None)
+    passed : function
+        a function that takes a performed test case and returns true if it passed (default is None,
+        in which case a test case passes if it found no errors)
+    statuses : dict
+        the number of written test cases by status
+    written : list[tuple]
+        (description, key, status, seconds) of every written test case in the order they were
+        written, kept after the file is closed until it is opened again
+    """
+    def __init__(self):
+        self.suite = None
+        self.passed = None
+        self.statuses = {}
+        self.written = []
+        self._file = None
+
+    def open(self, path, suite, passed):
+        """Opens the JSON Lines file for writing
+
+        Parameters
+        ----------
+        path : str
+            the file the records are written into
+        suite : str
+            name of the test in capital letters
+        passed : function
+            a function that takes a performed test case and returns true if it passed
+        """
+        self._file = open(path, 'w', buffering=BUFFER_SIZE)
+        self.suite = suite
+        self.passed = passed
+        self.statuses = {}
+        self.written = []
+
+    def status(self, record, test_case):
+        """Returns the status of a finished test case, see the module docstring"""
+        if record.outcome is None:
+            return 'not performed'
+        if record.outcome:
+            return 'failed'
+        if self.passed is None or self.passed(test_case):
+            return 'passed'
+        return 'incomplete'
+
+    def case_json(self, record, test_case):
+        """Returns the record of a finished test case as a dict"""
+        counts = {name: getattr(test_case, name) for name in COUNTS if hasattr(test_case, name)}
+        ok = sum(1 for image in record.images if image[2])
+        counts['images_ok'] = ok
+        counts['images_error'] = len(record.images) - ok
+        return {
+            'type': 'case',
+            'suite': self.suite,
+            'case': record.msg,
+            'key': record.key,
+            'status': self.status(record, test_case),
+            'errors': getattr(test_case, 'errors', 0),
+            'seconds': round(record.seconds, 3),
+            'counts': counts,
+            'images': [{'id': id, 'date': date, 'ok': ok} for id, date, ok in record.images],
+            'messages': record.messages()
+        }
+
+    def write(self, record, test_case, log):
+        """Writes the lines of a finished test case into the test log and its record into the
+        JSON Lines file if it is open
+
+        Parameters
+        ----------
+        record : CaseRecord
+            the record of the test case
+        test_case : object
+            the test case object, whose errors and result counts are recorded
+        log : file
+            the test log, which needs to be opened before calling this function
+        """
+        log.write(record.render())
+        if self._file is None:
+            return
+        data = self.case_json(record, test_case)
+        self.statuses[data['status']] = self.statuses.get(data['status'], 0) + 1
+        self.written.append((record.msg, record.key, data['status'], record.seconds))
+        self._file.write(json.dumps(data, separators=(',', ':')) + '\n')
+
+    @contextlib.contextmanager
+    def case(self, test_case, log):
+        """Context manager that gives a new CaseRecord for the test case run in its body and
+        writes it when the body exits. The body sets the outcome with CaseRecord.finish
+
+        Parameters
+        ----------
+        test_case : object
+            the test case object, which has a description in its msg attribute
+        log : file
+            the test log, which needs to be opened before calling this function
+        """
+        record = CaseRecord(test_case.msg, case_key(test_case))
+        try:
+            yield record
+        finally:
+            self.write(record, test_case, log)
+
+    def close(self, failed_tests, test_cases, completed=True):
+        """Writes the summary record and closes the JSON Lines file. Does nothing if it is not open
+
+        Parameters
+        ----------
+        failed_tests : int
+            the number of failed test cases, as in the results of the test log
+        test_cases : int
+            the number of test cases
+        completed : bool, optional
+            false if the test was aborted before the test cases were performed (default is true)
+        """
+        if self._file is None:
+            return
+        data = summary_json(self.suite, failed_tests, test_cases, self.statuses, completed)
+        self._file.write(json.dumps(data, separators=(',', ':')) + '\n')
+        self._file.close()
+        self._file = None
+
+def case_key(test_case):
+    """Returns a hash of the attributes of a test case that has not been performed yet"""
+    return cache.digest(vars(test_case))[:16]
+
+def summary_json(suite, failed_tests, test_cases, statuses, completed=True):
+    """Returns the summary record of a test script as a dict
+
+    Parameters
+    ----------
+    suite : str
+        name of the test in capital letters
+    failed_tests : int
+        the number of failed test cases
+    test_cases : int
+        the number of test cases
+    statuses : dict
+        the number of written test cases by status
+    completed : bool, optional
+        false if the test was aborted (default is true)
+    """
+    return {
+        'type': 'summary',
+        'suite': suite,
+        'completed': completed,
+        'failed': failed_tests,
+        'test_cases': test_cases,
+        'statuses': statuses
+    }
+
+STREAM = ResultStream()
@@ -0,0 +1,561 @@
+"""Test runner
+
+The parts that the test scripts share: reading the test cases, the banner and the results of
+the test log, the browser and finding and importing the test scripts (suites) themselves.
+
+Helium, and with it Selenium, is imported only when a browser is started, so the test scripts
+can be imported and run in the 'http' and 'dry-run' modes without loading them. When several
+suites are run in one process (python -m harness), they share one browser: shared_browser
+starts it once, start_browser of each suite only opens the application in it, and stop_browser
+leaves it open for the next suite. With use_browser_pool, start_browser leases an already running
+Chrome from a browser pool (harness.browsers) instead of starting one, and stop_browser returns
+it to the pool. A reused browser is logged out by clearing its cookies and web storage, unless
+the suite keeps the session, in which case the login of the previous suite is reused.
+
+run performs a test script with the options of option_parser: it writes the test log and the
+results, performs the test cases in the mode of the options and writes the reports of the run.
+The test script provides TITLE, its TEST_* files and TEST_CASES and the functions initialize,
+case_passed, dry_run_test_cases, run_http_test_cases and run_test_case, and can define
+KEEP_SESSION, HTTP_CONNECTIONS, CASE_HEADINGS, prepare_browser and setup_worker, see run.
+"""
+
+import argparse
+import contextlib
+import glob
+import importlib.util
+import json
+import os
+import sys
+import urllib.parse
+
+SCRIPTS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+SUITE_PATTERN = '*/*-test.py'
+BANNER_WIDTH = 34
+
+_CLEAR_SCRIPT = """
+window.localStorage.clear();
+window.sessionStorage.clear();
+"""
+
+_shared = {'browser': False, 'pool': None, 'lease': None}
+
+def banner_lines(title):
+    """Returns the banner of a test as lines of the test log, e.g. '-------- DATE SEARCH TEST --------'
+
+    Parameters
+    ----------
+    title : str
+        name of the test in capital letters
+    """
+    return [
+        '-' * BANNER_WIDTH + ' \n',
+        banner_title(title) + ' \n',
+        '-' * BANNER_WIDTH + ' \n',
+        '# Initializing test \n',
+        '\n'
+    ]
+
+def banner_title(title):
+    """Returns a title between dashes, BANNER_WIDTH characters wide. If the dashes can't be
+    split evenly, there is an extra space before the title, as in the original banners, e.g.
+    '------  KEYWORD SEARCH TEST ------'
+    """
+    dashes = (BANNER_WIDTH - len(title) - 2) // 2
+    return '{0} {1}{2} {0}'.format('-' * dashes, ' ' * ((BANNER_WIDTH - len(title)) % 2), title)
+
+def results_lines(failed_tests, test_cases):
+    """Returns the results of a test as lines of the test log
+
+    Parameters
+    ----------
+    failed_tests : int
+        the number of failed test cases
+    test_cases : int
+        the number of performed test cases
+    """
+    return [
+        '-' * BANNER_WIDTH + ' \n',
+        banner_title('TEST RESULTS') + ' \n',
+        '-' * BANNER_WIDTH + ' \n',
+        '# Test completed with {} failed test cases (out of {})'.format(failed_tests, test_cases)
+    ]
+
+def write_banner(log, title):
+    """Writes the banner of a test into the test log
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    title : str
+        name of the test in capital letters
+    """
+    log.writelines(banner_lines(title))
+    print('# Initializing test')
+
+def write_results(log, failed_tests, test_cases):
+    """Writes the results of a test into the test log
+
+    Parameters
+    ----------
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    failed_tests : int
+        the number of failed test cases
+    test_cases : int
+        the number of performed test cases
+    """
+    log.writelines(results_lines(failed_tests, test_cases))
+
+def load_test_cases(path, make_case, test_cases, log):
+    """Reads the test-case-data from a JSON-file and appends a test case object made of every
+    item into test_cases. Returns true if initialization succeeded or false if there was an error
+
+    Parameters
+    ----------
+    path : str
+        the JSON-file of the test cases
+    make_case : function
+        a function that takes one item of the JSON-file as a dict and returns a test case object
+    test_cases : list
+        the list the test case objects are appended into
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    """
+    try:
+        with open(path, 'r') as file:
+            test_data = json.load(file)
+        test_cases.extend(make_case(test_case) for test_case in test_data)
+        log.write('Added {} test cases \n'.format(len(test_cases)))
+        return True
+    except Exception:
+        log.write('Failed to initialize test cases \n')
+        print('Failed to initialize test cases')
+        return False
+
+def use_browser_pool(pool_url):
+    """Makes start_browser lease Chrome from the browser pool at the given url, see harness.browsers
+
+    Parameters
+    ----------
+    pool_url : str
+        the url of the pool, e.g. 'http://localhost:9520', or None to start Chrome as usual
+    """
+    _shared['pool'] = pool_url
+
+def reset_browser(app_url, keep_session=False):
+    """Opens the application's url in a reused browser, logging it out first by clearing its
+    cookies and web storage unless the session is kept. A browser that is already at the url
+    and keeps the session is left as it is. The session is cleared before the application is
+    opened, so the application is loaded only once, unless the browser is at another site, in
+    which case the application needs to be opened first to reach its storage
+
+    Parameters
+    ----------
+    app_url : str
+        the url of the web application
+    keep_session : bool, optional
+        if true, the browser stays logged in (default is false)
+    """
+    from helium.api import get_driver, go_to
+
+    driver = get_driver()
+    if keep_session:
+        if driver.current_url != app_url:
+            go_to(app_url)
+        return
+    if _origin(driver.current_url) != _origin(app_url):
+        go_to(app_url)
+    driver.delete_all_cookies()
+    driver.execute_script(_CLEAR_SCRIPT)
+    go_to(app_url)
+
+def _origin(url):
+    parts = urllib.parse.urlsplit(url)
+    return (parts.scheme, parts.netloc)
+
+def start_browser(app_url, keep_session=False):
+    """Starts Chrome at the application's url, with the performance log enabled if the network
+    is captured. If a shared browser is running, or a browser can be leased from the browser
+    pool, it is reused instead with reset_browser
+
+    Parameters
+    ----------
+    app_url : str
+        the url of the web application
+    keep_session : bool, optional
+        if true, a reused browser is not logged out (default is false)
+    """
+    from helium.api import start_chrome
+    from harness import browsers, network
+
+    if _shared['browser']:
+        reset_browser(app_url, keep_session)
+        return
+    if _shared['pool'] is not None:
+        instance = browsers.lease(_shared['pool'])
+        if instance is not None:
+            try:
+                browsers.attach(instance)
+                reset_browser(app_url, keep_session)
+                _shared['lease'] = instance
+                return
+            except Exception:
+                browsers.release(_shared['pool'], instance)
+    if network.CAPTURE.enabled:
+        network.start_chrome(app_url)
+    else:
+        start_chrome(app_url)
+
+def stop_browser():
+    """Closes Chrome, unless it is a shared browser. A browser leased from the pool is
+    returned to it instead
+    """
+    from helium.api import kill_browser
+    from harness import browsers
+
+    if _shared['browser']:
+        return
+    if _shared['lease'] is not None:
+        browsers.detach()
+        browsers.release(_shared['pool'], _shared['lease'])
+        _shared['lease'] = None
+        return
+    kill_browser()
+
+@contextlib.contextmanager
+def shared_browser(app_url):
+    """Context manager that keeps one Chrome open for all suites run inside it
+
+    Parameters
+    ----------
+    app_url : str
+        the url of the web application
+    """
+    start_browser(app_url)
+    _shared['browser'] = True
+    try:
+        yield
+    finally:
+        _shared['browser'] = False
+        stop_browser()
+
+def discover_suites():
+    """Returns the test scripts in 'test-scripts' as a dict of suite name -> file, the name
+    being the file name without '-test.py', e.g. 'date-search'
+    """
+    suites = {}
+    for path in sorted(glob.glob(os.path.join(SCRIPTS_DIR, SUITE_PATTERN))):
+        suites[os.path.basename(path)[:-len('-test.py')]] = path
+    return suites
+
+def load_suite(path):
+    """Imports a test script from its file and returns it as a module. The module is registered
+    in sys.modules, so that its functions can be sent to the worker processes of harness.pool
+
+    Parameters
+    ----------
+    path : str
+        the file of the test script
+    """
+    name = os.path.basename(path)[:-len('.py')].replace('-', '_')
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    suite = importlib.util.module_from_spec(spec)
+    sys.modules[name] = suite
+    try:
+        spec.loader.exec_module(suite)
+    except Exception:
+        del sys.modules[name]
+        raise
+    return suite
+
+@contextlib.contextmanager
+def suite_directory(suite):
+    """Context manager that runs its body in the directory of a test script, where the script
+    reads its test cases and writes its test log
+
+    Parameters
+    ----------
+    suite : module
+        the test script
+    """
+    previous = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(suite.__file__)))
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def option_parser(description, app_url, suite=None, prog=None):
+    """Returns the command line parser of the options of run, which the test scripts and
+    harness/__main__.py extend with their own options
+
+    Parameters
+    ----------
+    description : str
+        description of the command
+    app_url : str
+        the default url of the web application
+    suite : module, optional
+        the test script, whose files are named in the help (default is None, several scripts)
+    prog : str, optional
+        name of the command (default is the name of the script)
+    """
+    from harness import artifacts, http_client, network, sharding, timeouts
+
+    parser = argparse.ArgumentParser(prog=prog, description=description)
+    parser.add_argument('--workers', type=int, default=1,
+        help='number of parallel headless Chrome sessions (default is 1)')
+    parser.add_argument('--mode', choices=['ui', 'http', 'dry-run'], default='ui',
+        help="'ui' tests the application in Chrome, 'http' uses its HTTP API without a browser, "
+        "'dry-run' only checks the test cases against the oracle (default is 'ui')")
+    parser.add_argument('--api-url', default=http_client.API_URL,
+        help='url of the HTTP API (default is {})'.format(http_client.API_URL))
+    parser.add_argument('--app-url', default=app_url,
+        help='url of the web application (default is {})'.format(app_url))
+    parser.add_argument('--stub', action='store_true',
+        help='run the test against a local stand-in of the application (harness/album_server.py)')
+    parser.add_argument('--timing', action='store_true',
+        help='time every browser action and test case{}'.format(_see(suite, 'TEST_TIMING', 'TEST_TRACE')))
+    parser.add_argument('--incremental', action='store_true',
+        help='skip test cases that passed with the same application build{}'.format(_see(suite, 'TEST_CACHE')))
+    parser.add_argument('--force-all', action='store_true',
+        help='with --incremental, perform every test case and only update the cache')
+    parser.add_argument('--shard', type=sharding.shard_spec,
+        help="perform only part i of N of the test cases, given as 'i/N', see harness/sharding.py")
+    parser.add_argument('--network', action='store_true',
+        help='capture the API requests of every test case in Chrome and check them against the budget{}'.format(
+            _see(suite, 'TEST_NETWORK')))
+    parser.add_argument('--budget-ms', type=float, default=network.BUDGET_MS,
+        help='with --network, milliseconds allowed for one request (default is {})'.format(network.BUDGET_MS))
+    parser.add_argument('--budget-kb', type=float, default=network.BUDGET_KB,
+        help='with --network, kilobytes allowed for one request (default is {})'.format(network.BUDGET_KB))
+    parser.add_argument('--artifacts', action='store_true',
+        help='save a screenshot, the album view and the loaded image IDs of failed test cases{}'.format(
+            _see(suite, 'TEST_ARTIFACTS')))
+    parser.add_argument('--artifacts-mb', type=float, default=artifacts.MAX_MB,
+        help='with --artifacts, megabytes kept per test, oldest deleted first (default is {})'.format(artifacts.MAX_MB))
+    parser.add_argument('--fixed-timeouts', action='store_true',
+        help='wait with the fixed timeouts instead of ones learned from earlier runs, see {}'.format(
+            os.path.basename(timeouts.LATENCIES)))
+    parser.add_argument('--browser-pool',
+        help='lease Chrome from the browser pool at this url (harness/browsers.py) instead of starting it')
+    return parser
+
+def _see(suite, *names):
+    if suite is None:
+        return ''
+    return ', see {}'.format(' and '.join(getattr(suite, name) for name in names))
+
+def parse_options(parser, args=None):
+    """Parses the command line with a parser of option_parser and returns the options. If the
+    options name a browser pool, start_browser leases Chrome from it
+
+    Parameters
+    ----------
+    parser : argparse.ArgumentParser
+        the parser returned by option_parser
+    args : list[str], optional
+        the arguments to parse (default is None, the command line)
+    """
+    options = parser.parse_args(args)
+    use_browser_pool(options.browser_pool)
+    return options
+
+def start_stub(options, album=None):
+    """Starts the stand-in of the application if the options have '--stub' and points the urls
+    of the options to it, see harness/album_server.py
+
+    Parameters
+    ----------
+    options : argparse.Namespace
+        the options returned by parse_options
+    album : album_server.Album, optional
+        the album of the stand-in (default is None, the 49 default images)
+    """
+    from harness import album_server
+
+    if not options.stub:
+        return
+    server = album_server.start_server(album=album)
+    options.app_url = album_server.app_url(server)
+    options.api_url = album_server.api_url(server)
+
+def network_budget(options):
+    """Returns the (milliseconds, kilobytes) allowed for one API request if the options have
+    '--network', or None
+    """
+    if not options.network:
+        return None
+    return (options.budget_ms, options.budget_kb)
+
+def run(suite, options):
+    """Performs a test script: the test log and the results are opened (and closed), all the
+    TEST_CASES of the script are performed in the mode of the options and the reports of the
+    enabled options are written.
+
+    With 'dry-run' the test cases are checked with dry_run_test_cases(log) and with 'http'
+    performed with run_http_test_cases(log, client), the client having HTTP_CONNECTIONS
+    connections (default is http_client.CONNECTIONS). With 'ui' each test case is performed with
+    run_test_case(test_case, record) in one Chrome, or in the workers of harness.pool. Chrome is
+    logged out before the test cases unless KEEP_SESSION is true (default is false), and
+    prepare_browser(log, options), if defined, is called in it before the test cases are
+    performed, also before the workers are started. The workers call setup_worker, if defined.
+    Test cases without a heading in the test log, i.e. with CASE_HEADINGS false (default is
+    true), are separated from the progress lines with an empty line.
+
+    Parameters
+    ----------
+    suite : module
+        the test script
+    options : argparse.Namespace
+        the options returned by parse_options
+    """
+    from harness import artifacts, cache, history, network, records, sharding, timeouts, timing
+
+    ui = options.mode == 'ui'
+    if options.timing:
+        timing.enable(ui)
+    if options.network and ui:
+        network.CAPTURE.enable(network_budget(options))
+    if options.artifacts and ui:
+        artifacts.WRITER.start(suite.TEST_ARTIFACTS, options.artifacts_mb)
+    if not options.fixed_timeouts and ui:
+        timeouts.POLICY.start(suite.TEST_LATENCIES)
+    try:
+        log_path, results_path = suite.TEST_LOG, suite.TEST_RESULTS
+        shard_plan = None
+        if options.shard is not None:
+            log_path = sharding.shard_path(suite.TEST_LOG, options.shard)
+            results_path = sharding.shard_path(suite.TEST_RESULTS, options.shard)
+        test_log = open(log_path, 'w')
+        write_banner(test_log, suite.TITLE)
+        records.STREAM.open(results_path, suite.TITLE, suite.case_passed)
+        test_log.writelines(timeouts.POLICY.lines())
+        if suite.initialize(test_log):
+            test_log.write('\n')
+            result_cache, keys = None, []
+            if options.shard is not None:
+                shard_plan = sharding.start_shard(suite.TEST_CASES, test_log, options.shard, suite.TEST_DURATIONS)
+            if options.incremental and options.mode != 'dry-run':
+                result_cache, keys = cache.start_incremental(
+                    suite.TEST_CASES, test_log, suite.TEST_CACHE, options.app_url, os.path.abspath(suite.__file__),
+                    options.mode, options.force_all
+                )
+            if options.mode == 'dry-run':
+                failed_tests, performed = _dry_run(suite, test_log)
+            elif options.mode == 'http':
+                failed_tests, performed = _run_http(suite, options, test_log)
+            else:
+                failed_tests, performed = _run_browser(suite, options, test_log)
+            cache.finish_incremental(result_cache, keys, performed, suite.case_passed)
+            write_results(test_log, failed_tests, len(suite.TEST_CASES))
+            records.STREAM.close(failed_tests, len(suite.TEST_CASES))
+        else:
+            test_log.write('\n')
+            test_log.write('# Test aborted')
+            print('# Test aborted')
+            records.STREAM.close(0, len(suite.TEST_CASES), completed=False)
+        test_log.close()
+        history.record_run(results_path, options.mode, options.app_url, options.shard, suite.TEST_HISTORY)
+        if options.timing:
+            timing.write_reports(suite.TEST_TIMING, suite.TEST_TRACE)
+            print('# Timings written into {} and {}'.format(suite.TEST_TIMING, suite.TEST_TRACE))
+        if network.CAPTURE.enabled:
+            network.write_report(suite.TEST_NETWORK)
+            print('# {} requests over the network budget, see {}'.format(network.CAPTURE.over_budget(), suite.TEST_NETWORK))
+        if artifacts.WRITER.enabled:
+            artifacts.WRITER.close()
+            print('# Artifacts of failed test cases are in {}'.format(suite.TEST_ARTIFACTS))
+        if timeouts.POLICY.enabled:
+            timeouts.POLICY.save()
+            print('# Latencies of the waits saved into {}'.format(suite.TEST_LATENCIES))
+        if shard_plan is not None:
+            sharding.finish_shard(
+                shard_plan, suite.TITLE, log_path, sharding.shard_path(suite.TEST_SHARD, options.shard), failed_tests
+            )
+        print('# Test completed')
+    except OSError:
+        print('Error in writing text log')
+
+def _progress(log, message):
+    log.write('# {} \n'.format(message))
+    print('# {}'.format(message))
+
+def _start_cases(suite, log, message='Going through test cases'):
+    _progress(log, message)
+    if not getattr(suite, 'CASE_HEADINGS', True):
+        log.write(' \n')
+
+def _dry_run(suite, log):
+    """Checks the test cases of a test script against its oracle. Returns the number of failed
+    test cases and the checked test cases
+    """
+    _start_cases(suite, log, 'Checking test cases against the oracle')
+    failed_tests = suite.dry_run_test_cases(log)
+    log.write('\n')
+    return failed_tests, suite.TEST_CASES
+
+def _run_http(suite, options, log):
+    """Performs the test cases of a test script over the HTTP API. Returns the number of failed
+    test cases and the performed test cases
+    """
+    from harness import http_client
+
+    _progress(log, 'Connecting to {}'.format(options.api_url))
+    client = http_client.AlbumClient(options.api_url, getattr(suite, 'HTTP_CONNECTIONS', http_client.CONNECTIONS))
+    _start_cases(suite, log)
+    failed_tests = suite.run_http_test_cases(log, client)
+    log.write('\n')
+    _progress(log, 'Closing connections')
+    client.close()
+    return failed_tests, suite.TEST_CASES
+
+def _run_browser(suite, options, log):
+    """Performs the test cases of a test script in Chrome, or in the headless Chrome of the
+    workers if there are several. Returns the number of failed test cases and the performed
+    test cases
+    """
+    from harness import network, pool, records, timing
+
+    prepare = getattr(suite, 'prepare_browser', None)
+    if options.workers == 1 or prepare is not None:
+        _progress(log, 'Starting Chrome')
+        start_browser(options.app_url, getattr(suite, 'KEEP_SESSION', False))
+        if prepare is not None and not prepare(log, options):
+            log.write('\n')
+            _progress(log, 'Closing Chrome')
+            stop_browser()
+            return len(suite.TEST_CASES), suite.TEST_CASES
+        if options.workers > 1:
+            _progress(log, 'Closing Chrome')
+            stop_browser()
+    failed_tests = 0
+    if options.workers > 1:
+        _progress(log, 'Starting {} headless Chrome workers'.format(options.workers))
+        _start_cases(suite, log)
+        results = pool.run_test_cases(
+            suite.TEST_CASES, suite.run_test_case, options.workers, options.app_url, getattr(suite, 'setup_worker', None)
+        )
+        for record, test_case in results:
+            records.STREAM.write(record, test_case, log)
+            if record.outcome:
+                failed_tests += 1
+        log.write('\n')
+        _progress(log, 'Closing Chrome workers')
+        return failed_tests, [test_case for _, test_case in results]
+    _start_cases(suite, log)
+    for test_case in suite.TEST_CASES:
+        with records.STREAM.case(test_case, log) as record, timing.TIMER.test_case(test_case.msg), \
+                network.CAPTURE.case(test_case.msg, record):
+            errors = record.finish(suite.run_test_case(test_case, record))
+        if errors is None:
+            break
+        if errors:
+            failed_tests += 1
+    log.write('\n')
+    _progress(log, 'Closing Chrome')
+    stop_browser()
+    return failed_tests, suite.TEST_CASES
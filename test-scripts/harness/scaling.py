@@ -0,0 +1,238 @@
+"""Pagination scaling
+
+Walks every page of a full-range search (empty start and end dates) over albums of growing
+size and reports how the latency of a page depends on its index, to reproduce the slowdowns of
+deep pages. By default each album is seeded into a local album server (harness.album_server)
+with 1 000, 10 000 and 100 000 images. With '--api-url' the album of a running application is
+walked instead; its API can't add images, so it is walked once at the size it has.
+
+The results are validated while streaming: every page is checked and then discarded, so the
+memory used does not grow with the album. The images of a full-range search have to come in
+date order, ties in ID order, and each image has to sort strictly after the one before it,
+which also rules out duplicates without remembering the IDs. With a seeded album the IDs have
+to be within the album and the number of images has to match it, which together with the order
+means that no image is missing. Pages other than the last have to be full.
+
+The latency of every page is kept as one float, and the report divides the pages into segments
+by index with the median and p95 latency of each. If the median of the deepest segment is more
+than DEEP_PAGE_RATIO times the median of the first one, the album is flagged.
+
+Run it with 'python -m harness.scaling' in the 'test-scripts' directory.
+"""
+
+import argparse
+import array
+import time
+
+from harness import album_server, dates, http_client, timing
+
+SIZES = [1000, 10000, 100000]
+SCALING_REPORT = 'scaling-report.txt'
+SEGMENTS = 10
+DEEP_PAGE_RATIO = 2.0
+
+class StreamCheck:
+    """
+    Constant-memory validation of the pages of one full-range search
+
+    Attributes
+    ----------
+    expected : int
+        the number of images in the album, None if it is not known
+    page_size : int
+        the number of images on a full page, taken from the first page
+    images : int
+        the number of images checked
+    errors : list[str]
+        descriptions of the first MAX_ERRORS errors found
+    error_count : int
+        the number of errors found
+    """
+    MAX_ERRORS = 20
+
+    def __init__(self, expected=None):
+        self.expected = expected
+        self.page_size = None
+        self.images = 0
+        self.errors = []
+        self.error_count = 0
+        self._last = None
+        self._short_page = None
+
+    def error(self, description):
+        """Counts an error and keeps its description if there are not too many already"""
+        self.error_count += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(description)
+
+    def check_page(self, index, images):
+        """Checks the images of one page, which can be discarded afterwards
+
+        Parameters
+        ----------
+        index : int
+            the index of the page
+        images : list[dict]
+            the images of the page as returned by the API
+        """
+        if self.page_size is None:
+            self.page_size = len(images)
+        if self._short_page is not None:
+            self.error('page {} follows page {}, which was not full'.format(index, self._short_page))
+            self._short_page = None
+        if len(images) < self.page_size:
+            self._short_page = index
+        for image in images:
+            try:
+                key = (dates.parse_timestamp(image['date']), image['id'])
+            except (KeyError, ValueError):
+                self.error('page {}: image without a valid date or ID: {!r}'.format(index, image))
+                continue
+            if self._last is not None and key <= self._last:
+                self.error('page {}: image {} ({}) is not after image {}'.format(index, image['id'], image['date'], self._last[1]))
+            if self.expected is not None and not 0 <= image['id'] < self.expected:
+                self.error('page {}: image {} is not in the album'.format(index, image['id']))
+            self._last = max(key, self._last) if self._last is not None else key
+            self.images += 1
+
+    def finish(self):
+        """Checks the number of images after the last page. Returns true if no errors were found"""
+        if self.expected is not None and self.images != self.expected:
+            self.error('expected {} images, got {}'.format(self.expected, self.images))
+        return self.error_count == 0
+
+def walk(client, check):
+    """Requests every page of a full-range search one after another and checks each with the
+    StreamCheck. Returns the latencies of the pages in milliseconds, in page order
+
+    Parameters
+    ----------
+    client : http_client.AlbumClient
+        a client that is logged into the API
+    check : StreamCheck
+        the validation of the search
+    """
+    latencies = array.array('d')
+    index, pages = 0, 1
+    while index < pages:
+        start = time.perf_counter()
+        result = client.search(page=index)
+        latencies.append((time.perf_counter() - start) * 1000)
+        pages = result['pages']
+        check.check_page(index, result['images'])
+        index += 1
+    return latencies
+
+def segment_lines(latencies, segments=SEGMENTS):
+    """Returns the median and p95 latency of each segment of pages as lines of text, and the
+    ratio of the median of the last segment to the median of the first one
+
+    Parameters
+    ----------
+    latencies : array.array
+        the latencies of the pages in page order
+    segments : int, optional
+        the number of segments (default is SEGMENTS)
+    """
+    lines = []
+    medians = []
+    segments = max(1, min(segments, len(latencies)))
+    for segment in range(segments):
+        first = segment * len(latencies) // segments
+        last = (segment + 1) * len(latencies) // segments
+        values = latencies[first:last]
+        medians.append(timing.percentile(values, 0.5))
+        lines.append('    pages {:>6}-{:<6} p50={:.2f}ms p95={:.2f}ms max={:.2f}ms \n'.format(
+            first, last - 1, medians[-1], timing.percentile(values, 0.95), max(values)))
+    ratio = medians[-1] / medians[0] if medians[0] else 0.0
+    return lines, ratio
+
+def album_lines(name, check, latencies, elapsed):
+    """Returns the report of one walked album as lines of text"""
+    lines = ['{}: {} images, {} pages of {}, {:.1f} s, {} errors \n'.format(
+        name, check.images, len(latencies), check.page_size, elapsed, check.error_count)]
+    if latencies:
+        segments, ratio = segment_lines(latencies)
+        lines.extend(segments)
+        flag = 'SLOW' if ratio > DEEP_PAGE_RATIO else 'OK'
+        lines.append('    deepest/first segment median ratio {:.2f} {} \n'.format(ratio, flag))
+    lines.extend('    {} \n'.format(error) for error in check.errors)
+    return lines
+
+def run_album(api_url, expected, username, password):
+    """Logs in and walks the album behind the API. Returns its report as lines of text
+
+    Parameters
+    ----------
+    api_url : str
+        the url of the API
+    expected : int
+        the number of images in the album, None if it is not known
+    username : str
+        username of the login
+    password : str
+        password of the login
+    """
+    client = http_client.AlbumClient(api_url, 1)
+    try:
+        if not client.login(username, password):
+            raise http_client.ApiError(401, '/login')
+        check = StreamCheck(expected)
+        start = time.perf_counter()
+        latencies = walk(client, check)
+        elapsed = time.perf_counter() - start
+    finally:
+        client.close()
+    check.finish()
+    name = '{} images'.format(expected) if expected is not None else api_url
+    return album_lines(name, check, latencies, elapsed)
+
+def main(sizes, page_size, latency, api_url, report):
+    """Walks the albums and writes the report into a file and the console
+
+    Parameters
+    ----------
+    sizes : list[int]
+        the numbers of images of the seeded albums
+    page_size : int
+        the number of images on one page of the seeded albums
+    latency : float
+        milliseconds every API response of the seeded albums is delayed by
+    api_url : str
+        the url of a running application whose album is walked instead, or None
+    report : str
+        the file the report is written into
+    """
+    lines = []
+    if api_url is not None:
+        print('# Walking the album at {}'.format(api_url))
+        lines.extend(run_album(api_url, None, album_server.USERNAME, album_server.PASSWORD))
+    else:
+        for size in sizes:
+            print('# Seeding an album of {} images'.format(size))
+            album = album_server.Album(size, page_size, latency / 1000)
+            server = album_server.start_server(album=album)
+            try:
+                print('# Walking {} pages'.format((size + page_size - 1) // page_size))
+                lines.extend(run_album(album_server.api_url(server), size, album_server.USERNAME, album_server.PASSWORD))
+            finally:
+                server.shutdown()
+                server.server_close()
+    with open(report, 'w') as file:
+        file.writelines(lines)
+    print(''.join(lines), end='')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pagination scaling test of the photo album search')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES),
+        help='comma separated numbers of images of the seeded albums (default is {})'.format(','.join(str(size) for size in SIZES)))
+    parser.add_argument('--page-size', type=int, default=album_server.PAGE_SIZE,
+        help='number of images on one page of the seeded albums (default is {})'.format(album_server.PAGE_SIZE))
+    parser.add_argument('--latency', type=float, default=0,
+        help='milliseconds every API response of the seeded albums is delayed by (default is 0)')
+    parser.add_argument('--api-url',
+        help='walk the album of a running application at this API url instead of seeding albums')
+    parser.add_argument('--report', default=SCALING_REPORT,
+        help='file the report is written into (default is {})'.format(SCALING_REPORT))
+    args = parser.parse_args()
+    main([int(size) for size in args.sizes.split(',')], args.page_size, args.latency, args.api_url, args.report)
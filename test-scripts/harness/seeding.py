@@ -0,0 +1,70 @@
+"""Fixture seeding
+
+Applies keyword fixtures to the images of the album in bulk through the API's save-keywords
+endpoint. Instead of opening every image in the browser, the keywords of all images are sent
+with concurrent requests over a pooled harness.http_client.AlbumClient, and the seeded state
+is verified afterwards with a single pass over the tagged images.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+def keywords_by_image(keyword_map):
+    """Inverts a keyword map into a dict of image id -> sorted list of keywords
+
+    Parameters
+    ----------
+    keyword_map : dict
+        keyword -> iterable of image ids
+    """
+    images = {}
+    for keyword in keyword_map:
+        for id in keyword_map[keyword]:
+            images.setdefault(id, []).append(keyword)
+    return {id: sorted(keywords) for id, keywords in images.items()}
+
+def seed_keywords(client, keyword_map, threads=8):
+    """Replaces the keywords of every image in the keyword map with concurrent requests.
+    Returns the number of seeded images, or raises the first error of a failed request
+
+    Parameters
+    ----------
+    client : http_client.AlbumClient
+        a client that is logged into the API, with at least 'threads' connections
+    keyword_map : dict
+        keyword -> iterable of image ids
+    threads : int, optional
+        the number of requests sent at the same time (default is 8)
+    """
+    images = keywords_by_image(keyword_map)
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(client.save_keywords, id, keywords) for id, keywords in images.items()]
+        for future in futures:
+            future.result()
+    return len(images)
+
+def verify_keywords(client, keyword_map, chunk_size=100):
+    """Searches every image that has one of the keywords of the map and compares the keywords
+    the API returns to the map. Keywords are searched in chunks to keep the urls short.
+    Returns a dict of image id -> (expected keywords, actual keywords) of the images that differ
+
+    Parameters
+    ----------
+    client : http_client.AlbumClient
+        a client that is logged into the API
+    keyword_map : dict
+        keyword -> iterable of image ids
+    chunk_size : int, optional
+        the number of keywords in one search (default is 100)
+    """
+    keywords = sorted(keyword_map)
+    actual = {}
+    for start in range(0, len(keywords), chunk_size):
+        for page in client.search_pages(keywords=keywords[start:start + chunk_size]):
+            for image in page:
+                actual[image['id']] = sorted(image['keywords'])
+    expected = keywords_by_image(keyword_map)
+    return {
+        id: (expected.get(id, []), actual.get(id, []))
+        for id in set(expected) | set(actual)
+        if expected.get(id, []) != actual.get(id, [])
+    }
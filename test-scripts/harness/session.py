@@ -0,0 +1,283 @@
+"""Session reuse
+
+Keeps the browser logged into the web application between test cases. Instead of refreshing
+the page and typing the credentials again for every test case, the session logs in once and
+captures the authenticated cookies and web storage. Between test cases the search form is reset
+in place when the album view is still open. If the album view is gone, the captured state is
+restored, and only if that does not bring the album view back is the login performed again.
+
+The login test uses try_login instead, which fills in the login form and clicks 'Login' in one
+asynchronous WebDriver call and answers as soon as the outcome is definitive: the album view
+appeared, or the login request finished and the album view did not appear. A rejected login
+leaves the form in place to be filled in again, so the page is reloaded only by log_out after a
+login that was accepted.
+"""
+
+import time
+
+from harness import timeouts, waits
+
+ALBUM_VIEW = '#view-search'
+LOGIN_BUTTON = 'Login'
+LOGIN_TIMEOUT = 10
+LOGIN_GRACE = 0.2
+
+_VISIBLE_SCRIPT = """
+var element = document.querySelector(arguments[0]);
+return element !== null && element.offsetParent !== null;
+"""
+
+_CAPTURE_SCRIPT = """
+var dump = function (storage) {
+    var items = {};
+    for (var i = 0; i < storage.length; i++) {
+        items[storage.key(i)] = storage.getItem(storage.key(i));
+    }
+    return items;
+};
+return {local: dump(window.localStorage), session: dump(window.sessionStorage)};
+"""
+
+_RESTORE_SCRIPT = """
+var fill = function (storage, items) {
+    storage.clear();
+    Object.keys(items).forEach(function (key) { storage.setItem(key, items[key]); });
+};
+fill(window.localStorage, arguments[0].local);
+fill(window.sessionStorage, arguments[0].session);
+"""
+
+# sets the value of a field with the setter of its prototype, so frameworks that track the value
+# see the change, and dispatches the events of typing
+_FILL_FUNCTION = """
+var fill = function (element, value) {
+    var prototype = element instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(prototype, 'value').set.call(element, value);
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+};
+"""
+
+_RESET_SCRIPT = _FILL_FUNCTION + """
+var placeholders = arguments[0];
+Array.prototype.forEach.call(document.querySelectorAll('input, textarea'), function (field) {
+    if (placeholders.indexOf(field.placeholder) >= 0 && field.value !== '') {
+        fill(field, '');
+    }
+});
+var close = document.querySelector('#view-full-close');
+if (close !== null && close.offsetParent !== null) {
+    close.click();
+}
+"""
+
+_LOGIN_SCRIPT = _FILL_FUNCTION + """
+var username = arguments[0], password = arguments[1], button = arguments[2], album = arguments[3];
+var grace = arguments[4];
+var done = arguments[arguments.length - 1];
+var state = window.__albumWait;
+var visible = function (element) {
+    return element !== null && element.offsetParent !== null;
+};
+var field = function (placeholder) {
+    var fields = document.querySelectorAll('input');
+    for (var i = 0; i < fields.length; i++) {
+        if (fields[i].placeholder === placeholder && visible(fields[i])) {
+            return fields[i];
+        }
+    }
+    return null;
+};
+var submit = null;
+Array.prototype.forEach.call(document.querySelectorAll('button, input[type=submit]'), function (element) {
+    if (submit === null && visible(element) && (element.textContent || element.value || '').trim() === button) {
+        submit = element;
+    }
+});
+var usernameField = field('username'), passwordField = field('password');
+if (state === undefined || usernameField === null || passwordField === null || submit === null) {
+    done('no form');
+    return;
+}
+var finished = false;
+var finish = function () {
+    if (!finished) {
+        finished = true;
+        state.listener = null;
+        done(visible(document.querySelector(album)) ? 'logged in' : 'rejected');
+    }
+};
+var check = function () {
+    if (visible(document.querySelector(album))) {
+        finish();
+    } else if (state.started > 0 && state.inflight === 0) {
+        // let the response handlers of the page run before answering, they may start loading
+        // the album
+        setTimeout(function () {
+            if (state.inflight === 0 || visible(document.querySelector(album))) {
+                finish();
+            }
+        }, 0);
+    }
+};
+fill(usernameField, username);
+fill(passwordField, password);
+state.listener = check;
+submit.click();
+setTimeout(function () {
+    if (state.started === 0) {
+        finish();
+    }
+}, grace);
+check();
+"""
+
+_LOGOUT_SCRIPT = """
+window.localStorage.clear();
+window.sessionStorage.clear();
+"""
+
+def try_login(username, password, timeout=LOGIN_TIMEOUT, grace=LOGIN_GRACE):
+    """Fills in the login form with the given credentials and clicks 'Login'. Returns 'logged in'
+    if the album view appeared, 'rejected' if the login request finished without it, or 'no form'
+    if the login form is not shown. Raises an exception if the login does not finish within the
+    timeout
+
+    Parameters
+    ----------
+    username : str
+        value of the username field
+    password : str
+        value of the password field
+    timeout : float, optional
+        the fixed hard timeout of the login in seconds, shortened by timeouts.POLICY if it has
+        learned the latencies of 'login' (default is LOGIN_TIMEOUT)
+    grace : float, optional
+        seconds to wait for the click to start a request, after which the outcome is read from
+        the page as it is, e.g. if the form rejected the input itself (default is LOGIN_GRACE)
+    """
+    from helium.api import get_driver
+
+    waits.arm('body')
+    driver = get_driver()
+    driver.set_script_timeout(timeouts.POLICY.timeout('login', timeout))
+    start = time.perf_counter()
+    try:
+        outcome = driver.execute_async_script(_LOGIN_SCRIPT, username, password, LOGIN_BUTTON, ALBUM_VIEW, int(grace * 1000))
+    except Exception:
+        timeouts.POLICY.expire('login')
+        raise
+    if outcome != 'no form':
+        timeouts.POLICY.observe('login', time.perf_counter() - start)
+    return outcome
+
+def log_out():
+    """Deletes the cookies and web storage of the application and reloads it, which brings back
+    the login form after a login that was accepted
+    """
+    from helium.api import get_driver
+
+    driver = get_driver()
+    driver.delete_all_cookies()
+    driver.execute_script(_LOGOUT_SCRIPT)
+    driver.refresh()
+
+class Session:
+    """
+    A logged in session of the web application in Helium's current browser
+
+    Attributes
+    ----------
+    username : str
+        the username used in the login
+    password : str
+        the password used in the login
+    search_fields : list[str]
+        placeholders of the search fields that are cleared when the form is reset in place
+    timeout : float
+        seconds to wait for the album view to appear after logging in, shortened by
+        timeouts.POLICY if it has learned the latencies of 'session_login' (default is 10)
+    url : str
+        the url the browser was at when the session was captured (default is None)
+    cookies : list[dict]
+        the captured cookies (default is None)
+    storage : dict
+        the captured localStorage and sessionStorage items (default is None)
+    logins : int
+        the number of times the login form has been filled in
+    """
+    def __init__(self, username, password, search_fields=(), timeout=10):
+        self.username = username
+        self.password = password
+        self.search_fields = list(search_fields)
+        self.timeout = timeout
+        self.url = None
+        self.cookies = None
+        self.storage = None
+        self.logins = 0
+
+    def album_visible(self):
+        """Returns true if the album view of a logged in user is visible"""
+        from helium.api import get_driver
+
+        return get_driver().execute_script(_VISIBLE_SCRIPT, ALBUM_VIEW)
+
+    def login(self):
+        """Fills in the login form, waits for the album view and captures the session.
+        Raises an exception if the album view does not appear
+        """
+        from helium.api import click, wait_until, write
+
+        self.logins += 1
+        write(self.username, into='username')
+        write(self.password, into='password')
+        click('Login')
+        start = time.perf_counter()
+        try:
+            wait_until(self.album_visible, timeout_secs=timeouts.POLICY.timeout('session_login', self.timeout))
+        except Exception:
+            timeouts.POLICY.expire('session_login')
+            raise
+        timeouts.POLICY.observe('session_login', time.perf_counter() - start)
+        self.capture()
+
+    def capture(self):
+        """Saves the current url, cookies and web storage of the browser"""
+        from helium.api import get_driver
+
+        driver = get_driver()
+        self.url = driver.current_url
+        self.cookies = driver.get_cookies()
+        self.storage = driver.execute_script(_CAPTURE_SCRIPT)
+
+    def restore(self):
+        """Reloads the application with the captured cookies and web storage"""
+        from helium.api import get_driver
+
+        driver = get_driver()
+        driver.get(self.url)
+        driver.delete_all_cookies()
+        for cookie in self.cookies:
+            driver.add_cookie(cookie)
+        driver.execute_script(_RESTORE_SCRIPT, self.storage)
+        driver.refresh()
+
+    def reset(self):
+        """Brings the browser to the album view of a logged in user with empty search fields,
+        logging in only if necessary. Returns 'reset' if the form was reset in place, 'restored'
+        if the captured session was restored, or 'login' if the login form was filled in.
+        Raises an exception if logging in fails
+        """
+        from helium.api import get_driver
+
+        if self.album_visible():
+            if self.cookies is None:
+                self.capture()
+            get_driver().execute_script(_RESET_SCRIPT, self.search_fields)
+            return 'reset'
+        if self.cookies is not None:
+            self.restore()
+            if self.album_visible():
+                return 'restored'
+        self.login()
+        return 'login'
@@ -0,0 +1,160 @@
+"""Sharding
+
+Splits the test cases of a test script between several runs, e.g. on different CI executors.
+A run with '--shard i/N' performs the i:th of N parts of the test cases (1 <= i <= N). Every run
+computes the same split on its own from the same test cases, so the runs do not need to talk to
+each other, and together they perform every test case exactly once.
+
+The parts are balanced by the durations of the test cases in earlier runs, read from
+'test-durations.json' in the directory of the test script: the test cases are handed out longest
+first, each to the part with the least total duration so far. A test case without a known
+duration is estimated with the median of the known ones, and if none is known every test case
+weighs the same. The durations are keyed by the hash of the definition of the test case (see
+records.case_key), so test cases with the same description are told apart, and ties are broken
+by the same hash, so the split does not depend on the order of the test cases in the JSON-file.
+All runs need to read the same durations file, so it should be restored into every checkout,
+e.g. from an artifact of the CI pipeline. A digest of the whole split is stored with the results
+of each run, and harness.merge warns if the runs did not agree on it.
+
+A sharded run writes its test log into e.g. 'test-log-2-of-4.txt' and its results, including the
+duration of every test case from its result record (see harness.records), into
+'test-shard-2-of-4.json'. 'python -m harness.merge' combines the results of the runs into one
+test log and updates the durations file.
+"""
+
+import json
+import os
+
+from harness import cache, records
+
+DURATIONS = 'test-durations.json'
+RESULTS = 'test-shard.json'
+
+def parse_shard(spec):
+    """Returns a shard given as 'i/N' as an (index, count) tuple.
+    Raises ValueError if the shard is not of that form or the index is not between 1 and N
+
+    Parameters
+    ----------
+    spec : str
+        the shard, e.g. '2/4' for the second of four parts
+    """
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError('shard is not of the form i/N: {!r}'.format(spec))
+    if not 1 <= index <= count:
+        raise ValueError('shard index is not between 1 and {}: {!r}'.format(count, spec))
+    return index, count
+
+def shard_spec(spec):
+    """Returns the shard unchanged if it is valid, used as the type of the '--shard' option.
+    Raises ValueError if the shard is not valid, see parse_shard
+    """
+    parse_shard(spec)
+    return spec
+
+def shard_path(path, spec):
+    """Returns the file of one shard, e.g. 'test-log-2-of-4.txt' for 'test-log.txt' and '2/4'"""
+    index, count = parse_shard(spec)
+    root, extension = os.path.splitext(path)
+    return '{}-{}-of-{}{}'.format(root, index, count, extension)
+
+def load_durations(path):
+    """Returns the durations of earlier runs as a dict of test case key -> seconds, or an empty
+    dict if the file does not exist or can't be read
+    """
+    try:
+        with open(path, 'r') as file:
+            return {key: float(seconds) for key, seconds in json.load(file).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+def split(test_cases, count, durations):
+    """Divides the test cases into count parts of about the same total duration.
+    Returns a list of count lists of the test cases, each in the original order
+
+    Parameters
+    ----------
+    test_cases : list
+        the TestInput objects of the test script
+    count : int
+        the number of parts
+    durations : dict
+        test case key -> seconds, from earlier runs
+    """
+    keys = [records.case_key(test_case) for test_case in test_cases]
+    known = sorted(durations[key] for key in keys if key in durations)
+    estimate = known[len(known) // 2] if known else 1.0
+    weighted = sorted(
+        ((durations.get(key, estimate), key, position) for position, key in enumerate(keys)),
+        key=lambda item: (-item[0], item[1])
+    )
+    totals = [0.0] * count
+    parts = [[] for _ in range(count)]
+    for seconds, _, position in weighted:
+        part = min(range(count), key=lambda index: (totals[index], index))
+        totals[part] += seconds
+        parts[part].append(position)
+    return [[test_cases[position] for position in sorted(part)] for part in parts]
+
+def start_shard(test_cases, log, spec, durations_path=DURATIONS):
+    """Removes the test cases of the other shards from the list in place. Returns the plan of
+    the shard, a dict that is passed to finish_shard
+
+    Parameters
+    ----------
+    test_cases : list
+        the TestInput objects of the test script, not yet performed
+    log : file
+        the file to write into, which needs to be opened before calling this function
+    spec : str
+        the shard, e.g. '2/4'
+    durations_path : str, optional
+        the JSON-file of the durations of earlier runs (default is DURATIONS)
+    """
+    index, count = parse_shard(spec)
+    durations = load_durations(durations_path)
+    parts = split(test_cases, count, durations)
+    plan = cache.digest(count, [[records.case_key(test_case) for test_case in part] for part in parts])
+    total = len(test_cases)
+    test_cases[:] = parts[index - 1]
+    estimate = sum(durations.get(records.case_key(test_case), 0) for test_case in test_cases)
+    log.write('# Shard {}/{}: performing {} of {} test cases ({:.1f} s in earlier runs) \n'.format(
+        index, count, len(test_cases), total, estimate))
+    print('# Shard {}/{}: performing {} of {} test cases'.format(index, count, len(test_cases), total))
+    return {'spec': spec, 'index': index, 'count': count, 'plan': plan, 'total': total}
+
+def finish_shard(plan, title, log_path, results_path, failed_tests):
+    """Writes the results of a shard into its JSON-file for harness.merge. The performed test
+    cases and their durations are read from the records written by records.STREAM
+
+    Parameters
+    ----------
+    plan : dict
+        the plan returned by start_shard
+    title : str
+        name of the test in capital letters, as in its banner
+    log_path : str
+        the test log of the shard, which needs to be closed before calling this function
+    results_path : str
+        the JSON-file the results are written into
+    failed_tests : int
+        the number of failed test cases
+    """
+    with open(log_path, 'r') as file:
+        log_text = file.read()
+    cases = [{'msg': msg, 'key': key, 'passed': status == 'passed', 'seconds': round(seconds, 3)}
+             for msg, key, status, seconds in records.STREAM.written]
+    results = {
+        'title': title,
+        'shard': [plan['index'], plan['count']],
+        'plan': plan['plan'],
+        'total': plan['total'],
+        'failed': failed_tests,
+        'cases': cases,
+        'log': log_text
+    }
+    with open(results_path, 'w') as file:
+        json.dump(results, file, indent=1)
+    print('# Shard results written into {}'.format(results_path))
@@ -0,0 +1,165 @@
+"""Adaptive timeouts
+
+Sets the hard timeouts of the harness' waits from the latencies observed in earlier runs instead
+of fixed values. The waits (waits.wait_for_render, extract.next_album_page, session.try_login and
+session.Session.login) report how long they took to POLICY, and the latest SAMPLES latencies of
+every action are kept in 'test-latencies.json' in the 'test-scripts' directory, shared by the test
+scripts. The timeout of an action is its PERCENTILE:th percentile latency times FACTOR plus MARGIN
+seconds, but at least MIN_TIMEOUT and at most the fixed timeout of the wait, which is also used
+until the action has MIN_SAMPLES latencies. A page that does not settle then fails its test case
+after a small multiple of the usual latency of the wait instead of after the fixed timeout.
+The test scripts take '--fixed-timeouts' to wait with the fixed timeouts only.
+
+A wait that times out is not a latency, so it is not recorded. Instead the action falls back to
+its fixed timeout for the rest of the run, so a slower build is waited for and its latencies are
+learned, at the cost of the one test case that timed out.
+
+The waits already answer as soon as the application signals completion (see harness.waits), so
+negative cases, e.g. searches that find nothing, end when their request has been handled. The
+timeouts only bound the waits that the application never answers.
+"""
+
+import json
+import math
+import os
+
+from harness import runner
+
+LATENCIES = os.path.join(runner.SCRIPTS_DIR, 'test-latencies.json')
+SAMPLES = 200
+MIN_SAMPLES = 20
+PERCENTILE = 99
+FACTOR = 1.5
+MARGIN = 0.5
+MIN_TIMEOUT = 1.0
+
+class TimeoutPolicy:
+    """
+    Learned timeouts of the waits of one process
+
+    Attributes
+    ----------
+    enabled : bool
+        if false, the fixed timeouts are used and nothing is recorded (default is false)
+    path : str
+        the JSON-file of the latencies (default is None)
+    samples : dict
+        action -> latencies in seconds of earlier runs and this run, oldest first
+    observed : list[tuple]
+        (action, seconds) observed in this run and not yet saved or drained
+    expired : set
+        actions that timed out in this run and use their fixed timeout
+    """
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.samples = {}
+        self.observed = []
+        self.expired = set()
+
+    def start(self, path=LATENCIES):
+        """Enables the policy with the latencies saved in the given file
+
+        Parameters
+        ----------
+        path : str, optional
+            the JSON-file of the latencies, which does not need to exist (default is LATENCIES)
+        """
+        self.enabled = True
+        self.path = path
+        self.samples = load_latencies(path)
+        self.observed = []
+        self.expired = set()
+
+    def settings(self):
+        """Returns the path of the latencies if the policy is enabled, or None, used to start the
+        policies of the pool's workers with the same latencies
+        """
+        return self.path if self.enabled else None
+
+    def timeout(self, action, default):
+        """Returns the timeout of an action in seconds
+
+        Parameters
+        ----------
+        action : str
+            name of the wait, e.g. 'wait_render'
+        default : float
+            the fixed timeout of the wait, used if the policy is disabled, the action has too few
+            latencies or it timed out in this run, and the upper limit of the learned timeout
+        """
+        values = self.samples.get(action, [])
+        if not self.enabled or action in self.expired or len(values) < MIN_SAMPLES:
+            return default
+        learned = percentile(values, PERCENTILE) * FACTOR + MARGIN
+        return min(default, max(MIN_TIMEOUT, learned))
+
+    def observe(self, action, seconds):
+        """Records the latency of a wait that finished. Does nothing if the policy is disabled"""
+        if not self.enabled:
+            return
+        values = self.samples.setdefault(action, [])
+        values.append(seconds)
+        if len(values) > SAMPLES:
+            del values[0]
+        self.observed.append((action, seconds))
+
+    def expire(self, action):
+        """Makes an action use its fixed timeout for the rest of the run, after it timed out"""
+        if self.enabled:
+            self.expired.add(action)
+
+    def absorb(self, observed):
+        """Records the latencies drained from the policy of another process"""
+        for action, seconds in observed:
+            self.observe(action, seconds)
+
+    def drain(self):
+        """Returns the latencies observed since the last call and forgets them"""
+        observed, self.observed = self.observed, []
+        return observed
+
+    def save(self):
+        """Adds the latencies of this run to the latencies in the file, keeping the latest SAMPLES
+        of every action, and disables the policy. The file is read again first, so the latencies
+        that another test script saved meanwhile are kept
+        """
+        if not self.enabled:
+            return
+        saved = load_latencies(self.path)
+        for action, seconds in self.drain():
+            saved.setdefault(action, []).append(round(seconds, 4))
+        try:
+            with open(self.path, 'w') as file:
+                json.dump({action: values[-SAMPLES:] for action, values in saved.items()}, file, indent=1, sort_keys=True)
+        except OSError:
+            print('Failed to save the latencies into {}'.format(self.path))
+        self.enabled = False
+
+    def lines(self):
+        """Returns the learned latencies of the actions as lines for the test log"""
+        lines = []
+        for action in sorted(self.samples):
+            values = self.samples[action]
+            if len(values) >= MIN_SAMPLES:
+                lines.append('# Latency of {} over the last {} waits: p{} {:.3f} s \n'.format(
+                    action, len(values), PERCENTILE, percentile(values, PERCENTILE)))
+        return lines
+
+def load_latencies(path):
+    """Returns the latencies saved in a JSON-file as a dict of action -> list of seconds, empty if
+    the file does not exist or can't be read
+    """
+    try:
+        with open(path, 'r') as file:
+            saved = json.load(file)
+        return {action: [float(value) for value in values][-SAMPLES:] for action, values in saved.items()}
+    except (OSError, ValueError, TypeError, AttributeError):
+        return {}
+
+def percentile(values, p):
+    """Returns the p:th percentile of the values with the nearest-rank method"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))]
+
+POLICY = TimeoutPolicy()
@@ -0,0 +1,225 @@
+"""Timing
+
+Measures how long every browser action and every test case takes. When timing is enabled,
+Helium's actions (write, click, find_all, refresh, start_chrome, kill_browser) and the harness'
+own login, extraction, pagination, render wait and HTTP request functions are replaced with wrappers that
+record the start time and duration of each call. Recording a call is one clock read before and
+after it and one list append, so the wrappers do not slow the test down noticeably.
+
+The recorded events are summarized as per-action and per-case latency histograms and can be
+exported as a Chrome trace-event JSON file, which opens in chrome://tracing or Perfetto.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+HELIUM_ACTIONS = ['write', 'click', 'find_all', 'refresh', 'start_chrome', 'kill_browser']
+
+class Timer:
+    """
+    Records timed events of one process
+
+    Attributes
+    ----------
+    enabled : bool
+        if false, nothing is recorded (default is false)
+    events : list[tuple]
+        recorded events as (name, category, start, duration, pid, tid, case) tuples, where start
+        and duration are in microseconds
+    case : str
+        description of the test case that is running, attached to the recorded events
+    """
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.case = None
+        self._origin = time.perf_counter_ns() - time.time_ns()
+
+    def _now(self):
+        return (time.perf_counter_ns() - self._origin) // 1000
+
+    def record(self, name, category, start, duration):
+        """Adds an event, start and duration given in microseconds"""
+        self.events.append((name, category, start, duration, os.getpid(), threading.get_ident(), self.case))
+
+    def wrap(self, name, function):
+        """Returns a wrapper of the function that records every call as an action event
+
+        Parameters
+        ----------
+        name : str
+            name of the action
+        function : function
+            the function to be timed
+        """
+        if getattr(function, '_timed', False):
+            return function
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+            start = self._now()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, 'action', start, self._now() - start)
+        timed._timed = True
+        return timed
+
+    def instrument(self, owner, names):
+        """Replaces the given attributes of a module or class with timed wrappers
+
+        Parameters
+        ----------
+        owner : module or class
+            where the functions are looked up and replaced
+        names : dict or list
+            attribute name -> action name, or a list of attribute names used as action names
+        """
+        if not isinstance(names, dict):
+            names = {name: name for name in names}
+        for attribute, name in names.items():
+            if hasattr(owner, attribute):
+                setattr(owner, attribute, self.wrap(name, getattr(owner, attribute)))
+
+    @contextlib.contextmanager
+    def test_case(self, msg):
+        """Context manager that records its body as a test case event
+
+        Parameters
+        ----------
+        msg : str
+            description of the test case
+        """
+        if not self.enabled:
+            yield
+            return
+        self.case = msg
+        start = self._now()
+        try:
+            yield
+        finally:
+            self.record(msg, 'case', start, self._now() - start)
+            self.case = None
+
+    def drain(self):
+        """Returns the recorded events and forgets them"""
+        events, self.events = self.events, []
+        return events
+
+    def durations(self, category):
+        """Returns a dict of event name -> list of durations in milliseconds
+
+        Parameters
+        ----------
+        category : str
+            'action' or 'case'
+        """
+        durations = {}
+        for name, event_category, _, duration, _, _, _ in self.events:
+            if event_category == category:
+                durations.setdefault(name, []).append(duration / 1000)
+        return durations
+
+    def summary(self):
+        """Returns the per-action and per-case latency histograms as lines of text"""
+        lines = []
+        for title, category in (('ACTIONS', 'action'), ('TEST CASES', 'case')):
+            lines.append('# {} \n'.format(title))
+            durations = self.durations(category)
+            for name in sorted(durations, key=lambda name: -sum(durations[name])):
+                lines.extend(histogram(name, durations[name]))
+            lines.append('\n')
+        return lines
+
+    def export_trace(self, path):
+        """Writes the recorded events into a Chrome trace-event JSON file
+
+        Parameters
+        ----------
+        path : str
+            the file to write into
+        """
+        trace = []
+        for name, category, start, duration, pid, tid, case in self.events:
+            event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': duration, 'pid': pid, 'tid': tid}
+            if case is not None and category != 'case':
+                event['args'] = {'case': case}
+            trace.append(event)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, file)
+
+def percentile(values, fraction):
+    """Returns the value at the given fraction (0-1) of the sorted values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def histogram(name, durations):
+    """Returns lines of text with the statistics of the durations and a histogram of them in
+    buckets whose bounds double: <1 ms, 1-2 ms, 2-4 ms and so on
+
+    Parameters
+    ----------
+    name : str
+        name of the action or test case
+    durations : list[float]
+        durations in milliseconds
+    """
+    lines = ['{}: n={} total={:.0f}ms p50={:.1f}ms p90={:.1f}ms p99={:.1f}ms max={:.1f}ms \n'.format(
+        name, len(durations), sum(durations), percentile(durations, 0.5), percentile(durations, 0.9),
+        percentile(durations, 0.99), max(durations)
+    )]
+    buckets = {}
+    for duration in durations:
+        bound = 1
+        while duration >= bound:
+            bound *= 2
+        buckets[bound] = buckets.get(bound, 0) + 1
+    for bound in sorted(buckets):
+        label = '<1ms' if bound == 1 else '{}-{}ms'.format(bound // 2, bound)
+        lines.append('    {:>14} | {} {} \n'.format(label, '#' * min(buckets[bound], 50), buckets[bound]))
+    return lines
+
+TIMER = Timer()
+
+def enable(browser=True):
+    """Enables TIMER and instruments Helium's actions and the harness' functions in this process.
+    The test scripts import Helium's actions when they are called, so they get the instrumented ones
+
+    Parameters
+    ----------
+    browser : bool, optional
+        if false, Helium is not imported nor instrumented, for the modes that do not use a
+        browser (default is true)
+    """
+    from harness import extract, http_client, session, waits
+
+    TIMER.enabled = True
+    if browser:
+        import helium.api
+
+        TIMER.instrument(helium.api, HELIUM_ACTIONS)
+    TIMER.instrument(session.Session, {'login': 'login', 'reset': 'session_reset'})
+    TIMER.instrument(session, {'try_login': 'try_login', 'log_out': 'log_out'})
+    TIMER.instrument(extract, {'extract_images': 'extract_images', 'next_album_page': 'next_page'})
+    TIMER.instrument(waits, {'wait_for_render': 'wait_render'})
+    TIMER.instrument(http_client.AlbumClient, {'request': 'http_request'})
+
+def write_reports(summary_path, trace_path):
+    """Writes the histograms of TIMER into a text file and its events into a trace file
+
+    Parameters
+    ----------
+    summary_path : str
+        the file the histograms are written into
+    trace_path : str
+        the file the Chrome trace-event JSON is written into
+    """
+    with open(summary_path, 'w') as file:
+        file.writelines(TIMER.summary())
+    TIMER.export_trace(trace_path)
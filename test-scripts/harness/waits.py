@@ -0,0 +1,175 @@
+"""Event-driven waits
+
+Waits for the album view to finish re-rendering after a click, without polling from Python.
+arm installs a MutationObserver on the album view and counters of the requests that the page
+has in flight (fetch and XMLHttpRequest), and resets them. After the click, wait_for_render
+blocks in a single asynchronous WebDriver call that the page answers itself: as soon as the
+album view has changed and no request is in flight, or, if the requests of the click were
+handled without changing the album view (e.g. a search that found nothing into an album view
+that was already empty), or the click did not start a request nor change the album view, after
+a short grace period. The hard timeout is the WebDriver script timeout, so a page that never
+settles raises an exception instead of hanging. It is learned from the latencies of earlier
+waits, see harness.timeouts.
+
+When timing is enabled (harness.timing), every wait is recorded as a 'wait_render' action.
+"""
+
+import time
+
+from harness import timeouts
+
+ALBUM_SELECTOR = '#view-album'
+WAIT_TIMEOUT = 10
+IDLE_GRACE = 0.1
+
+_ARM_SCRIPT = """
+var selector = arguments[0];
+var state = window.__albumWait;
+if (state === undefined) {
+    state = window.__albumWait = {inflight: 0, started: 0, mutations: 0, listener: null, observed: null};
+    var notify = function () {
+        if (state.listener !== null) {
+            state.listener();
+        }
+    };
+    var begin = function () {
+        state.inflight += 1;
+        state.started += 1;
+    };
+    var end = function () {
+        state.inflight -= 1;
+        notify();
+    };
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function () {
+            begin();
+            return fetch.apply(this, arguments).then(function (response) {
+                var read = function (method) {
+                    var original = response[method];
+                    response[method] = function () {
+                        state.inflight += 1;
+                        return original.apply(response, arguments).finally(end);
+                    };
+                };
+                ['json', 'text', 'blob', 'arrayBuffer'].forEach(read);
+                end();
+                return response;
+            }, function (error) {
+                end();
+                throw error;
+            });
+        };
+    }
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        begin();
+        this.addEventListener('loadend', end);
+        return send.apply(this, arguments);
+    };
+    state.observer = new MutationObserver(function () {
+        state.mutations += 1;
+        notify();
+    });
+}
+var target = document.querySelector(selector) || document.body;
+if (state.observed !== target) {
+    state.observer.disconnect();
+    state.observer.observe(target, {childList: true, subtree: true, attributes: true, characterData: true});
+    state.observed = target;
+}
+state.started = 0;
+state.mutations = 0;
+state.listener = null;
+"""
+
+_WAIT_SCRIPT = """
+var grace = arguments[0];
+var done = arguments[arguments.length - 1];
+var state = window.__albumWait;
+if (state === undefined) {
+    done('unarmed');
+    return;
+}
+var finished = false;
+var finish = function (outcome) {
+    if (!finished) {
+        finished = true;
+        state.listener = null;
+        done(outcome);
+    }
+};
+var check = function () {
+    if (state.inflight > 0) {
+        return;
+    }
+    if (state.mutations > 0) {
+        // let the rest of the same render run before answering
+        setTimeout(function () {
+            if (state.inflight === 0) {
+                finish('rendered');
+            }
+        }, 0);
+    } else if (state.started > 0) {
+        // the requests were handled without changing the album view
+        setTimeout(function () {
+            if (state.inflight === 0 && state.mutations === 0) {
+                finish('settled');
+            }
+        }, grace);
+    }
+};
+state.listener = check;
+setTimeout(function () {
+    if (state.started === 0 && state.mutations === 0) {
+        finish('idle');
+    }
+}, grace);
+check();
+"""
+
+def arm(selector=ALBUM_SELECTOR):
+    """Starts watching the album view and the requests of the page. Needs to be called before
+    the click that wait_for_render waits for
+
+    Parameters
+    ----------
+    selector : str, optional
+        CSS selector of the element whose changes are waited for (default is '#view-album'),
+        the whole document is watched if there is no such element
+    """
+    from helium.api import get_driver
+
+    get_driver().execute_script(_ARM_SCRIPT, selector)
+
+def wait_for_render(timeout=WAIT_TIMEOUT, grace=IDLE_GRACE, action='wait_render'):
+    """Blocks until the album view has been re-rendered and the page has no requests in flight
+    after the click that followed arm. Returns 'rendered', 'settled' if the requests of the click
+    finished without changing the album view, 'idle' if the click did not start a request nor
+    change the album view within the grace period, or 'unarmed' if the page was reloaded after
+    arm. Raises an exception if the page does not settle within the timeout
+
+    Parameters
+    ----------
+    timeout : float, optional
+        the fixed hard timeout of the wait in seconds, shortened by timeouts.POLICY if it has
+        learned the latencies of the action (default is WAIT_TIMEOUT)
+    grace : float, optional
+        seconds to wait for a request or a change to start after the click, and for the album
+        view to change after the requests have finished (default is IDLE_GRACE)
+    action : str, optional
+        name of the wait in timeouts.POLICY (default is 'wait_render')
+    """
+    from helium.api import get_driver
+
+    driver = get_driver()
+    driver.set_script_timeout(timeouts.POLICY.timeout(action, timeout))
+    start = time.perf_counter()
+    try:
+        outcome = driver.execute_async_script(_WAIT_SCRIPT, int(grace * 1000))
+    except Exception:
+        timeouts.POLICY.expire(action)
+        raise
+    if outcome in ('rendered', 'settled'):
+        timeouts.POLICY.observe(action, time.perf_counter() - start)
+    return outcome